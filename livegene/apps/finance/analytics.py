@@ -0,0 +1,147 @@
+"""
+Burn rate and spend forecasts over the expenditure history.
+
+The snapshots of all linked projects are loaded in one query into
+NumPy arrays sorted by project and report date. Every figure is then
+computed for all projects at once from per-project sums, so the cost
+does not depend on looping over projects in Python.
+
+`amount` is the spend to date reported by each snapshot and the burn
+rate is the least-squares slope of that spend over time, in currency
+units per day. Projects with a single snapshot fall back to the
+average rate since their start date.
+"""
+import datetime
+
+import numpy as np
+
+from .models import Expenditure
+
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def _days(dates):
+    return np.array(
+        [(date - EPOCH).days for date in dates], dtype=np.float64
+    )
+
+
+def _date(days):
+    if not np.isfinite(days):
+        return None
+    return EPOCH + datetime.timedelta(days=int(round(days)))
+
+
+def load_history(queryset=None):
+    """
+    Return the snapshot arrays of the linked projects, sorted by
+    project and report date, with the dates as days since the epoch.
+    """
+    if queryset is None:
+        queryset = Expenditure.objects.all()
+    rows = list(
+        queryset.filter(project__isnull=False).order_by(
+            'project', 'report_date'
+        ).values_list(
+            'project',
+            'project__ilri_code',
+            'project__start_date',
+            'project__end_date',
+            'report_date',
+            'amount',
+            'total_budget'
+        )
+    )
+    if not rows:
+        columns = [()] * 7
+    else:
+        columns = list(zip(*rows))
+    return {
+        'project': np.array(columns[0], dtype=np.int64),
+        'ilri_code': np.array(columns[1], dtype=object),
+        'start': _days(columns[2]),
+        'end': _days(columns[3]),
+        'report': _days(date.date() for date in columns[4]),
+        'amount': np.array(
+            [np.nan if v is None else v for v in columns[5]],
+            dtype=np.float64
+        ),
+        'budget': np.array(
+            [np.nan if v is None else v for v in columns[6]],
+            dtype=np.float64
+        ),
+    }
+
+
+def forecast(history):
+    """
+    Compute the burn rate, spend and time elapsed percentages and the
+    projected exhaustion date of every project in `history`.
+    """
+    project = history['project']
+    if not len(project):
+        return []
+    # Snapshots without an amount do not contribute to the fit.
+    valid = np.isfinite(history['amount'])
+    history = {key: value[valid] for key, value in history.items()}
+    project = history['project']
+    if not len(project):
+        return []
+    first = np.flatnonzero(np.r_[True, project[1:] != project[:-1]])
+    last = np.r_[first[1:], len(project)] - 1
+
+    x = history['report']
+    y = history['amount']
+    n = np.diff(np.r_[first, len(project)]).astype(np.float64)
+    sx = np.add.reduceat(x, first)
+    sy = np.add.reduceat(y, first)
+    sxy = np.add.reduceat(x * y, first)
+    sxx = np.add.reduceat(x * x, first)
+    denominator = n * sxx - sx * sx
+
+    start = history['start'][first]
+    end = history['end'][first]
+    report = x[last]
+    amount = y[last]
+    budget = history['budget'][last]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sxy - sx * sy) / denominator
+        average = amount / (report - start)
+        rate = np.where(denominator > 0, slope, average)
+        rate = np.where(np.isfinite(rate), rate, np.nan)
+        spent = np.where(budget > 0, amount / budget * 100, np.nan)
+        elapsed = np.clip((report - start) / (end - start) * 100, 0, 100)
+        exhaustion = np.where(
+            rate > 0, report + (budget - amount) / rate, np.nan
+        )
+
+    results = []
+    for i in range(len(first)):
+        results.append({
+            'project': int(project[first[i]]),
+            'ilri_code': history['ilri_code'][first[i]],
+            'report_date': _date(report[i]),
+            'snapshots': int(n[i]),
+            'amount': int(amount[i]),
+            'total_budget': (
+                int(budget[i]) if np.isfinite(budget[i]) else None
+            ),
+            'burn_rate': _float(rate[i]),
+            'percent_spent': _float(spent[i]),
+            'percent_elapsed': _float(elapsed[i]),
+            'exhaustion_date': _date(exhaustion[i]),
+            'end_date': _date(end[i]),
+        })
+    return results
+
+
+def _float(value, digits=2):
+    if not np.isfinite(value):
+        return None
+    return round(float(value), digits)
+
+
+def burn_rates(queryset=None):
+    return forecast(load_history(queryset))
@@ -2,4 +2,9 @@ from django.apps import AppConfig
 
 
 class FinanceConfig(AppConfig):
-    name = 'finance'
+    name = 'livegene.apps.finance'
+    label = 'finance'
+
+    def ready(self):
+        from . import signals
+        signals.connect()
@@ -0,0 +1,193 @@
+"""
+Partitioned Parquet archive of the expenditure history.
+
+Snapshots are written to one Parquet file per report month under
+`report_month=YYYY-MM/`, with a `manifest.json` at the root listing
+every partition, its number of rows and the newest `modified` time of
+its snapshots. A run only writes the months that are new or whose
+snapshots changed since the previous run and removes the months that
+no longer have any, so the existing history is not rewritten every
+reporting period.
+
+Partition files are never overwritten: a changed month gets a new file
+name and the manifest is replaced atomically before the old file is
+removed, so readers holding the previous manifest keep working.
+Readers memory-map only the partitions they ask for.
+"""
+import hashlib
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.db.models import Count, Max
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Expenditure
+
+
+MANIFEST = 'manifest.json'
+VERSION = 1
+
+SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('ilri_code', pa.string()),
+    ('name', pa.string()),
+    ('home_program', pa.string()),
+    ('start_date', pa.date32()),
+    ('end_date', pa.date32()),
+    ('report_date', pa.timestamp('us', tz='UTC')),
+    ('total_budget', pa.int64()),
+    ('amount', pa.int64()),
+    ('project_id', pa.int64()),
+    ('modified', pa.timestamp('us', tz='UTC')),
+])
+
+
+def _month(value):
+    return value.strftime('%Y-%m')
+
+
+def _next_month(start):
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def read_manifest(root):
+    path = os.path.join(root, MANIFEST)
+    if not os.path.exists(path):
+        return {'version': VERSION, 'partitions': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_manifest(root, manifest):
+    path = os.path.join(root, MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def months(queryset=None):
+    """
+    Return {month: (start, rows, newest modified time)} for every report
+    month of the snapshots in one grouped query.
+    """
+    if queryset is None:
+        queryset = Expenditure.objects.all()
+    grouped = queryset.order_by().annotate(
+        month=TruncMonth('report_date')
+    ).values('month').annotate(rows=Count('pk'), modified=Max('modified'))
+    return {
+        _month(row['month']): (row['month'], row['rows'], row['modified'])
+        for row in grouped
+    }
+
+
+def month_table(start):
+    """
+    Return the snapshots reported in the month beginning at `start` as
+    an Arrow table.
+    """
+    rows = Expenditure.objects.filter(
+        report_date__gte=start, report_date__lt=_next_month(start)
+    ).order_by('ilri_code', 'report_date').values_list(*SCHEMA.names)
+    return pa.Table.from_arrays(
+        [
+            pa.array(column, type=field.type)
+            for column, field in zip(zip(*rows), SCHEMA)
+        ],
+        schema=SCHEMA
+    )
+
+
+def export(root, full=False):
+    """
+    Bring the archive under `root` up to date and return the number of
+    written, kept and removed partitions. `full` rewrites every month.
+    """
+    os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root)
+    previous = {
+        partition['month']: partition
+        for partition in ([] if full else manifest['partitions'])
+    }
+    stale = [partition['path'] for partition in manifest['partitions']]
+    partitions = []
+    written = 0
+    for month, (start, rows, modified) in sorted(months().items()):
+        modified = modified.isoformat()
+        partition = previous.get(month)
+        if partition is None or partition['rows'] != rows or \
+                partition['modified'] != modified:
+            token = hashlib.sha1(
+                '{0}:{1}'.format(rows, modified).encode()
+            ).hexdigest()[:12]
+            partition = {
+                'month': month,
+                'path': 'report_month={0}/expenditure-{1}.parquet'.format(
+                    month, token
+                ),
+                'rows': rows,
+                'modified': modified,
+            }
+            path = os.path.join(root, partition['path'])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pq.write_table(month_table(start), path + '.tmp')
+            os.replace(path + '.tmp', path)
+            written += 1
+        partitions.append(partition)
+    kept = {partition['path'] for partition in partitions}
+    _write_manifest(root, {
+        'version': VERSION,
+        'updated': timezone.now().isoformat(),
+        'schema': [
+            {'name': field.name, 'type': str(field.type)} for field in SCHEMA
+        ],
+        'partitions': partitions,
+    })
+    for path in stale:
+        if path not in kept:
+            path = os.path.join(root, path)
+            if os.path.exists(path):
+                os.remove(path)
+            try:
+                # Only succeeds for the directories of removed months.
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+    return {
+        'written': written,
+        'kept': len(partitions) - written,
+        'removed': len(
+            {p['month'] for p in manifest['partitions']} -
+            {p['month'] for p in partitions}
+        ),
+    }
+
+
+def read(root, start=None, end=None, columns=None):
+    """
+    Return the archived snapshots of the report months between `start`
+    and `end` (dates, both included) as one Arrow table, memory-mapping
+    only the matching partitions. Use `.to_pandas()` for a DataFrame.
+    """
+    first = _month(start) if start else None
+    last = _month(end) if end else None
+    tables = [
+        pq.read_table(
+            pa.memory_map(os.path.join(root, partition['path'])),
+            columns=columns
+        )
+        for partition in read_manifest(root)['partitions']
+        if (first is None or partition['month'] >= first) and
+        (last is None or partition['month'] <= last)
+    ]
+    if not tables:
+        schema = SCHEMA
+        if columns is not None:
+            schema = pa.schema([SCHEMA.field_by_name(n) for n in columns])
+        return schema.empty_table()
+    return pa.concat_tables(tables)
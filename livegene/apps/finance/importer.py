@@ -0,0 +1,287 @@
+"""
+Streaming import of finance exports into `Expenditure`.
+
+Rows are read lazily from CSV or XLSX files and written in batches:
+snapshots that are new for their (ilri_code, report_date) key are
+inserted with `bulk_create`, existing ones are updated only when a
+value changed, many rows per UPDATE with CASE expressions. Only one
+batch is held in memory at a time and the `LatestExpenditure` rows of
+the new snapshots are refreshed with it.
+"""
+import csv
+import datetime
+import itertools
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from livegene.apps.livegene import changelog, tracking
+from livegene.apps.livegene.models import Change, Project
+
+from .models import Expenditure, LatestExpenditure
+
+
+# Keeps the key lookups of a batch below SQLite's 999 parameter limit.
+BATCH_SIZE = 400
+# Rows changed per UPDATE: every changed value takes two parameters of
+# the CASE expressions.
+UPDATE_BATCH_SIZE = 40
+
+FIELDS = (
+    'ilri_code',
+    'name',
+    'home_program',
+    'start_date',
+    'end_date',
+    'report_date',
+    'total_budget',
+    'amount',
+)
+
+
+class ExpenditureImportError(Exception):
+    pass
+
+
+def normalise_header(header):
+    return str(header or '').strip().lower().replace(' ', '_')
+
+
+def read_csv(path, encoding='utf-8-sig'):
+    with open(path, newline='', encoding=encoding) as f:
+        reader = csv.reader(f)
+        try:
+            header = [normalise_header(h) for h in next(reader, [])]
+            for row in reader:
+                yield dict(zip(header, row))
+        except UnicodeDecodeError as e:
+            raise ExpenditureImportError(
+                'Line {0}: not {1} text ({2})'.format(
+                    reader.line_num + 1, encoding, e.reason
+                )
+            ) from e
+
+
+def read_xlsx(path, sheet=None):
+    # openpyxl is only needed for spreadsheet imports
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        if sheet and sheet not in workbook.sheetnames:
+            raise ExpenditureImportError(
+                'No worksheet {0!r}; the export has {1}.'.format(
+                    sheet, ', '.join(map(repr, workbook.sheetnames))
+                )
+            )
+        worksheet = workbook[sheet] if sheet else workbook.active
+        rows = (
+            [cell.value for cell in row] for row in worksheet.iter_rows()
+        )
+        header = [normalise_header(h) for h in next(rows, [])]
+        for row in rows:
+            yield dict(zip(header, row))
+    finally:
+        workbook.close()
+
+
+def is_xlsx(path):
+    return str(path).lower().endswith(('.xlsx', '.xlsm'))
+
+
+def read_file(path, **kwargs):
+    if is_xlsx(path):
+        return read_xlsx(path, **kwargs)
+    return read_csv(path, **kwargs)
+
+
+def _to_date(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    value = str(value).strip()
+    date = parse_date(value[:10])
+    if date is None:
+        raise ValueError('invalid date {0!r}'.format(value))
+    return date
+
+
+def _to_datetime(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime.datetime):
+        dt = value
+    elif isinstance(value, datetime.date):
+        dt = datetime.datetime.combine(value, datetime.time())
+    else:
+        value = str(value).strip()
+        dt = parse_datetime(value)
+        if dt is None:
+            date = parse_date(value)
+            if date is None:
+                raise ValueError('invalid date {0!r}'.format(value))
+            dt = datetime.datetime.combine(date, datetime.time())
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, timezone.get_default_timezone())
+    return dt
+
+
+def _to_int(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, str):
+        value = value.replace(',', '').strip()
+    number = int(round(float(value)))
+    if number < 0:
+        raise ValueError('negative amount {0!r}'.format(value))
+    return number
+
+
+CONVERTERS = {
+    'start_date': _to_date,
+    'end_date': _to_date,
+    'report_date': _to_datetime,
+    'total_budget': _to_int,
+    'amount': _to_int,
+}
+
+
+def clean_row(row, report_date=None):
+    """
+    Convert one raw row into a dictionary of `Expenditure` values.
+    `report_date` overrides the report date of the row, for exports
+    that describe a single snapshot without a report date column.
+    """
+    values = {}
+    for field in FIELDS:
+        value = row.get(field)
+        converter = CONVERTERS.get(field)
+        if converter is not None:
+            value = converter(value)
+        elif value is None:
+            value = ''
+        else:
+            value = str(value).strip()
+        values[field] = value
+    if report_date is not None:
+        values['report_date'] = _to_datetime(report_date)
+    for field in ('ilri_code', 'name', 'start_date', 'report_date'):
+        if not values[field]:
+            raise ValueError('missing {0}'.format(field))
+    return values
+
+
+def _update(changes):
+    """
+    Apply the {pk: {field: value}} `changes` to the existing snapshots
+    with one UPDATE of CASE expressions per `UPDATE_BATCH_SIZE` rows.
+    """
+    pks = sorted(changes)
+    for i in range(0, len(pks), UPDATE_BATCH_SIZE):
+        chunk = pks[i:i + UPDATE_BATCH_SIZE]
+        values = {}
+        for field in {field for pk in chunk for field in changes[pk]}:
+            output_field = Expenditure._meta.get_field(field)
+            values[field] = Case(
+                *[
+                    When(pk=pk, then=Value(
+                        changes[pk][field], output_field=output_field
+                    ))
+                    for pk in chunk if field in changes[pk]
+                ],
+                default=F(field),
+                output_field=output_field
+            )
+        Expenditure.objects.filter(pk__in=chunk).update(
+            modified=timezone.now(), **values
+        )
+
+
+def _write_batch(batch):
+    """
+    Upsert one batch of cleaned rows keyed by (ilri_code, report_date),
+    linking them to their projects, and return the number of created
+    and updated rows.
+    """
+    codes = {key[0] for key in batch}
+    projects = dict(
+        Project.objects.filter(ilri_code__in=codes).values_list(
+            'ilri_code', 'pk'
+        )
+    )
+    for key, values in batch.items():
+        values['project_id'] = projects.get(key[0])
+    existing = {
+        (obj.ilri_code, obj.report_date): obj
+        for obj in Expenditure.objects.filter(
+            ilri_code__in=codes,
+            report_date__in={key[1] for key in batch}
+        )
+    }
+    new = []
+    updated = {}
+    for key, values in batch.items():
+        obj = existing.get(key)
+        if obj is None:
+            new.append(Expenditure(**values))
+            continue
+        changes = {
+            field: value
+            for field, value in values.items()
+            if getattr(obj, field) != value
+        }
+        if changes:
+            updated[obj.pk] = changes
+    _update(updated)
+    Expenditure.objects.bulk_create(new)
+    changelog.record_created(Expenditure, new)
+    changelog.record(Expenditure, list(updated), Change.UPDATE)
+    LatestExpenditure.objects.refresh(obj.ilri_code for obj in new)
+    return len(new), len(updated)
+
+
+def import_expenditures(rows, batch_size=BATCH_SIZE, report_date=None,
+                        progress=None):
+    """
+    Import an iterable of raw rows and return a dictionary with the
+    number of processed, created and updated rows. Each batch is
+    written in its own transaction and reported to `progress`, which
+    is called with the running totals.
+    """
+    stats = {'processed': 0, 'created': 0, 'updated': 0}
+    rows = iter(rows)
+    # Row numbers follow the file, the header being line one.
+    line = 1
+    while True:
+        chunk = list(itertools.islice(rows, batch_size))
+        if not chunk:
+            break
+        batch = {}
+        for row in chunk:
+            line += 1
+            try:
+                values = clean_row(row, report_date=report_date)
+            except (TypeError, ValueError) as e:
+                raise ExpenditureImportError(
+                    'Row {0}: {1}'.format(line, e)
+                ) from e
+            # Later rows for the same snapshot win.
+            batch[values['ilri_code'], values['report_date']] = values
+        with transaction.atomic():
+            created, updated = _write_batch(batch)
+        tracking.touch(Expenditure)
+        stats['processed'] += len(chunk)
+        stats['created'] += created
+        stats['updated'] += updated
+        if progress is not None:
+            progress(stats)
+    return stats
+
+
+def import_file(path, **kwargs):
+    return import_expenditures(read_file(path), **kwargs)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from livegene.apps.finance import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Update the Parquet archive of the expenditure history, one '
+        'partition per report month.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Root directory of the archive.')
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rewrite every partition, not only new and changed months.'
+        )
+
+    def handle(self, *args, **options):
+        stats = archive.export(options['path'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            'Wrote {written} partitions, kept {kept}, '
+            'removed {removed}.'.format(**stats)
+        ))
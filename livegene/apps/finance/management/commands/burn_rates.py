@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from livegene.apps.finance import analytics
+from livegene.apps.finance.models import Expenditure
+
+
+class Command(BaseCommand):
+    help = 'Report burn rates and projected exhaustion dates of projects.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ilri_code', nargs='*')
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Write the results as JSON.'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Expenditure.objects.all()
+        if options['ilri_code']:
+            queryset = queryset.filter(
+                project__ilri_code__in=options['ilri_code']
+            )
+        results = analytics.burn_rates(queryset)
+        if options['json']:
+            self.stdout.write(
+                json.dumps(results, cls=DjangoJSONEncoder, indent=2)
+            )
+            return
+        for row in results:
+            self.stdout.write(
+                '{ilri_code}: {burn_rate}/day, {percent_spent}% spent, '
+                '{percent_elapsed}% elapsed, '
+                'exhausted {exhaustion_date}'.format(**row)
+            )
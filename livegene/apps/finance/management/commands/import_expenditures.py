@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from livegene.apps.finance import importer
+
+
+class Command(BaseCommand):
+    help = 'Import expenditure snapshots from a CSV or XLSX finance export.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=importer.BATCH_SIZE,
+            help='Number of rows written per transaction.'
+        )
+        parser.add_argument(
+            '--report-date',
+            help='Report date for exports without a report_date column.'
+        )
+        parser.add_argument('--sheet', help='Worksheet of an XLSX export.')
+
+    def handle(self, *args, **options):
+        kwargs = {}
+        if options['sheet']:
+            if not importer.is_xlsx(options['path']):
+                raise CommandError('--sheet only applies to XLSX exports.')
+            kwargs['sheet'] = options['sheet']
+        try:
+            rows = importer.read_file(options['path'], **kwargs)
+            stats = importer.import_expenditures(
+                rows,
+                batch_size=options['batch_size'],
+                report_date=options['report_date'],
+                progress=self.report if options['verbosity'] > 0 else None
+            )
+        except (OSError, importer.ExpenditureImportError) as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {processed} rows: {created} created, '
+            '{updated} updated.'.format(**stats)
+        ))
+
+    def report(self, stats):
+        self.stdout.write(
+            '{processed} rows processed ({created} created, '
+            '{updated} updated)'.format(**stats)
+        )
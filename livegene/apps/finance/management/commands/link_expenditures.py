@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from livegene.apps.finance.models import Expenditure
+
+
+class Command(BaseCommand):
+    help = 'Link expenditure snapshots to projects by their ILRI code.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of project codes resolved per batch.'
+        )
+        parser.add_argument(
+            '--orphans',
+            action='store_true',
+            help='List the codes that match no project.'
+        )
+
+    def handle(self, *args, **options):
+        updated = Expenditure.objects.link_projects(
+            batch_size=options['batch_size']
+        )
+        self.stdout.write('Linked {0} snapshots.'.format(updated))
+        orphans = Expenditure.objects.orphan_codes()
+        if options['orphans']:
+            for row in orphans:
+                self.stdout.write(
+                    '{ilri_code}\t{snapshots}'.format(**row)
+                )
+        self.stdout.write('{0} codes match no project.'.format(
+            orphans.count()
+        ))
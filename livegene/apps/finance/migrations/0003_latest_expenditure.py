@@ -0,0 +1,49 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_latest(apps, schema_editor):
+    Expenditure = apps.get_model('finance', 'Expenditure')
+    LatestExpenditure = apps.get_model('finance', 'LatestExpenditure')
+    newest = Expenditure.objects.filter(
+        ilri_code=models.OuterRef('ilri_code')
+    ).order_by('-report_date').values('pk')[:1]
+    rows = Expenditure.objects.order_by().filter(
+        pk=models.Subquery(newest)
+    ).values_list('ilri_code', 'pk')
+    LatestExpenditure.objects.bulk_create(
+        LatestExpenditure(ilri_code=code, expenditure_id=pk)
+        for code, pk in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_auto_20180927_0837'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestExpenditure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ilri_code', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'ordering': ('ilri_code',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='expenditure',
+            index=models.Index(fields=['ilri_code', '-report_date'], name='finance_exp_code_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='latestexpenditure',
+            name='expenditure',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='latest', to='finance.Expenditure'),
+        ),
+        migrations.RunPython(populate_latest, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_projects(apps, schema_editor):
+    Expenditure = apps.get_model('finance', 'Expenditure')
+    Project = apps.get_model('livegene', 'Project')
+    Expenditure.objects.update(
+        project=models.Subquery(
+            Project.objects.filter(
+                ilri_code=models.OuterRef('ilri_code')
+            ).values('pk')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0019_allocation_ledger'),
+        ('finance', '0003_latest_expenditure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expenditure',
+            name='project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expenditures', to='livegene.Project'),
+        ),
+        migrations.RunPython(link_projects, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:16
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_table_changes(apps, schema_editor):
+    TableChange = apps.get_model('livegene', 'TableChange')
+    now = timezone.now()
+    TableChange.objects.bulk_create(
+        TableChange(table=table, modified=now)
+        for table in ('finance.expenditure', 'finance.latestexpenditure')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0021_modified_timestamps'),
+        ('finance', '0004_expenditure_project'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expenditure',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(seed_table_changes, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,62 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.utils import timezone
 
+from livegene.apps.livegene import changelog, tracking
+from livegene.apps.livegene.models import Project, TrackedModel
 
-class Expenditure(models.Model):
+
+class ExpenditureQuerySet(models.QuerySet):
+    def latest_snapshots(self):
+        """
+        Only keep the most recent snapshot of every project, as recorded
+        in the `LatestExpenditure` table.
+        """
+        return self.filter(latest__isnull=False)
+
+    def link_projects(self, batch_size=500):
+        """
+        Point every snapshot at the `Project` with its `ilri_code`, or at
+        none when no project has it, with one UPDATE per batch of codes,
+        and return the number of updated rows.
+        """
+        codes = list(
+            self.order_by().values_list('ilri_code', flat=True).distinct()
+        )
+        match = Subquery(
+            Project.objects.filter(
+                ilri_code=OuterRef('ilri_code')
+            ).values('pk')[:1]
+        )
+        updated = 0
+        for i in range(0, len(codes), batch_size):
+            chunk = codes[i:i + batch_size]
+            stale = self.filter(ilri_code__in=chunk).annotate(
+                match=match
+            ).filter(
+                Q(match__isnull=True, project__isnull=False) |
+                Q(match__isnull=False, project__isnull=True) |
+                Q(match__isnull=False, project__isnull=False) &
+                ~Q(project=F('match'))
+            )
+            with transaction.atomic():
+                updated += changelog.update(
+                    stale, project=match, modified=timezone.now()
+                )
+        tracking.touch(Expenditure)
+        return updated
+
+    def orphan_codes(self):
+        """
+        Project codes that do not match any `Project`, with the number
+        of snapshots of each.
+        """
+        return self.filter(project__isnull=True).order_by(
+            'ilri_code'
+        ).values('ilri_code').annotate(snapshots=Count('pk'))
+
+
+class Expenditure(TrackedModel):
     ilri_code = models.CharField(max_length=50)
     name = models.CharField(max_length=100)
     home_program = models.CharField(max_length=100)
@@ -10,10 +65,85 @@ class Expenditure(models.Model):
     report_date = models.DateTimeField()
     total_budget = models.PositiveIntegerField(blank=True, null=True)
     amount = models.PositiveIntegerField(blank=True, null=True)
+    project = models.ForeignKey(
+        'livegene.Project',
+        on_delete=models.SET_NULL,
+        related_name='expenditures',
+        blank=True,
+        null=True
+    )
+
+    objects = ExpenditureQuerySet.as_manager()
 
     class Meta:
         ordering = ('name',)
         unique_together = ('ilri_code', 'report_date')
+        indexes = [
+            models.Index(
+                fields=['ilri_code', '-report_date'],
+                name='finance_exp_code_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class LatestExpenditureManager(models.Manager):
+    BATCH_SIZE = 500
+
+    def refresh(self, codes=None):
+        """
+        Point the given project codes, or all of them, at their most
+        recent expenditure snapshot.
+        """
+        if codes is None:
+            with transaction.atomic():
+                self.all().delete()
+                self._create(Expenditure.objects.all())
+        else:
+            codes = sorted(set(codes))
+            with transaction.atomic():
+                for i in range(0, len(codes), self.BATCH_SIZE):
+                    chunk = codes[i:i + self.BATCH_SIZE]
+                    self.filter(ilri_code__in=chunk).delete()
+                    self._create(
+                        Expenditure.objects.filter(ilri_code__in=chunk)
+                    )
+        tracking.touch(LatestExpenditure)
+
+    def _create(self, queryset):
+        newest = Expenditure.objects.filter(
+            ilri_code=OuterRef('ilri_code')
+        ).order_by('-report_date').values('pk')[:1]
+        rows = queryset.order_by().filter(
+            pk=Subquery(newest)
+        ).values_list('ilri_code', 'pk')
+        self.bulk_create(
+            (
+                LatestExpenditure(ilri_code=code, expenditure_id=pk)
+                for code, pk in rows.iterator()
+            ),
+            batch_size=self.BATCH_SIZE
+        )
+
+
+class LatestExpenditure(models.Model):
+    """
+    Most recent `Expenditure` snapshot of every project code, kept up
+    to date by the importer and the expenditure signals.
+    """
+    ilri_code = models.CharField(max_length=50, unique=True)
+    expenditure = models.OneToOneField(
+        'Expenditure',
+        on_delete=models.CASCADE,
+        related_name='latest'
+    )
+
+    objects = LatestExpenditureManager()
+
+    class Meta:
+        ordering = ('ilri_code',)
+
+    def __str__(self):
+        return self.ilri_code
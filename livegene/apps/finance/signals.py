@@ -0,0 +1,84 @@
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.utils import timezone
+
+from livegene.apps.livegene import changelog, tracking
+from livegene.apps.livegene.models import Change, Project
+
+from .models import Expenditure, LatestExpenditure
+
+
+def link_project(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.project = Project.objects.filter(
+            ilri_code=instance.ilri_code
+        ).first()
+
+
+def link_expenditures(sender, instance, raw=False, **kwargs):
+    # Snapshots may be imported before their project is created, or
+    # still point to a project whose code was changed.
+    if not raw:
+        changelog.update(
+            Expenditure.objects.filter(project=instance).exclude(
+                ilri_code=instance.ilri_code
+            ),
+            project=None,
+            modified=timezone.now()
+        )
+        changelog.update(
+            Expenditure.objects.filter(ilri_code=instance.ilri_code).exclude(
+                project=instance
+            ),
+            project=instance,
+            modified=timezone.now()
+        )
+        tracking.touch(Expenditure)
+
+
+def remember_expenditures(sender, instance, **kwargs):
+    # Deleting a project sets the project of its snapshots to NULL
+    # without sending any signal for them.
+    instance._unlinked_expenditures = list(
+        instance.expenditures.values_list('pk', flat=True)
+    )
+
+
+def log_unlinked(sender, instance, using=None, **kwargs):
+    pks = instance.__dict__.pop('_unlinked_expenditures', [])
+    if pks:
+        changelog.record(Expenditure, pks, Change.UPDATE, using)
+        tracking.touch(Expenditure)
+
+
+def remember_code(sender, instance, raw=False, **kwargs):
+    # A snapshot moved to another project code leaves the latest
+    # snapshot of its previous code to refresh as well.
+    instance._latest_previous_code = None
+    if not raw and not instance._state.adding:
+        instance._latest_previous_code = sender._default_manager.filter(
+            pk=instance.pk
+        ).values_list('ilri_code', flat=True).first()
+
+
+def refresh_latest(sender, instance, raw=False, **kwargs):
+    if not raw:
+        codes = [instance.ilri_code]
+        previous = instance.__dict__.pop('_latest_previous_code', None)
+        if previous is not None:
+            codes.append(previous)
+        LatestExpenditure.objects.refresh(codes)
+
+
+def connect():
+    pre_save.connect(link_project, sender=Expenditure)
+    post_save.connect(link_expenditures, sender=Project)
+    pre_delete.connect(remember_expenditures, sender=Project)
+    post_delete.connect(log_unlinked, sender=Project)
+    pre_save.connect(remember_code, sender=Expenditure)
+    post_save.connect(refresh_latest, sender=Expenditure)
+    post_delete.connect(refresh_latest, sender=Expenditure)
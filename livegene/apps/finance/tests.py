@@ -1,3 +1,288 @@
-from django.test import TestCase
+import datetime
+import os
+import random
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from livegene.apps.livegene.models import Change, Person, Project
+
+from . import analytics, importer
+from .models import Expenditure, LatestExpenditure
+
+
+class LatestExpenditureTests(TestCase):
+    def expenditure(self, ilri_code, days_ago=0):
+        return Expenditure.objects.create(
+            ilri_code=ilri_code,
+            name='Snapshot {0}'.format(ilri_code),
+            home_program='Biosciences',
+            start_date=datetime.date(2018, 1, 1),
+            report_date=timezone.now() - datetime.timedelta(days=days_ago)
+        )
+
+    def latest(self):
+        return dict(LatestExpenditure.objects.values_list(
+            'ilri_code', 'expenditure'
+        ))
+
+    def test_saving_a_snapshot_refreshes_its_code(self):
+        older = self.expenditure('A1', days_ago=30)
+        newer = self.expenditure('A1')
+        self.assertEqual(self.latest(), {'A1': newer.pk})
+        newer.delete()
+        self.assertEqual(self.latest(), {'A1': older.pk})
+
+    def test_changing_the_code_refreshes_the_previous_code(self):
+        expenditure = self.expenditure('A1')
+        expenditure.ilri_code = 'B2'
+        expenditure.save()
+        self.assertEqual(self.latest(), {'B2': expenditure.pk})
+
+    def test_changing_the_code_keeps_the_other_snapshots_of_the_previous_code(
+            self):
+        older = self.expenditure('A1', days_ago=30)
+        newer = self.expenditure('A1')
+        newer.ilri_code = 'B2'
+        newer.save()
+        self.assertEqual(self.latest(), {'A1': older.pk, 'B2': newer.pk})
+
+
+class ImporterTests(TestCase):
+    def rows(self, count, amount):
+        return [
+            {
+                'ilri_code': 'C{0:03d}'.format(i),
+                'name': 'Project {0}'.format(i),
+                'home_program': 'Biosciences',
+                'start_date': '2018-01-01',
+                'report_date': '2019-06-30',
+                'amount': str(amount + i),
+            }
+            for i in range(count)
+        ]
+
+    def test_changed_rows_are_updated_in_batches(self):
+        importer.import_expenditures(self.rows(100, 1000))
+        with CaptureQueriesContext(connection) as queries:
+            stats = importer.import_expenditures(
+                self.rows(100, 2000), batch_size=100
+            )
+        self.assertEqual(stats['updated'], 100)
+        self.assertEqual(
+            sorted(Expenditure.objects.values_list('amount', flat=True)),
+            list(range(2000, 2100))
+        )
+        updates = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "finance_expenditure"')
+        ]
+        self.assertEqual(
+            len(updates), -(-100 // importer.UPDATE_BATCH_SIZE)
+        )
+        self.assertEqual(
+            Change.objects.filter(
+                table='finance.expenditure', action=Change.UPDATE
+            ).count(),
+            100
+        )
+
+    def test_unchanged_rows_are_not_updated(self):
+        importer.import_expenditures(self.rows(10, 1000))
+        stats = importer.import_expenditures(self.rows(10, 1000))
+        self.assertEqual(stats['updated'], 0)
+
+    def test_sheet_requires_an_xlsx_export(self):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with self.assertRaisesMessage(CommandError, 'XLSX'):
+            call_command('import_expenditures', path, sheet='Data')
+
+    def test_unknown_sheet(self):
+        from openpyxl import Workbook
+
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        workbook = Workbook()
+        workbook.active.title = 'Data'
+        workbook.save(path)
+        with self.assertRaisesMessage(CommandError, "No worksheet 'Other'"):
+            call_command('import_expenditures', path, sheet='Other')
+
+    def test_csv_that_is_not_utf_8(self):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'wb') as f:
+            f.write('ilri_code,name\nC001,Caf\u00e9\n'.encode('latin-1'))
+        self.addCleanup(os.remove, path)
+        with self.assertRaisesMessage(CommandError, 'not utf-8-sig text'):
+            call_command('import_expenditures', path, verbosity=0)
+
+    @override_settings(TIME_ZONE='Africa/Nairobi')
+    def test_naive_report_dates_are_in_the_default_time_zone(self):
+        row = self.rows(1, 1000)[0]
+        self.assertEqual(
+            importer.clean_row(row)['report_date'],
+            datetime.datetime(2019, 6, 29, 21, tzinfo=timezone.utc)
+        )
+        row['report_date'] = '2019-06-30T12:00:00Z'
+        self.assertEqual(
+            importer.clean_row(row)['report_date'],
+            datetime.datetime(2019, 6, 30, 12, tzinfo=timezone.utc)
+        )
+
+
+class LinkProjectsTests(TestCase):
+    def setUp(self):
+        person = Person.objects.create(
+            username='jdoe',
+            first_name='Jane',
+            last_name='Doe',
+            home_program='Biosciences',
+            email='jdoe@example.org'
+        )
+        self.project = Project.objects.create(
+            ilri_code='A1',
+            full_name='Livestock Genetics',
+            principal_investigator=person,
+            projects_group='Genetics',
+            start_date=datetime.date(2018, 1, 1),
+            end_date=datetime.date(2020, 12, 31),
+            status=0,
+            capacity_development=0
+        )
+
+    def expenditure(self, ilri_code, project):
+        expenditure = Expenditure.objects.create(
+            ilri_code=ilri_code,
+            name='Snapshot {0}'.format(ilri_code),
+            home_program='Biosciences',
+            start_date=datetime.date(2018, 1, 1),
+            report_date=timezone.now()
+        )
+        # Bypasses the signal linking saved snapshots.
+        Expenditure.objects.filter(pk=expenditure.pk).update(project=project)
+        return expenditure.pk
+
+    def test_links_are_set_and_cleared_in_one_update(self):
+        unlinked = self.expenditure('A1', None)
+        stale = self.expenditure('B2', self.project)
+        linked = self.expenditure('A1', self.project)
+        orphan = self.expenditure('C3', None)
+        with CaptureQueriesContext(connection) as queries:
+            updated = Expenditure.objects.link_projects()
+        self.assertEqual(updated, 2)
+        self.assertEqual(
+            dict(Expenditure.objects.values_list('pk', 'project')),
+            {unlinked: self.project.pk, stale: None,
+             linked: self.project.pk, orphan: None}
+        )
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "finance_expenditure"')
+        ]), 1)
+        self.assertEqual(
+            set(Change.objects.filter(
+                table='finance.expenditure', action=Change.UPDATE
+            ).values_list('object_id', flat=True)),
+            {unlinked, stale}
+        )
+
+
+class AnalyticsTests(TestCase):
+    def history(self, snapshots):
+        # (project, start, end, report, amount, budget) rows, dates as
+        # days since the epoch
+        columns = list(zip(*snapshots))
+        return {
+            'project': np.array(columns[0], dtype=np.int64),
+            'ilri_code': np.array(
+                ['P{0}'.format(pk) for pk in columns[0]], dtype=object
+            ),
+            'start': np.array(columns[1], dtype=np.float64),
+            'end': np.array(columns[2], dtype=np.float64),
+            'report': np.array(columns[3], dtype=np.float64),
+            'amount': np.array(columns[4], dtype=np.float64),
+            'budget': np.array(columns[5], dtype=np.float64),
+        }
+
+    def burn_rate(self, snapshots):
+        # Plain least squares, or the average rate since the start when
+        # the report dates do not vary
+        snapshots = [row for row in snapshots if row[4] == row[4]]
+        if not snapshots:
+            return None
+        start = snapshots[0][1]
+        xs = [row[3] for row in snapshots]
+        ys = [row[4] for row in snapshots]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        variance = sum((x - mean_x) ** 2 for x in xs)
+        if variance:
+            return sum(
+                (x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)
+            ) / variance
+        if xs[-1] == start:
+            return None
+        return ys[-1] / (xs[-1] - start)
+
+    def test_burn_rate_matches_plain_least_squares(self):
+        rng = random.Random(0)
+        snapshots = []
+        for project in range(1, 41):
+            start = 17000 + rng.randrange(1000)
+            end = start + rng.randrange(200, 2000)
+            count = rng.choice([1, 1, 2, 3, 5, 12])
+            # Some projects report the same day several times.
+            same_day = rng.random() < 0.2
+            report = start + rng.randrange(1, 100)
+            amount = 0
+            for i in range(count):
+                if not same_day:
+                    report += rng.randrange(1, 60)
+                amount += rng.randrange(0, 50000)
+                snapshots.append((
+                    project, start, end, report,
+                    float('nan') if rng.random() < 0.05 else amount,
+                    1000000
+                ))
+        results = {
+            result['project']: result
+            for result in analytics.forecast(self.history(snapshots))
+        }
+        checked = 0
+        for project in range(1, 41):
+            rows = [row for row in snapshots if row[0] == project]
+            expected = self.burn_rate(rows)
+            if expected is None:
+                self.assertIsNone(
+                    results.get(project, {}).get('burn_rate'), project
+                )
+                continue
+            self.assertAlmostEqual(
+                results[project]['burn_rate'], expected, delta=0.01
+            )
+            checked += 1
+        self.assertGreater(checked, 30)
+
+    def test_single_and_same_day_snapshots_use_the_average_rate(self):
+        results = analytics.forecast(self.history([
+            (1, 100, 500, 200, 5000, 20000),
+            (2, 100, 500, 300, 1000, 20000),
+            (2, 100, 500, 300, 4000, 20000),
+        ]))
+        self.assertEqual(
+            [result['burn_rate'] for result in results], [50.0, 20.0]
+        )
+        self.assertEqual(results[0]['percent_spent'], 25.0)
+        self.assertEqual(results[0]['percent_elapsed'], 25.0)
+        self.assertEqual(
+            results[0]['exhaustion_date'],
+            analytics.EPOCH + datetime.timedelta(days=500)
+        )
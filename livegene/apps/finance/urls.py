@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'finance'
+urlpatterns = [
+    path('burn-rates/', views.burn_rates, name='burn-rates'),
+]
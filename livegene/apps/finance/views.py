@@ -1,3 +1,14 @@
-from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 
-# Create your views here.
+from . import analytics
+from .models import Expenditure
+
+
+@staff_member_required
+def burn_rates(request):
+    queryset = Expenditure.objects.all()
+    codes = request.GET.getlist('ilri_code')
+    if codes:
+        queryset = queryset.filter(project__ilri_code__in=codes)
+    return JsonResponse({'projects': analytics.burn_rates(queryset)})
@@ -0,0 +1 @@
+default_app_config = 'livegene.apps.livegene.apps.LivegeneAppConfig'
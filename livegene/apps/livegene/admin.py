@@ -1,9 +1,15 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.db import models
+from django.db.models import Q
 from django.forms import TextInput
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
 from django.contrib.admin.widgets import AdminURLFieldWidget
 
 from .models import (
+    AllocationQuerySet,
     Project,
     Partnership,
     PartnershipRole,
@@ -18,8 +24,216 @@ from .models import (
     SDGRole,
     SamplingActivity,
     SamplingDocumentType,
-    SamplingDocument
+    SamplingDocument,
+    Logo
 )
+from . import ledger, reference, search
+from .pagination import EstimatedCountPaginator
+
+
+REFERENCE_MODELS = (Country, SDG, PartnershipRoleType, SamplingDocumentType)
+
+
+class ReferenceChoicesMixin:
+    """
+    Build the choices of foreign keys to reference tables from the
+    process-local cache instead of querying them for every form.
+    """
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs
+        )
+        model = db_field.related_model
+        if model in REFERENCE_MODELS and db_field.name not in \
+                self.get_autocomplete_fields(request):
+            formfield.choices = reference.choices(
+                model, blank=formfield.empty_label is not None
+            )
+        return formfield
+
+
+class IndexedSearchMixin:
+    """
+    Search the change list and autocomplete widgets with the full-text
+    index. `indexed_search` names the indexed relations to search, the
+    empty string standing for the model itself; `search_fields` are
+    still required by the autocomplete widgets of other models.
+    """
+    indexed_search = ('',)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search.words(search_term):
+            return queryset, False
+        backend = search.backend()
+        condition = Q()
+        for path in self.indexed_search:
+            model = self.model
+            for name in filter(None, path.split('__')):
+                model = model._meta.get_field(name).related_model
+            condition |= Q(**{
+                '{0}__in'.format(path or 'pk'):
+                backend.matches(model, search_term)
+            })
+        return queryset.filter(condition), False
+
+
+class LogoChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        Logo.attach(self.result_list)
+
+
+class LogoListMixin:
+    """
+    Show the `logo` column of a change list, looking up the logos of a
+    page with one query.
+    """
+    def get_changelist(self, request, **kwargs):
+        return LogoChangeList
+
+
+class LargeTableAdmin(ReferenceChoicesMixin, admin.ModelAdmin):
+    """
+    Changelist settings for tables that grow with the portfolio: the
+    counts are estimated for unfiltered pages and the unfiltered total
+    is not computed next to filtered results.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class AllocationFilter(admin.SimpleListFilter):
+    title = 'allocation'
+    parameter_name = 'allocation'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('over', 'Over-allocated'),
+            ('full', 'Fully allocated'),
+            ('under', 'Under-allocated'),
+        )
+
+    def queryset(self, request, queryset):
+        # Uses the indexed totals of the allocation ledger.
+        if self.value() == 'over':
+            return queryset.filter(person__allocation__total__gt=100)
+        if self.value() == 'full':
+            return queryset.filter(person__allocation__total=100)
+        if self.value() == 'under':
+            return queryset.filter(person__allocation__total__lt=100)
+
+
+class ActivityFilter(admin.SimpleListFilter):
+    title = 'activity'
+    parameter_name = 'activity'
+    ENDING_DAYS = 30
+
+    def lookups(self, request, model_admin):
+        return (
+            ('active', 'Active today'),
+            ('ending', 'Ending in {0} days'.format(self.ENDING_DAYS)),
+            ('ended', 'Ended'),
+        )
+
+    def queryset(self, request, queryset):
+        # Uses the date indexes of the interval models.
+        if self.value() == 'active':
+            return queryset.active_on(timezone.localdate())
+        if self.value() == 'ending':
+            return queryset.ending_within(self.ENDING_DAYS)
+        if self.value() == 'ended':
+            return queryset.filter(end_date__lt=timezone.localdate())
+
+
+class RoleInline(ReferenceChoicesMixin, admin.TabularInline):
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            *self.autocomplete_fields
+        )
+
+
+class PersonRoleInline(RoleInline):
+    model = PersonRole
+    autocomplete_fields = ('person',)
+
+
+class CountryRoleInline(RoleInline):
+    model = CountryRole
+
+
+class SDGRoleInline(RoleInline):
+    model = SDGRole
+
+
+class PartnershipRoleInline(RoleInline):
+    model = PartnershipRole
+    autocomplete_fields = ('partnership',)
+
+
+class ProjectAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    search_fields = ('ilri_code', 'full_name', 'short_name')
+    list_filter = (ActivityFilter,)
+    autocomplete_fields = ('principal_investigator',)
+    inlines = (
+        PersonRoleInline,
+        CountryRoleInline,
+        SDGRoleInline,
+        PartnershipRoleInline,
+    )
+
+    class Media:
+        js = ('livegene/js/percent_total.js',)
+
+    def save_related(self, request, form, formsets, change):
+        # The change view already runs in a transaction; refresh the
+        # allocation ledger once for all inlines.
+        with ledger.deferred():
+            super().save_related(request, form, formsets, change)
+
+    def save_formset(self, request, form, formset, change):
+        """
+        Insert the new roles of an allocation inline with one
+        bulk_create, which records them like saves do.
+        """
+        if not isinstance(formset.model._default_manager.all(),
+                          AllocationQuerySet):
+            return super().save_formset(request, form, formset, change)
+        instances = formset.save(commit=False)
+        for obj in formset.deleted_objects:
+            obj.delete()
+        new = []
+        for obj in instances:
+            if obj.pk is None:
+                new.append(obj)
+            else:
+                obj.save()
+        formset.model._default_manager.bulk_create(new)
+        formset.save_m2m()
+
+
+class PartnershipAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    indexed_search = ('partner',)
+    search_fields = ('partner__full_name', 'partner__short_name')
+    list_filter = (ActivityFilter,)
+    autocomplete_fields = ('partner', 'contact')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('partner')
+
+
+class PartnershipRoleAdmin(IndexedSearchMixin, LargeTableAdmin):
+    indexed_search = ('project', 'partnership__partner')
+    list_display = ('project', 'partnership', 'role_type')
+    list_select_related = ('project', 'partnership__partner', 'role_type')
+    list_filter = ('role_type',)
+    search_fields = (
+        '^project__ilri_code',
+        'project__full_name',
+        'partnership__partner__full_name'
+    )
+    autocomplete_fields = ('project', 'partnership')
 
 
 class PartnershipRoleTypeAdmin(admin.ModelAdmin):
@@ -28,7 +242,10 @@ class PartnershipRoleTypeAdmin(admin.ModelAdmin):
     readonly_fields = ('id',)
 
 
-class OrganisationAdmin(admin.ModelAdmin):
+class OrganisationAdmin(LogoListMixin, IndexedSearchMixin,
+                        ReferenceChoicesMixin, admin.ModelAdmin):
+    list_display = ('full_name', 'short_name', 'logo')
+    search_fields = ('full_name', 'short_name')
     fields = ('short_name', 'full_name', 'logo', 'logo_url', 'country')
     readonly_fields = ('logo',)
     formfield_overrides = {
@@ -40,23 +257,63 @@ class OrganisationAdmin(admin.ModelAdmin):
     }
 
 
-class PersonRoleAdmin(admin.ModelAdmin):
+class PersonAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    search_fields = ('last_name', 'first_name', 'username')
+
+
+class PersonRoleAdmin(IndexedSearchMixin, LargeTableAdmin):
+    indexed_search = ('project', 'person')
+    list_display = ('project', 'person', 'percent', 'total_percentage')
+    list_select_related = ('project', 'person')
+    list_filter = (AllocationFilter,)
+    search_fields = (
+        '^project__ilri_code',
+        'project__full_name',
+        '^person__username',
+        'person__last_name'
+    )
     fields = ('project', 'person', 'percent', 'total_percentage')
     readonly_fields = ('total_percentage',)
+    autocomplete_fields = ('project', 'person')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
 
 
-class CountryRoleAdmin(admin.ModelAdmin):
+class ContactPersonAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    search_fields = ('last_name', 'first_name', 'email')
+
+
+class CountryRoleAdmin(IndexedSearchMixin, LargeTableAdmin):
+    indexed_search = ('project',)
+    list_display = ('project', 'country', 'percent', 'total_percentage')
+    list_select_related = ('project', 'country')
+    list_filter = ('country',)
+    search_fields = ('^project__ilri_code', 'project__full_name')
     fields = ('project', 'country', 'percent', 'total_percentage')
     readonly_fields = ('total_percentage',)
+    autocomplete_fields = ('project',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
 
 
-class SDGRoleAdmin(admin.ModelAdmin):
+class SDGRoleAdmin(IndexedSearchMixin, LargeTableAdmin):
+    indexed_search = ('project',)
+    list_display = ('project', 'sdg', 'percent', 'total_percentage')
+    list_select_related = ('project', 'sdg')
+    list_filter = ('sdg',)
+    search_fields = ('^project__ilri_code', 'project__full_name')
     fields = ('project', 'sdg', 'percent', 'total_percentage')
     readonly_fields = ('total_percentage',)
+    autocomplete_fields = ('project',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
 
-class SDGAdmin(admin.ModelAdmin):
-    list_display = ('headline', 'full_name')
+
+class SDGAdmin(LogoListMixin, admin.ModelAdmin):
+    list_display = ('headline', 'full_name', 'logo')
     fields = ('headline', 'full_name', 'color', 'link', 'logo', 'logo_url')
     readonly_fields = ('logo',)
     formfield_overrides = {
@@ -68,18 +325,47 @@ class SDGAdmin(admin.ModelAdmin):
     }
 
 
-admin.site.register(Project)
-admin.site.register(Partnership)
-admin.site.register(PartnershipRole)
+class SamplingActivityAdmin(admin.ModelAdmin):
+    search_fields = ('description',)
+    list_filter = (ActivityFilter,)
+    autocomplete_fields = ('project', 'partnership')
+
+
+class SamplingDocumentAdmin(LargeTableAdmin):
+    list_display = (
+        'sampling_activity',
+        'document_type',
+        'filename',
+        'size',
+        'download'
+    )
+    list_select_related = ('sampling_activity', 'document_type')
+    list_filter = ('document_type',)
+    search_fields = ('sampling_activity__description', 'filename', '=sha256')
+    autocomplete_fields = ('sampling_activity',)
+    readonly_fields = ('filename', 'sha256', 'size', 'content_type')
+
+    def download(self, obj):
+        if not obj.document:
+            return '-'
+        return format_html(
+            '<a href="{0}">Download</a>',
+            reverse('livegene:document-download', args=[obj.pk])
+        )
+
+
+admin.site.register(Project, ProjectAdmin)
+admin.site.register(Partnership, PartnershipAdmin)
+admin.site.register(PartnershipRole, PartnershipRoleAdmin)
 admin.site.register(PartnershipRoleType, PartnershipRoleTypeAdmin)
 admin.site.register(Organisation, OrganisationAdmin)
-admin.site.register(Person)
+admin.site.register(Person, PersonAdmin)
 admin.site.register(PersonRole, PersonRoleAdmin)
-admin.site.register(ContactPerson)
+admin.site.register(ContactPerson, ContactPersonAdmin)
 admin.site.register(Country)
 admin.site.register(CountryRole, CountryRoleAdmin)
 admin.site.register(SDG, SDGAdmin)
 admin.site.register(SDGRole, SDGRoleAdmin)
 admin.site.register(SamplingDocumentType)
-admin.site.register(SamplingActivity)
-admin.site.register(SamplingDocument)
+admin.site.register(SamplingActivity, SamplingActivityAdmin)
+admin.site.register(SamplingDocument, SamplingDocumentAdmin)
@@ -0,0 +1,364 @@
+"""
+Read-only JSON API.
+
+Every resource lists the rows of one model ordered by its
+`Meta.ordering` (with the primary key as tie-breaker) and paginates
+them with a keyset cursor, so a page costs the same wherever it is in
+the table. Clients may restrict the returned columns with
+`?fields=a,b` and embed related rows with `?expand=x,y`; each expanded
+relation is fetched with one query per page, not one per row.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.http import JsonResponse
+
+from .models import (
+    ContactPerson,
+    Country,
+    CountryRole,
+    Organisation,
+    Partnership,
+    PartnershipRole,
+    PartnershipRoleType,
+    Person,
+    PersonRole,
+    Project,
+    SamplingActivity,
+    SamplingDocument,
+    SamplingDocumentType,
+    SDG,
+    SDGRole
+)
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class BadRequest(Exception):
+    pass
+
+
+class Resource:
+    model = None
+    fields = ()
+    expand = ()
+
+    def __init__(self, fields=None, expand=None):
+        self.selected = self._check(fields, self.fields, 'field')
+        self.expanded = self._check(expand or [], self.expand, 'expansion')
+
+    @staticmethod
+    def _check(names, allowed, kind):
+        if names is None:
+            return list(allowed)
+        unknown = set(names) - set(allowed)
+        if unknown:
+            raise BadRequest('Unknown {0}: {1}'.format(
+                kind, ', '.join(sorted(unknown))
+            ))
+        return list(names)
+
+    @property
+    def ordering(self):
+        """
+        Return (field, descending) pairs of the model ordering, made
+        unique with the primary key.
+        """
+        ordering = []
+        for name in self.model._meta.ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            if name == 'pk':
+                name = 'id'
+            ordering.append((name, descending))
+        if 'id' not in [name for name, descending in ordering]:
+            ordering.append(('id', False))
+        return ordering
+
+    def order_by(self):
+        return [
+            F(name).desc(nulls_last=True) if descending
+            else F(name).asc(nulls_last=True)
+            for name, descending in self.ordering
+        ]
+
+    def after(self, values):
+        """
+        Return the filter selecting the rows that follow `values` in
+        the ordering. NULLs are always sorted last.
+        """
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            field = self.model._meta.get_field(name)
+            if value is None:
+                later = Q(pk__in=[])
+                same = Q(**{name + '__isnull': True})
+            else:
+                lookup = '__lt' if descending else '__gt'
+                later = Q(**{name + lookup: value})
+                if field.null:
+                    later |= Q(**{name + '__isnull': True})
+                same = Q(**{name: value})
+            condition |= equal & later
+            equal &= same
+        return condition
+
+    def encode_cursor(self, row):
+        values = [row[name] for name, descending in self.ordering]
+        data = json.dumps(values, cls=DjangoJSONEncoder).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                None if value is None else
+                self.model._meta.get_field(name).to_python(value)
+                for (name, descending), value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise BadRequest('Invalid cursor')
+
+    def page(self, cursor=None, limit=DEFAULT_LIMIT):
+        keys = [name for name, descending in self.ordering]
+        queryset = self.model._default_manager.order_by(*self.order_by())
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor)))
+        forward = [
+            name for name in self.expanded
+            if self.model._meta.get_field(name).many_to_one
+        ]
+        columns = list(
+            dict.fromkeys(['id'] + self.selected + keys + forward)
+        )
+        rows = list(queryset.values(*columns)[:limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor(rows[-1])
+        results = [self.serialize(row) for row in rows]
+        for name in self.expanded:
+            self.embed(name, rows, results)
+        return {'results': results, 'next': next_cursor}
+
+    def serialize(self, row):
+        data = {'id': row['id']}
+        for name in self.selected:
+            data[name] = row[name]
+        return data
+
+    def embed(self, name, rows, results):
+        """
+        Add the related rows of `name` to every result with a single
+        query.
+        """
+        field = self.model._meta.get_field(name)
+        related = RESOURCES[field.related_model]()
+        if field.many_to_one:
+            objects = related.fetch(
+                id__in={row[name] for row in rows} - {None}
+            )
+            for row, result in zip(rows, results):
+                result[name] = objects.get(row[name])
+        elif field.one_to_many:
+            column = field.field.name
+            # The back-reference is only kept if it was selected.
+            selected = column in related.selected
+            grouped = {}
+            for obj in related.fetch_rows(
+                extra=[] if selected else [column],
+                **{column + '__in': [row['id'] for row in rows]}
+            ):
+                owner = obj[column] if selected else obj.pop(column)
+                grouped.setdefault(owner, []).append(obj)
+            for row, result in zip(rows, results):
+                result[name] = grouped.get(row['id'], [])
+        elif field.many_to_many:
+            through = getattr(self.model, name).through
+            source = field.m2m_field_name()
+            target = field.m2m_reverse_field_name()
+            links = list(through.objects.filter(
+                **{source + '__in': [row['id'] for row in rows]}
+            ).values_list(source, target))
+            objects = related.fetch(id__in={pk for _, pk in links})
+            grouped = {}
+            for owner, pk in links:
+                grouped.setdefault(owner, []).append(objects[pk])
+            for row, result in zip(rows, results):
+                result[name] = grouped.get(row['id'], [])
+
+    def fetch_rows(self, extra=(), **filters):
+        columns = list(dict.fromkeys(['id'] + self.selected + list(extra)))
+        rows = self.model._default_manager.filter(**filters).values(*columns)
+        for row in rows:
+            data = self.serialize(row)
+            for name in extra:
+                data[name] = row[name]
+            yield data
+
+    def fetch(self, **filters):
+        return {row['id']: row for row in self.fetch_rows(**filters)}
+
+    @classmethod
+    def models(cls):
+        """
+        Return the models the output of this resource is read from.
+        """
+        models = [cls.model]
+        for name in cls.expand:
+            field = cls.model._meta.get_field(name)
+            models.append(field.related_model)
+            if field.many_to_many:
+                models.append(getattr(cls.model, name).through)
+        return models
+
+
+class ProjectResource(Resource):
+    model = Project
+    fields = (
+        'ilri_code',
+        'full_name',
+        'short_name',
+        'principal_investigator',
+        'projects_group',
+        'donor_reference',
+        'donor_project_name',
+        'start_date',
+        'end_date',
+        'status',
+        'capacity_development',
+    )
+    expand = (
+        'principal_investigator',
+        'person_roles',
+        'country_roles',
+        'sdg_roles',
+        'partnership_roles',
+        'sampling_activities',
+    )
+
+
+class PersonResource(Resource):
+    model = Person
+    fields = ('username', 'first_name', 'last_name', 'home_program', 'email')
+    expand = ('roles', 'projects')
+
+
+class OrganisationResource(Resource):
+    model = Organisation
+    fields = ('short_name', 'full_name', 'logo_url', 'country')
+    expand = ('country', 'partnerships')
+
+
+class PartnershipResource(Resource):
+    model = Partnership
+    fields = ('partner', 'start_date', 'end_date')
+    expand = ('partner', 'contact', 'roles', 'sampling_activities')
+
+
+class PartnershipRoleResource(Resource):
+    model = PartnershipRole
+    fields = ('project', 'partnership', 'role_type')
+    expand = ('project', 'partnership', 'role_type')
+
+
+class PartnershipRoleTypeResource(Resource):
+    model = PartnershipRoleType
+    fields = ('description',)
+
+
+class PersonRoleResource(Resource):
+    model = PersonRole
+    fields = ('project', 'person', 'percent')
+    expand = ('project', 'person')
+
+
+class ContactPersonResource(Resource):
+    model = ContactPerson
+    fields = ('title', 'first_name', 'last_name', 'email', 'phone')
+
+
+class CountryResource(Resource):
+    model = Country
+    fields = ('country',)
+
+
+class CountryRoleResource(Resource):
+    model = CountryRole
+    fields = ('project', 'country', 'percent')
+    expand = ('project', 'country')
+
+
+class SDGResource(Resource):
+    model = SDG
+    fields = ('headline', 'full_name', 'color', 'link', 'logo_url')
+
+
+class SDGRoleResource(Resource):
+    model = SDGRole
+    fields = ('project', 'sdg', 'percent')
+    expand = ('project', 'sdg')
+
+
+class SamplingActivityResource(Resource):
+    model = SamplingActivity
+    fields = ('project', 'partnership', 'description', 'start_date',
+              'end_date')
+    expand = ('project', 'partnership', 'sampling_documents')
+
+
+class SamplingDocumentTypeResource(Resource):
+    model = SamplingDocumentType
+    fields = ('short_name', 'long_name')
+
+
+class SamplingDocumentResource(Resource):
+    model = SamplingDocument
+    fields = ('sampling_activity', 'document_type', 'document', 'filename',
+              'sha256', 'size', 'content_type')
+    expand = ('sampling_activity', 'document_type')
+
+
+RESOURCES = {
+    resource.model: resource
+    for resource in Resource.__subclasses__()
+}
+
+
+def _names(request, parameter):
+    value = request.GET.get(parameter)
+    if value is None:
+        return None
+    return [name for name in value.split(',') if name]
+
+
+def resource_list(request, resource):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+        if not 0 < limit <= MAX_LIMIT:
+            raise ValueError
+    except ValueError:
+        return JsonResponse(
+            {'error': 'limit must be between 1 and {0}'.format(MAX_LIMIT)},
+            status=400
+        )
+    try:
+        page = resource(
+            fields=_names(request, 'fields'),
+            expand=_names(request, 'expand')
+        ).page(cursor=request.GET.get('cursor'), limit=limit)
+    except BadRequest as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if page['next']:
+        query = request.GET.copy()
+        query['cursor'] = page['next']
+        page['next'] = '{0}?{1}'.format(request.path, query.urlencode())
+    return JsonResponse(page)
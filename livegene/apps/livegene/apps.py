@@ -2,4 +2,9 @@ from django.apps import AppConfig
 
 
 class LivegeneAppConfig(AppConfig):
-    name = 'livegene_app'
+    name = 'livegene.apps.livegene'
+    label = 'livegene'
+
+    def ready(self):
+        from . import signals
+        signals.connect()
@@ -0,0 +1,109 @@
+"""
+Response cache for read-mostly views.
+
+Every cached view declares the models its output depends on. Each
+model has a generation number in the cache which is part of the keys
+of the responses depending on it; every change recorded by
+`tracking.touch()` bumps the generation of the changed model, so only
+the responses built from it stop being found and everything else
+stays cached. The generation is bumped again when the transaction of
+the change commits: another process may have cached a response from
+the data it still read before the commit. Hits and misses are counted
+per view.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+
+
+CACHE_TIMEOUT = 60 * 60
+PREFIX = 'livegene'
+
+
+def _generation_key(model):
+    return '{0}:generation:{1}'.format(PREFIX, model._meta.label_lower)
+
+
+def generations(models):
+    keys = [_generation_key(model) for model in models]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # Start from the clock so that a generation lost from the
+            # cache never matches responses stored before.
+            cache.add(key, int(time.time() * 1000), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def invalidate(*models):
+    for model in models:
+        key = _generation_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), None)
+
+
+def _count(name, outcome):
+    key = '{0}:stats:{1}:{2}'.format(PREFIX, name, outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def stats(names):
+    keys = {
+        (name, outcome): '{0}:stats:{1}:{2}'.format(PREFIX, name, outcome)
+        for name in names
+        for outcome in ('hits', 'misses')
+    }
+    values = cache.get_many(keys.values())
+    return {
+        name: {
+            outcome: values.get(keys[name, outcome], 0)
+            for outcome in ('hits', 'misses')
+        }
+        for name in names
+    }
+
+
+def response_key(name, request, models, kwargs):
+    parts = [
+        sorted(request.GET.lists()),
+        sorted((key, str(value)) for key, value in kwargs.items()),
+        generations(models),
+    ]
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return '{0}:view:{1}:{2}'.format(PREFIX, name, digest)
+
+
+def cached_view(name, models, timeout=CACHE_TIMEOUT):
+    """
+    Cache the GET responses of a view by its parameters. `models` is
+    either a sequence of models or a function of the view keyword
+    arguments returning one.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            dependencies = models(**kwargs) if callable(models) else models
+            key = response_key(name, request, dependencies, kwargs)
+            response = cache.get(key)
+            if response is not None:
+                _count(name, 'hits')
+                return response
+            _count(name, 'misses')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, response, timeout)
+            return response
+        wrapper.cached_view = name
+        return wrapper
+    return decorator
@@ -0,0 +1,281 @@
+"""
+Change-data-capture log of the livegene and finance tables.
+
+Every insert, update and delete of a tracked row appends a `Change`
+whose primary key is its sequence number, so a consumer only has to
+remember the last sequence it read to fetch what changed since. Saves,
+deletes and many-to-many changes are recorded by signals; bulk
+operations, which send none, record their rows themselves. Entries are
+written in the transaction of the change they record.
+
+SQLite serialises writers, so sequences become visible in increasing
+order. Other databases may commit a transaction after one holding a
+later sequence, so `since()` stops before the entries younger than the
+`LIVEGENE_CHANGELOG_LAG` setting (`DEFAULT_LAG` seconds outside
+SQLite): a consumer never moves its cursor past a sequence that may
+still appear, provided write transactions commit within the lag.
+
+Old entries superseded by a later change of the same row are removed
+by `compact()`; replaying the compacted log still ends in the current
+state of every row.
+"""
+import datetime
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Exists, Max, Min, OuterRef
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import Change
+from .tracking import tracked_models
+
+
+BATCH_SIZE = 500
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+RETENTION = datetime.timedelta(days=30)
+# Seconds the entries are held back outside SQLite
+DEFAULT_LAG = 10
+
+
+def _row(obj):
+    # Same values as `QuerySet.values()` returns for the stored row.
+    return {
+        field.attname: field.get_prep_value(field.value_from_object(obj))
+        for field in obj._meta.concrete_fields
+    }
+
+
+def _entry(model, pk, action, row=None):
+    return Change(
+        table=model._meta.label_lower,
+        object_id=pk,
+        action=action,
+        data=None if row is None else json.dumps(row, cls=DjangoJSONEncoder)
+    )
+
+
+def _write(entries, using=None):
+    Change.objects.using(using).bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def record_objects(objs, action, using=None):
+    """
+    Log `action` for every object of `objs`, taking the data from the
+    objects themselves.
+    """
+    _write(
+        [
+            _entry(type(obj), obj.pk, action,
+                   None if action == Change.DELETE else _row(obj))
+            for obj in objs
+        ],
+        using
+    )
+
+
+def record(model, pks, action, using=None):
+    """
+    Log `action` for the rows of `model` with the given primary keys,
+    reading their current data from the database.
+    """
+    pks = list(pks)
+    if action == Change.DELETE:
+        _write([_entry(model, pk, action) for pk in pks], using)
+        return
+    manager = model._default_manager.db_manager(using)
+    columns = [field.attname for field in model._meta.concrete_fields]
+    for i in range(0, len(pks), BATCH_SIZE):
+        rows = manager.filter(pk__in=pks[i:i + BATCH_SIZE]).values(*columns)
+        _write(
+            [_entry(model, row[model._meta.pk.attname], action, row)
+             for row in rows],
+            using
+        )
+
+
+def record_created(model, objs, using=None):
+    """
+    Log the inserts of objects saved with `bulk_create`. Backends that
+    do not return the new primary keys leave them unset; they are
+    looked up by the first `unique_together` key of the model.
+    """
+    missing = [obj for obj in objs if obj.pk is None]
+    if missing:
+        attnames = [
+            model._meta.get_field(name).attname
+            for name in model._meta.unique_together[0]
+        ]
+        manager = model._default_manager.db_manager(using)
+        size = BATCH_SIZE // len(attnames)
+        for i in range(0, len(missing), size):
+            chunk = {
+                tuple(getattr(obj, name) for name in attnames): obj
+                for obj in missing[i:i + size]
+            }
+            rows = manager.filter(**{
+                name + '__in': {key[n] for key in chunk}
+                for n, name in enumerate(attnames)
+            }).values_list('pk', *attnames)
+            for pk, *key in rows:
+                obj = chunk.get(tuple(key))
+                if obj is not None:
+                    obj.pk = pk
+    record_objects(objs, Change.INSERT, using)
+
+
+def update(queryset, **kwargs):
+    """
+    `queryset.update(**kwargs)`, logging the updated rows.
+    """
+    pks = list(queryset.order_by().values_list('pk', flat=True))
+    if not pks:
+        return 0
+    manager = queryset.model._default_manager.db_manager(queryset.db)
+    rows = manager.filter(pk__in=pks).update(**kwargs)
+    record(queryset.model, pks, Change.UPDATE, using=queryset.db)
+    return rows
+
+
+def visibility_lag():
+    lag = getattr(settings, 'LIVEGENE_CHANGELOG_LAG', None)
+    if lag is None:
+        lag = 0 if connection.vendor == 'sqlite' else DEFAULT_LAG
+    return datetime.timedelta(seconds=lag)
+
+
+def since(sequence=0, limit=DEFAULT_LIMIT, tables=None):
+    """
+    Return the first `limit` entries following `sequence`, optionally
+    restricted to the given tables, up to the first entry younger than
+    the visibility lag.
+    """
+    changes = Change.objects.filter(id__gt=sequence)
+    lag = visibility_lag()
+    if lag:
+        recent = changes.filter(time__gt=timezone.now() - lag).aggregate(
+            sequence=Min('id')
+        )['sequence']
+        if recent is not None:
+            changes = changes.filter(id__lt=recent)
+    if tables:
+        changes = changes.filter(table__in=tables)
+    return list(changes.order_by('id')[:limit])
+
+
+def serialize(change):
+    return {
+        'sequence': change.id,
+        'table': change.table,
+        'id': change.object_id,
+        'action': change.action,
+        'time': change.time,
+        'data': None if change.data is None else json.loads(change.data),
+    }
+
+
+def change_list(request):
+    """
+    Answer `?cursor=&limit=&tables=` with the next batch of changes and
+    the cursor to continue from.
+    """
+    try:
+        cursor = int(request.GET.get('cursor', 0))
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+        if cursor < 0 or not 0 < limit <= MAX_LIMIT:
+            raise ValueError
+    except ValueError:
+        return JsonResponse(
+            {'error': 'cursor must be a sequence number and limit between '
+                      '1 and {0}'.format(MAX_LIMIT)},
+            status=400
+        )
+    tables = [
+        name for name in request.GET.get('tables', '').split(',') if name
+    ]
+    changes = since(cursor, limit + 1, tables)
+    more = len(changes) > limit
+    changes = changes[:limit]
+    return JsonResponse({
+        'results': [serialize(change) for change in changes],
+        'cursor': changes[-1].id if changes else cursor,
+        'more': more,
+    })
+
+
+def compact(retention=RETENTION):
+    """
+    Delete the entries older than `retention` that a later entry of the
+    same row supersedes, and return the number of deleted entries.
+    """
+    horizon = Change.objects.filter(
+        time__lt=timezone.now() - retention
+    ).aggregate(sequence=Max('id'))['sequence']
+    if horizon is None:
+        return 0
+    later = Change.objects.filter(
+        table=OuterRef('table'),
+        object_id=OuterRef('object_id'),
+        id__gt=OuterRef('id')
+    )
+    pks = list(
+        Change.objects.filter(id__lte=horizon)
+        .annotate(superseded=Exists(later))
+        .filter(superseded=True)
+        .values_list('id', flat=True)
+    )
+    for i in range(0, len(pks), BATCH_SIZE):
+        Change.objects.filter(id__in=pks[i:i + BATCH_SIZE]).delete()
+    return len(pks)
+
+
+def _saved(sender, instance, created, using=None, **kwargs):
+    record_objects(
+        [instance], Change.INSERT if created else Change.UPDATE, using
+    )
+
+
+def _deleted(sender, instance, using=None, **kwargs):
+    record_objects([instance], Change.DELETE, using)
+
+
+def _through_rows(through, instance, model, pk_set):
+    columns = {
+        field.related_model: field.name
+        for field in through._meta.concrete_fields
+        if field.many_to_one
+    }
+    filters = {columns[type(instance)]: instance.pk}
+    if pk_set is not None:
+        filters[columns[model] + '__in'] = pk_set
+    return through._default_manager.filter(**filters).values_list(
+        'pk', flat=True
+    )
+
+
+def _m2m_changed(sender, instance, model, action, pk_set, using=None,
+                 **kwargs):
+    if action == 'post_add':
+        record(sender, _through_rows(sender, instance, model, pk_set),
+               Change.INSERT, using)
+    elif action in ('pre_remove', 'pre_clear'):
+        # The link rows are gone once the post_ signal is sent.
+        instance._changelog_links = list(
+            _through_rows(sender, instance, model, pk_set)
+        )
+    elif action in ('post_remove', 'post_clear'):
+        record(sender, instance.__dict__.pop('_changelog_links', []),
+               Change.DELETE, using)
+
+
+def connect():
+    for model in tracked_models():
+        if model._meta.auto_created:
+            m2m_changed.connect(_m2m_changed, sender=model)
+        else:
+            post_save.connect(_saved, sender=model)
+            post_delete.connect(_deleted, sender=model)
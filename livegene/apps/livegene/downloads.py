@@ -0,0 +1,158 @@
+"""
+Downloads of the sampling document files.
+
+Files are streamed from storage in chunks rather than read into memory,
+single byte ranges are answered with 206 responses so that interrupted
+downloads can be resumed, and the conditional headers are checked
+against the content digest, which is a strong ETag since the stored
+files never change.
+
+With the `LIVEGENE_DOCUMENT_SENDFILE` setting the file itself is left
+to the web server: the response only carries its location in an
+`X-Accel-Redirect` (nginx) or `X-Sendfile` (Apache) header, and the
+server sends the content, ranges included, without holding a worker.
+"""
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from . import storage
+
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+SENDFILE_MODES = ('x-accel-redirect', 'x-sendfile')
+
+
+def byte_range(header, size):
+    """
+    Return the (first, last) bytes requested by the `Range` header for a
+    file of `size` bytes, None to send the whole file (no header, or one
+    asking for several or malformed ranges, which may be ignored), or
+    False when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the last bytes of the file
+        if int(last) == 0 or size == 0:
+            return False
+        return max(size - int(last), 0), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        return False
+    return first, min(int(last), size - 1) if last else size - 1
+
+
+def _if_range_matches(request, etag, last_modified):
+    header = request.META.get('HTTP_IF_RANGE')
+    if not header:
+        return True
+    if header.startswith(('"', 'W/')):
+        # Weak tags never match for ranges.
+        return parse_etags(header) == [etag]
+    return parse_http_date_safe(header) == last_modified
+
+
+def _chunks(f, first, length):
+    try:
+        f.seek(first)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def _disposition(filename):
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        return "attachment; filename*=utf-8''{0}".format(quote(filename))
+    return 'attachment; filename="{0}"'.format(filename.replace('"', ''))
+
+
+def _sendfile(document):
+    mode = getattr(settings, 'LIVEGENE_DOCUMENT_SENDFILE', None)
+    if mode not in SENDFILE_MODES:
+        return None
+    response = HttpResponse()
+    if mode == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote('{0}{1}'.format(
+            getattr(settings, 'LIVEGENE_DOCUMENT_ACCEL_PREFIX', '/protected/'),
+            document.document.name
+        ))
+    else:
+        response['X-Sendfile'] = document.document.path
+    return response
+
+
+def _stream(request, document, etag, last_modified):
+    size = document.document.size
+    requested = None
+    if _if_range_matches(request, etag, last_modified):
+        requested = byte_range(request.META.get('HTTP_RANGE'), size)
+    if requested is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{0}'.format(size)
+        return response
+    first, last = requested or (0, size - 1)
+    if request.method == 'HEAD':
+        response = HttpResponse()
+    elif requested is None:
+        # The whole file can use the server's wsgi.file_wrapper.
+        response = FileResponse(document.document.open('rb'))
+    else:
+        response = StreamingHttpResponse(_chunks(
+            document.document.open('rb'), first, last - first + 1
+        ))
+    if requested is not None:
+        response.status_code = 206
+        response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(
+            first, last, size
+        )
+    response['Content-Length'] = max(last - first + 1, 0)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve(request, document):
+    """
+    Answer a GET or HEAD request for the file of `document`.
+    """
+    name = document.document.name
+    etag = '"{0}"'.format(
+        document.sha256 or storage.ContentAddressedStorage.digest(name) or
+        '{0}-{1}'.format(document.pk, int(document.modified.timestamp()))
+    )
+    last_modified = int(document.modified.timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = _sendfile(document)
+    if response is None:
+        response = _stream(request, document, etag, last_modified)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private'
+    if response.status_code in (200, 206):
+        response['Content-Type'] = document.content_type or \
+            storage.content_type(document.filename or name)
+        response['Content-Disposition'] = _disposition(
+            document.filename or name.rsplit('/', 1)[-1]
+        )
+    return response
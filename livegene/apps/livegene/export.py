@@ -0,0 +1,145 @@
+"""
+Flat export of the whole project portfolio.
+
+Projects are read in chunks of `CHUNK_SIZE`, continuing after the
+last `ilri_code` of the previous chunk, and every chunk prefetches its
+people, countries, SDGs, partners and latest expenditure. Rows are
+yielded as they are built, so memory use does not grow with the size
+of the portfolio and the first rows can be sent straight away.
+"""
+import csv
+
+from django.db.models import Prefetch
+
+from livegene.apps.finance.models import Expenditure
+
+from .models import CountryRole, PartnershipRole, PersonRole, Project, SDGRole
+
+
+CHUNK_SIZE = 200
+
+HEADER = (
+    'ilri_code',
+    'full_name',
+    'short_name',
+    'projects_group',
+    'start_date',
+    'end_date',
+    'principal_investigator',
+    'people',
+    'countries',
+    'sdgs',
+    'partners',
+    'report_date',
+    'total_budget',
+    'amount',
+)
+
+
+def _projects():
+    return Project.objects.select_related(
+        'principal_investigator'
+    ).prefetch_related(
+        Prefetch(
+            'person_roles',
+            queryset=PersonRole.objects.select_related('person')
+        ),
+        Prefetch(
+            'country_roles',
+            queryset=CountryRole.objects.select_related('country')
+        ),
+        Prefetch('sdg_roles', queryset=SDGRole.objects.select_related('sdg')),
+        Prefetch(
+            'partnership_roles',
+            queryset=PartnershipRole.objects.select_related(
+                'partnership__partner', 'role_type'
+            )
+        ),
+        Prefetch(
+            'expenditures',
+            queryset=Expenditure.objects.latest_snapshots(),
+            to_attr='latest_expenditures'
+        ),
+    ).order_by('ilri_code')
+
+
+def iter_projects(chunk_size=CHUNK_SIZE):
+    last = None
+    while True:
+        queryset = _projects()
+        if last is not None:
+            queryset = queryset.filter(ilri_code__gt=last)
+        chunk = list(queryset[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        last = chunk[-1].ilri_code
+
+
+def _join(items):
+    return '; '.join(items)
+
+
+def project_row(project):
+    latest = project.latest_expenditures[0] \
+        if project.latest_expenditures else None
+    return (
+        project.ilri_code,
+        project.full_name,
+        project.short_name,
+        project.projects_group,
+        project.start_date,
+        project.end_date,
+        project.principal_investigator.full_name,
+        _join(
+            '{0} ({1}%)'.format(role.person.full_name, role.percent)
+            for role in project.person_roles.all()
+        ),
+        _join(
+            '{0} ({1}%)'.format(role.country, role.percent)
+            for role in project.country_roles.all()
+        ),
+        _join(
+            '{0} ({1}%)'.format(role.sdg, role.percent)
+            for role in project.sdg_roles.all()
+        ),
+        _join(
+            '{0} ({1})'.format(role.partnership.partner, role.role_type)
+            for role in project.partnership_roles.all()
+        ),
+        latest.report_date.date() if latest else None,
+        latest.total_budget if latest else None,
+        latest.amount if latest else None,
+    )
+
+
+def portfolio_rows(chunk_size=CHUNK_SIZE):
+    yield HEADER
+    for project in iter_projects(chunk_size):
+        yield project_row(project)
+
+
+class Echo:
+    """
+    File-like object returning what is written to it, to turn the csv
+    writer into a generator of lines.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_xlsx(rows, path):
+    # Write-only workbooks keep a constant amount of memory.
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Portfolio')
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(path)
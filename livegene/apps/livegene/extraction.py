@@ -0,0 +1,166 @@
+"""
+Text extraction of the sampling document files.
+
+The text of PDF, DOCX, CSV and plain text files is extracted by the
+`extract_documents` command, outside the request cycle, in a pool of
+worker processes that only read files. The results are saved in
+`DocumentText` by file digest, so a file shared by many documents is
+extracted once. Saving a text re-indexes every document with that
+content for full-text search; a document whose file changes is indexed
+with the text of its new content once that has been extracted.
+"""
+import codecs
+import io
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.etree import ElementTree
+
+from django.db import connections
+from django.utils import timezone
+
+from . import search
+from .models import DocumentText, SamplingDocument
+
+
+# Longer texts are truncated before being indexed.
+MAX_CHARS = 1000000
+WORD = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DOCX = (
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+)
+
+
+def _decode(data, final=True):
+    # Unless `final`, `data` may end within a character, which is
+    # dropped.
+    try:
+        return codecs.getincrementaldecoder('utf-8-sig')().decode(
+            data, final
+        )
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def _plain(f):
+    size = MAX_CHARS * 4
+    data = f.read(size + 1)
+    return _decode(data[:size], final=len(data) <= size)
+
+
+def _docx(f):
+    parts = []
+    with zipfile.ZipFile(f) as archive:
+        with archive.open('word/document.xml') as document:
+            for event, element in ElementTree.iterparse(document):
+                if element.tag == WORD + 't':
+                    parts.append(element.text or '')
+                elif element.tag == WORD + 'tab':
+                    parts.append('\t')
+                elif element.tag == WORD + 'p':
+                    parts.append('\n')
+                    element.clear()
+    return ''.join(parts)
+
+
+def _pdf(f):
+    from pdfminer.high_level import extract_text_to_fp
+    from pdfminer.layout import LAParams
+
+    text = io.StringIO()
+    extract_text_to_fp(f, text, laparams=LAParams(), codec=None)
+    return text.getvalue()
+
+
+EXTRACTORS = {
+    'application/pdf': _pdf,
+    DOCX: _docx,
+    'text/csv': _plain,
+    'text/plain': _plain,
+}
+
+
+def extractor(content_type):
+    if content_type.startswith('text/'):
+        return EXTRACTORS.get(content_type, _plain)
+    return EXTRACTORS.get(content_type)
+
+
+def extract(path, content_type):
+    """
+    Return the text of the file at `path` and an error message, one of
+    them empty. Runs in the worker processes.
+    """
+    function = extractor(content_type)
+    if function is None:
+        return '', 'No text extraction for {0}'.format(content_type)
+    try:
+        with open(path, 'rb') as f:
+            text = function(f)
+    except Exception as e:
+        return '', '{0}: {1}'.format(type(e).__name__, e)[:255]
+    return text[:MAX_CHARS].replace('\x00', ''), ''
+
+
+def pending(everything=False):
+    """
+    Return (digest, path, content type) for every stored content whose
+    text has not been extracted yet, or for all of them.
+    """
+    documents = SamplingDocument.objects.exclude(sha256='')
+    if not everything:
+        documents = documents.exclude(
+            sha256__in=DocumentText.objects.values('sha256')
+        )
+    jobs = {}
+    for document in documents.order_by('pk'):
+        if document.sha256 not in jobs:
+            jobs[document.sha256] = (
+                document.sha256, document.document.path, document.content_type
+            )
+    return list(jobs.values())
+
+
+def save(sha256, text, error=''):
+    DocumentText.objects.update_or_create(
+        sha256=sha256,
+        defaults={'text': text, 'error': error, 'extracted': timezone.now()}
+    )
+    documents = list(SamplingDocument.objects.filter(sha256=sha256))
+    for document in documents:
+        document.contents = text
+    search.backend().index(documents)
+
+
+def run(workers=None, everything=False):
+    """
+    Extract the text of the pending contents with `workers` processes
+    and return the number of extracted and failed contents.
+    """
+    jobs = pending(everything)
+    if not jobs:
+        return 0, 0
+    # The forked workers must not inherit the database connections.
+    connections.close_all()
+    extracted = failed = 0
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {
+            pool.submit(extract, path, content_type): sha256
+            for sha256, path, content_type in jobs
+        }
+        for future in as_completed(futures):
+            text, error = future.result()
+            save(futures[future], text, error)
+            if error:
+                failed += 1
+            else:
+                extracted += 1
+    return extracted, failed
+
+
+def prune():
+    """
+    Delete the texts of contents no document has any more.
+    """
+    return DocumentText.objects.exclude(
+        sha256__in=SamplingDocument.objects.values('sha256')
+    ).delete()[0]
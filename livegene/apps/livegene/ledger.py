@@ -0,0 +1,171 @@
+"""
+Maintenance of the allocation ledger.
+
+`PersonAllocation` and `ProjectAllocation` hold the summed percentages
+of the role models so that questions like "who is over-allocated" are
+answered by an index lookup. Every refresh recomputes the totals of
+the affected keys from the role tables; keys without any remaining
+roles lose their ledger row.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Sum
+
+from . import tracking, workload
+from .models import (
+    CountryRole,
+    PersonAllocation,
+    PersonRole,
+    ProjectAllocation,
+    SDGRole
+)
+
+
+BATCH_SIZE = 500
+
+# ProjectAllocation field summing the percentages of each role model
+PROJECT_FIELDS = (
+    ('person_total', PersonRole),
+    ('country_total', CountryRole),
+    ('sdg_total', SDGRole),
+)
+
+
+_state = threading.local()
+
+
+def chunked(items, size=BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _sum_by(model, field, ids=None):
+    qs = model._default_manager.order_by()
+    if ids is not None:
+        qs = qs.filter(**{'{0}__in'.format(field): ids})
+    return dict(qs.values_list(field).annotate(Sum('percent')))
+
+
+def person_totals(ids=None):
+    return _sum_by(PersonRole, 'person', ids)
+
+
+def project_totals(ids=None):
+    totals = {}
+    for name, model in PROJECT_FIELDS:
+        for project, total in _sum_by(model, 'project', ids).items():
+            totals.setdefault(project, {})[name] = total
+    return totals
+
+
+def refresh_people(ids):
+    with transaction.atomic():
+        for chunk in chunked(set(ids)):
+            PersonAllocation.objects.filter(person__in=chunk).delete()
+            PersonAllocation.objects.bulk_create(
+                PersonAllocation(person_id=person, total=total)
+                for person, total in person_totals(chunk).items()
+            )
+    tracking.touch(PersonAllocation)
+
+
+def refresh_projects(ids):
+    with transaction.atomic():
+        for chunk in chunked(set(ids)):
+            ProjectAllocation.objects.filter(project__in=chunk).delete()
+            ProjectAllocation.objects.bulk_create(
+                ProjectAllocation(project_id=project, **totals)
+                for project, totals in project_totals(chunk).items()
+            )
+    tracking.touch(ProjectAllocation)
+
+
+def refresh_roles(model, roles):
+    """
+    Refresh the ledger rows touched by the given role instances.
+    """
+    roles = list(roles)
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending.setdefault(model, []).extend(roles)
+        return
+    refresh_projects(role.project_id for role in roles)
+    if model is PersonRole:
+        refresh_people(role.person_id for role in roles)
+        workload.refresh(role.person_id for role in roles)
+
+
+@contextmanager
+def deferred():
+    """
+    Collect the refreshes requested inside the block and run them once
+    when it exits, for code saving many roles one at a time.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+    _state.pending = {}
+    try:
+        yield
+        pending = _state.pending
+    finally:
+        _state.pending = None
+    for model, roles in pending.items():
+        refresh_roles(model, roles)
+
+
+def rebuild():
+    with transaction.atomic():
+        PersonAllocation.objects.all().delete()
+        ProjectAllocation.objects.all().delete()
+        PersonAllocation.objects.bulk_create(
+            (
+                PersonAllocation(person_id=person, total=total)
+                for person, total in person_totals().items()
+            ),
+            batch_size=BATCH_SIZE
+        )
+        ProjectAllocation.objects.bulk_create(
+            (
+                ProjectAllocation(project_id=project, **totals)
+                for project, totals in project_totals().items()
+            ),
+            batch_size=BATCH_SIZE
+        )
+    tracking.touch(PersonAllocation, ProjectAllocation)
+
+
+def verify():
+    """
+    Compare the ledger with the role tables and return a list of
+    (model, pk, ledger values, expected values) tuples for every row
+    that differs.
+    """
+    errors = []
+    expected = person_totals()
+    stored = dict(PersonAllocation.objects.values_list('person', 'total'))
+    for person in expected.keys() | stored.keys():
+        if expected.get(person) != stored.get(person):
+            errors.append(
+                (PersonAllocation, person, stored.get(person),
+                 expected.get(person))
+            )
+    names = [name for name, model in PROJECT_FIELDS]
+    expected = {
+        project: tuple(totals.get(name, 0) for name in names)
+        for project, totals in project_totals().items()
+    }
+    stored = {
+        row[0]: tuple(row[1:])
+        for row in ProjectAllocation.objects.values_list('project', *names)
+    }
+    for project in expected.keys() | stored.keys():
+        if expected.get(project) != stored.get(project):
+            errors.append(
+                (ProjectAllocation, project, stored.get(project),
+                 expected.get(project))
+            )
+    return errors
@@ -0,0 +1,173 @@
+"""
+Local thumbnails of the organisation and SDG logos.
+
+The `fetch_logos` command downloads the images at the `logo_url` of
+every organisation and SDG, outside the request cycle, and scales them
+down to fit `THUMBNAIL_SIZE` in PNG and WebP. The thumbnails are saved
+under `MEDIA_ROOT/logos/` with the digest of their content as name, so
+a changed logo gets new names and the files can be served with
+far-future cache headers. The `logo` properties of the models render
+them once they exist.
+
+The images are read by the fetcher named in `LIVEGENE_LOGO_FETCHER`:
+`HTTPFetcher` downloads them, `LocalFetcher` reads them from a local
+directory by the file name of their URL, for tests and offline work.
+"""
+import hashlib
+import io
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from PIL import Image
+
+from .models import Logo, Organisation, SDG
+
+
+DIRECTORY = 'logos'
+DEFAULT_FETCHER = 'livegene.apps.livegene.logos.HTTPFetcher'
+THUMBNAIL_SIZE = (200, 200)
+# Larger downloads are rejected.
+MAX_SIZE = 5 * 1024 * 1024
+MAX_AGE = 365 * 24 * 60 * 60
+WORKERS = 8
+
+
+class FetchError(Exception):
+    pass
+
+
+class HTTPFetcher:
+    timeout = 10
+
+    def fetch(self, url):
+        request = Request(url, headers={'User-Agent': 'livegene'})
+        with urlopen(request, timeout=self.timeout) as response:
+            data = response.read(MAX_SIZE + 1)
+        if len(data) > MAX_SIZE:
+            raise FetchError('The image is larger than {0} bytes'.format(
+                MAX_SIZE
+            ))
+        return data
+
+
+class LocalFetcher:
+    """
+    Reads the image of a URL from the file with the same name in `root`
+    (the `LIVEGENE_LOGO_ROOT` setting by default).
+    """
+    def __init__(self, root=None):
+        self.root = root or settings.LIVEGENE_LOGO_ROOT
+
+    def fetch(self, url):
+        name = posixpath.basename(unquote(urlparse(url).path))
+        path = os.path.join(self.root, name)
+        if not name or not os.path.isfile(path):
+            raise FetchError('No local image for {0}'.format(url))
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def fetcher():
+    return import_string(
+        getattr(settings, 'LIVEGENE_LOGO_FETCHER', DEFAULT_FETCHER)
+    )()
+
+
+def thumbnails(data):
+    """
+    Return the PNG and WebP thumbnails of the image `data` and their
+    size.
+    """
+    image = Image.open(io.BytesIO(data))
+    image = image.convert('RGBA' if 'A' in image.getbands() or
+                          'transparency' in image.info else 'RGB')
+    image.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+    png, webp = io.BytesIO(), io.BytesIO()
+    image.save(png, 'PNG', optimize=True)
+    image.save(webp, 'WEBP', quality=85, method=6)
+    return png.getvalue(), webp.getvalue(), image.size
+
+
+def _save(data, extension):
+    name = '{0}.{1}'.format(hashlib.sha256(data).hexdigest()[:20], extension)
+    path = '{0}/{1}'.format(DIRECTORY, name)
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(data))
+    return name
+
+
+def urls():
+    return set(
+        Organisation.objects.exclude(logo_url__isnull=True)
+        .exclude(logo_url='').values_list('logo_url', flat=True)
+    ) | set(SDG.objects.values_list('logo_url', flat=True))
+
+
+def _fetch(source, url):
+    try:
+        data = source.fetch(url)
+        digest = hashlib.sha256(data).hexdigest()
+        return url, digest, data, ''
+    except Exception as e:
+        return url, '', None, '{0}: {1}'.format(type(e).__name__, e)[:255]
+
+
+def refresh(everything=False, workers=WORKERS):
+    """
+    Fetch the logos without thumbnails yet, or all of them, with
+    `workers` threads and return the number of updated and failed
+    logos. Logos no model uses any more are removed.
+    """
+    wanted = urls()
+    Logo.objects.exclude(url__in=wanted).delete()
+    logos = Logo.objects.in_bulk(list(wanted), field_name='url')
+    if not everything:
+        wanted = {url for url in wanted if url not in logos or
+                  not logos[url].png}
+    source = fetcher()
+    updated = failed = 0
+    with ThreadPoolExecutor(workers) as pool:
+        for url, digest, data, error in pool.map(
+                lambda url: _fetch(source, url), sorted(wanted)):
+            logo = logos.get(url) or Logo(url=url)
+            logo.fetched = timezone.now()
+            if not error and digest != logo.sha256:
+                try:
+                    png, webp, (logo.width, logo.height) = thumbnails(data)
+                except Exception as e:
+                    error = '{0}: {1}'.format(type(e).__name__, e)[:255]
+                else:
+                    logo.png = _save(png, 'png')
+                    logo.webp = _save(webp, 'webp')
+                    logo.sha256 = digest
+            # A failed fetch keeps the previous thumbnails.
+            logo.error = error
+            logo.save()
+            if error:
+                failed += 1
+            else:
+                updated += 1
+    collect()
+    return updated, failed
+
+
+def collect():
+    """
+    Delete the thumbnail files no logo uses.
+    """
+    if not default_storage.exists(DIRECTORY):
+        return
+    used = set()
+    for png, webp in Logo.objects.values_list('png', 'webp'):
+        used.update((png, webp))
+    for name in default_storage.listdir(DIRECTORY)[1]:
+        if name not in used:
+            default_storage.delete('{0}/{1}'.format(DIRECTORY, name))
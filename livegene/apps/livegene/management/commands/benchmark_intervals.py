@@ -0,0 +1,170 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from livegene.apps.livegene.models import (
+    Country,
+    Organisation,
+    Partnership,
+    Person,
+    Project
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the interval queries on generated projects and partnerships, '
+        'with and without the date indexes. Nothing is kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100000,
+            help='Number of generated rows per model.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per query; the fastest one is reported.'
+        )
+        parser.add_argument(
+            '--plans',
+            action='store_true',
+            help='Show the query plans of the indexed runs.'
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        self.plans = options['plans']
+        random.seed(0)
+        try:
+            # Runs in a transaction that is rolled back, dropping the
+            # indexes only for the duration of the benchmark.
+            with transaction.atomic():
+                self.populate(options['rows'])
+                queries = self.queries()
+                indexed = [
+                    self.time(qs, plan=self.plans) for label, qs in queries
+                ]
+                self.drop_indexes()
+                scanned = [self.time(qs) for label, qs in queries]
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write('{0:<40} {1:>8} {2:>10} {3:>10} {4:>8}'.format(
+            'query', 'rows', 'index ms', 'scan ms', 'speedup'
+        ))
+        for (label, qs), (rows, fast), (_, slow) in zip(
+                queries, indexed, scanned):
+            self.stdout.write(
+                '{0:<40} {1:>8} {2:>10.2f} {3:>10.2f} {4:>7.1f}x'.format(
+                    label, rows, fast * 1000, slow * 1000, slow / fast
+                )
+            )
+
+    def _interval(self, today, open_share=0):
+        start = today - datetime.timedelta(days=random.randint(0, 20 * 365))
+        end = start + datetime.timedelta(days=random.randint(30, 5 * 365))
+        if random.random() < open_share:
+            start = None
+        if random.random() < open_share:
+            end = None
+        return start, end
+
+    def populate(self, rows):
+        self.today = timezone.localdate()
+        person = Person.objects.create(
+            username='benchmark', first_name='Bench', last_name='Mark',
+            home_program='benchmark', email='benchmark@example.org'
+        )
+        Project.objects.bulk_create(
+            (
+                Project(
+                    ilri_code='B{0:07d}'.format(i),
+                    full_name='Benchmark {0}'.format(i),
+                    principal_investigator=person,
+                    projects_group='benchmark',
+                    start_date=start,
+                    end_date=end,
+                    status=0,
+                    capacity_development=0
+                )
+                for i, (start, end) in enumerate(
+                    self._interval(self.today) for i in range(rows)
+                )
+            ),
+            batch_size=500
+        )
+        partner = Organisation.objects.create(
+            full_name='Benchmark',
+            country=Country.objects.get_or_create(country='KE')[0]
+        )
+        Partnership.objects.bulk_create(
+            (
+                Partnership(partner=partner, start_date=start, end_date=end)
+                for start, end in (
+                    self._interval(self.today, open_share=0.1)
+                    for i in range(rows)
+                )
+            ),
+            batch_size=500
+        )
+        with connection.cursor() as cursor:
+            for model in (Project, Partnership):
+                cursor.execute('ANALYZE {0}'.format(
+                    connection.ops.quote_name(model._meta.db_table)
+                ))
+
+    def queries(self):
+        today = self.today
+        last_year = (
+            today - datetime.timedelta(days=365),
+            today - datetime.timedelta(days=335)
+        )
+        queries = []
+        for model in (Project, Partnership):
+            name = model._meta.verbose_name
+            sample = model.objects.filter(
+                start_date__isnull=False, end_date__isnull=False
+            ).order_by('-end_date').first()
+            queries += [
+                ('{0} active today'.format(name),
+                 model.objects.active_on(today)),
+                ('{0} active a year ago'.format(name),
+                 model.objects.active_between(*last_year)),
+                ('{0} ending in 30 days'.format(name),
+                 model.objects.ending_within(30, today)),
+                ('{0} overlapping a recent one'.format(name),
+                 model.objects.overlapping(sample)),
+            ]
+        return queries
+
+    def time(self, queryset, plan=False):
+        queryset = queryset.order_by().values_list('pk', flat=True)
+        if plan:
+            self.stdout.write(queryset.explain())
+        best = None
+        for i in range(self.repeat):
+            started = time.perf_counter()
+            rows = len(list(queryset.all()))
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return rows, best
+
+    def drop_indexes(self):
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model in (Project, Partnership):
+                for index in model._meta.indexes:
+                    cursor.execute(str(index.remove_sql(model, editor)))
@@ -0,0 +1,52 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from livegene.apps.livegene import extraction, storage, uploads
+from livegene.apps.livegene.models import SamplingDocument
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete the stored sampling document files that no document '
+        'references any more, their extracted text and the abandoned '
+        'uploads.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=storage.GRACE_PERIOD // 3600,
+            help='Keep the files written in the last given hours.'
+        )
+        parser.add_argument(
+            '--upload-days',
+            type=int,
+            default=uploads.EXPIRY.days,
+            help='Delete the uploads not continued for the given days.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the files that would be deleted.'
+        )
+
+    def handle(self, *args, **options):
+        count, size = storage.collect(
+            SamplingDocument._meta.get_field('document').storage,
+            SamplingDocument.objects.values_list('document', flat=True),
+            grace=options['grace'] * 3600,
+            dry_run=options['dry_run']
+        )
+        self.stdout.write('{0} {1} unreferenced files ({2} bytes).'.format(
+            'Found' if options['dry_run'] else 'Deleted', count, size
+        ))
+        if not options['dry_run']:
+            expired = uploads.expire(
+                datetime.timedelta(days=options['upload_days']),
+                grace=options['grace'] * 3600
+            )
+            self.stdout.write('Deleted {0} abandoned uploads.'.format(expired))
+            pruned = extraction.prune()
+            self.stdout.write('Deleted {0} unused texts.'.format(pruned))
@@ -0,0 +1,26 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from livegene.apps.livegene import changelog
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove the change log entries older than the retention period '
+        'that a later change of the same row supersedes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=changelog.RETENTION.days,
+            help='Retention period in days.'
+        )
+
+    def handle(self, *args, **options):
+        deleted = changelog.compact(
+            datetime.timedelta(days=options['days'])
+        )
+        self.stdout.write('Removed {0} superseded changes.'.format(deleted))
@@ -0,0 +1,43 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from livegene.apps.livegene import export
+
+
+class Command(BaseCommand):
+    help = 'Export the project portfolio as one flat CSV or XLSX table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            help='Output file, standard output when omitted (CSV only).'
+        )
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'xlsx'),
+            help='Defaults to the extension of the output file.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=export.CHUNK_SIZE,
+            help='Number of projects loaded per query batch.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'xlsx' if path and path.endswith('.xlsx') else 'csv'
+        rows = export.portfolio_rows(options['chunk_size'])
+        if fmt == 'xlsx':
+            if not path:
+                raise CommandError('XLSX exports need an output file.')
+            export.write_xlsx(rows, path)
+        elif path:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerows(rows)
+        else:
+            csv.writer(self.stdout).writerows(rows)
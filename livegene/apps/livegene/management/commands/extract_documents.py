@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from livegene.apps.livegene import extraction
+
+
+class Command(BaseCommand):
+    help = (
+        'Extract the text of the sampling document files not processed '
+        'yet and add it to the full-text search index.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of worker processes; one per CPU by default.'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Extract the text of every file again.'
+        )
+        parser.add_argument(
+            '--watch',
+            type=int,
+            metavar='SECONDS',
+            help='Keep running, looking for new files at this interval.'
+        )
+
+    def handle(self, *args, **options):
+        everything = options['all']
+        while True:
+            extracted, failed = extraction.run(options['workers'], everything)
+            if extracted or failed or not options['watch']:
+                self.stdout.write(
+                    'Extracted the text of {0} files, {1} failed.'.format(
+                        extracted, failed
+                    )
+                )
+            if not options['watch']:
+                break
+            everything = False
+            time.sleep(options['watch'])
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from livegene.apps.livegene import logos
+
+
+class Command(BaseCommand):
+    help = (
+        'Fetch the organisation and SDG logos without local thumbnails '
+        'and make their PNG and WebP thumbnails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Fetch every logo again, to pick up changed images.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=logos.WORKERS,
+            help='Number of concurrent downloads.'
+        )
+
+    def handle(self, *args, **options):
+        updated, failed = logos.refresh(options['all'], options['workers'])
+        self.stdout.write(
+            'Updated {0} logos, {1} failed.'.format(updated, failed)
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from livegene.apps.livegene import ledger, workload
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the allocation ledger and the monthly workloads from the '
+        'role tables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare the ledger with the role tables.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            ledger.rebuild()
+            workload.rebuild()
+            self.stdout.write('Allocation ledger and workloads rebuilt.')
+        errors = ledger.verify()
+        for model, pk, stored, expected in errors:
+            self.stderr.write(
+                '{0} {1}: ledger {2}, expected {3}'.format(
+                    model.__name__, pk, stored, expected
+                )
+            )
+        if errors:
+            raise CommandError(
+                '{0} ledger rows are out of date.'.format(len(errors))
+            )
+        self.stdout.write(self.style.SUCCESS('Allocation ledger is correct.'))
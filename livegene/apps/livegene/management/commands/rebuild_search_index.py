@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from livegene.apps.livegene import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the model tables.'
+
+    def handle(self, *args, **options):
+        backend = search.backend()
+        backend.install()
+        backend.rebuild()
+        self.stdout.write('Search index rebuilt.')
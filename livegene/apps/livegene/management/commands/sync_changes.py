@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from livegene.apps.livegene import changelog
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the changes following a sequence number as JSON lines, '
+        'then the sequence number to continue from.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cursor',
+            type=int,
+            default=0,
+            help='Last sequence number already synchronised.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=changelog.DEFAULT_LIMIT,
+            help='Number of changes read per query.'
+        )
+        parser.add_argument(
+            '--tables',
+            nargs='+',
+            metavar='TABLE',
+            help='Only these tables, as app_label.model.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Output file, standard output when omitted.'
+        )
+
+    def handle(self, *args, **options):
+        cursor = options['cursor']
+        out = open(options['output'], 'w', encoding='utf-8') \
+            if options['output'] else self.stdout
+        count = 0
+        try:
+            while True:
+                changes = changelog.since(
+                    cursor, options['batch_size'], options['tables']
+                )
+                for change in changes:
+                    out.write(json.dumps(
+                        changelog.serialize(change), cls=DjangoJSONEncoder
+                    ) + '\n')
+                    cursor = change.id
+                count += len(changes)
+                if len(changes) < options['batch_size']:
+                    break
+        finally:
+            if out is not self.stdout:
+                out.close()
+        self.stderr.write('Synchronised {0} changes, cursor {1}.'.format(
+            count, cursor
+        ))
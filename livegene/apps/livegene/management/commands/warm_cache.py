@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from livegene.apps.livegene import caching
+
+
+def cached_patterns(patterns, prefix=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from cached_patterns(
+                pattern.url_patterns, prefix + str(pattern.pattern)
+            )
+        elif isinstance(pattern, URLPattern) and \
+                hasattr(pattern.callback, 'cached_view'):
+            yield prefix + str(pattern.pattern), pattern
+
+
+class Command(BaseCommand):
+    help = 'Render the cached views so that their first request is a hit.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Only show the hit and miss counters of the cached views.'
+        )
+
+    def handle(self, *args, **options):
+        patterns = list(cached_patterns(get_resolver().url_patterns))
+        if not options['stats']:
+            factory = RequestFactory()
+            for path, pattern in patterns:
+                # Call the cached view behind the access check.
+                view = pattern.callback.__wrapped__
+                response = view(factory.get('/' + path), **pattern.default_args)
+                self.stdout.write('{0} {1}'.format(
+                    response.status_code, path
+                ))
+        names = sorted({p.callback.cached_view for path, p in patterns})
+        for name, counts in caching.stats(names).items():
+            self.stdout.write(
+                '{0}: {1} hits, {2} misses'.format(
+                    name, counts['hits'], counts['misses']
+                )
+            )
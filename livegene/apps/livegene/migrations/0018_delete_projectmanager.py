@@ -0,0 +1,16 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0017_auto_20181002_1338'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='ProjectManager',
+        ),
+    ]
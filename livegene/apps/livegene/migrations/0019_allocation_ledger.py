@@ -0,0 +1,66 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_ledger(apps, schema_editor):
+    Sum = models.Sum
+    PersonRole = apps.get_model('livegene', 'PersonRole')
+    CountryRole = apps.get_model('livegene', 'CountryRole')
+    SDGRole = apps.get_model('livegene', 'SDGRole')
+    PersonAllocation = apps.get_model('livegene', 'PersonAllocation')
+    ProjectAllocation = apps.get_model('livegene', 'ProjectAllocation')
+
+    def sum_by(model, field):
+        return dict(
+            model.objects.order_by().values_list(field).annotate(Sum('percent'))
+        )
+
+    PersonAllocation.objects.bulk_create(
+        PersonAllocation(person_id=person, total=total)
+        for person, total in sum_by(PersonRole, 'person').items()
+    )
+    projects = {}
+    for name, model in (('person_total', PersonRole),
+                        ('country_total', CountryRole),
+                        ('sdg_total', SDGRole)):
+        for project, total in sum_by(model, 'project').items():
+            projects.setdefault(project, {})[name] = total
+    ProjectAllocation.objects.bulk_create(
+        ProjectAllocation(project_id=project, **totals)
+        for project, totals in projects.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0018_delete_projectmanager'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonAllocation',
+            fields=[
+                ('person', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='allocation', serialize=False, to='livegene.Person')),
+                ('total', models.PositiveIntegerField(db_index=True, default=0)),
+            ],
+            options={
+                'ordering': ('-total',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectAllocation',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='allocation', serialize=False, to='livegene.Project')),
+                ('person_total', models.PositiveIntegerField(db_index=True, default=0)),
+                ('country_total', models.PositiveIntegerField(db_index=True, default=0)),
+                ('sdg_total', models.PositiveIntegerField(db_index=True, default=0)),
+            ],
+            options={
+                'ordering': ('project',),
+            },
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
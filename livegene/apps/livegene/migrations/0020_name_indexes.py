@@ -0,0 +1,21 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0019_allocation_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactperson',
+            index=models.Index(fields=['last_name', 'first_name'], name='livegene_contact_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='person',
+            index=models.Index(fields=['last_name', 'first_name'], name='livegene_person_name_idx'),
+        ),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:16
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+TRACKED_MODELS = (
+    'contactperson',
+    'country',
+    'countryrole',
+    'organisation',
+    'partnership',
+    'partnership_contact',
+    'partnershiprole',
+    'partnershiproletype',
+    'person',
+    'personrole',
+    'project',
+    'samplingactivity',
+    'samplingdocument',
+    'samplingdocumenttype',
+    'sdg',
+    'sdgrole',
+)
+
+
+def seed_table_changes(apps, schema_editor):
+    TableChange = apps.get_model('livegene', 'TableChange')
+    now = timezone.now()
+    TableChange.objects.bulk_create(
+        TableChange(table='livegene.' + name, modified=now)
+        for name in TRACKED_MODELS
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0020_name_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=100, unique=True)),
+                ('modified', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ('table',),
+            },
+        ),
+        migrations.AddField(
+            model_name='contactperson',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='countryrole',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='organisation',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='partnership',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='partnershiprole',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='partnershiproletype',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='personrole',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='samplingactivity',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='samplingdocument',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='samplingdocumenttype',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='sdg',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='sdgrole',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(seed_table_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:20
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+import django.utils.timezone
+
+
+UNTRACKED_MODELS = (
+    'livegene.tablechange',
+    'livegene.change',
+    'livegene.personallocation',
+    'livegene.projectallocation',
+    'finance.latestexpenditure',
+)
+
+
+def log_existing_rows(apps, schema_editor):
+    # The log starts with an insert of every existing row, so that
+    # reading it from the beginning gives the complete tables.
+    Change = apps.get_model('livegene', 'Change')
+    for label in ('livegene', 'finance'):
+        for model in apps.get_app_config(label).get_models(
+            include_auto_created=True
+        ):
+            if model._meta.label_lower in UNTRACKED_MODELS:
+                continue
+            columns = [field.attname for field in model._meta.concrete_fields]
+            Change.objects.bulk_create(
+                (
+                    Change(
+                        table=model._meta.label_lower,
+                        object_id=row[model._meta.pk.attname],
+                        action='insert',
+                        data=json.dumps(row, cls=DjangoJSONEncoder)
+                    )
+                    for row in model._default_manager.order_by('pk').values(*columns)
+                ),
+                batch_size=500
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0021_modified_timestamps'),
+        ('finance', '0005_expenditure_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=100)),
+                ('object_id', models.IntegerField()),
+                ('action', models.CharField(choices=[('insert', 'Insert'), ('update', 'Update'), ('delete', 'Delete')], max_length=6)),
+                ('data', models.TextField(blank=True, null=True)),
+                ('time', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['table', 'object_id'], name='livegene_change_row_idx'),
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0022_change_log'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='partnership',
+            index=models.Index(fields=['end_date', 'start_date'], name='livegene_partner_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['end_date', 'start_date'], name='livegene_project_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='samplingactivity',
+            index=models.Index(fields=['end_date', 'start_date'], name='livegene_sampling_end_idx'),
+        ),
+    ]
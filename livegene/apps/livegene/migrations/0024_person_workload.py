@@ -0,0 +1,72 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:26
+
+import calendar
+import datetime
+from array import array
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _months(start, end):
+    # (year, month, share of the month's days within start..end)
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        days = calendar.monthrange(year, month)[1]
+        first = start.day if (year, month) == (start.year, start.month) else 1
+        last = end.day if (year, month) == (end.year, end.month) else days
+        yield year, month, (last - first + 1) / days
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def populate(apps, schema_editor):
+    # A frozen copy of `workload.compute`, which may change with the
+    # models after this migration.
+    PersonRole = apps.get_model('livegene', 'PersonRole')
+    PersonWorkload = apps.get_model('livegene', 'PersonWorkload')
+    loads = {}
+    for person, percent, start, end in PersonRole.objects.values_list(
+            'person', 'percent', 'project__start_date', 'project__end_date'):
+        if start > end:
+            continue
+        months = loads.setdefault(person, {})
+        for year, month, share in _months(start, end):
+            months[year, month] = \
+                months.get((year, month), 0) + percent / 100 * share
+    workloads = []
+    for person, months in loads.items():
+        (year, month), last = min(months), max(months)
+        fte = array('d')
+        while (year, month) <= last:
+            fte.append(round(months.get((year, month), 0), 6))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        workloads.append(PersonWorkload(
+            person_id=person,
+            start=datetime.date(*min(months), 1),
+            months=fte.tobytes(),
+            peak=max(fte)
+        ))
+    PersonWorkload.objects.bulk_create(workloads, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0023_interval_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonWorkload',
+            fields=[
+                ('person', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='workload', serialize=False, to='livegene.Person')),
+                ('start', models.DateField()),
+                ('months', models.BinaryField()),
+                ('peak', models.FloatField(db_index=True, default=0)),
+            ],
+            options={
+                'ordering': ('-peak',),
+            },
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
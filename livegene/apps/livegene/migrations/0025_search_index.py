@@ -0,0 +1,72 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:40
+
+from django.conf import settings
+from django.db import migrations
+
+
+# Frozen copies of the search module as of this migration: the FTS5
+# table, the model codes of its rowids and the indexed fields.
+FTS_BACKEND = 'livegene.apps.livegene.search.SQLiteFTSBackend'
+TABLE = 'livegene_search'
+KINDS = 16
+MODELS = (
+    ('Project', 1, ('ilri_code', 'short_name', 'full_name'),
+     ('donor_project_name',)),
+    ('Person', 2, ('username', 'first_name', 'last_name'), ()),
+    ('Organisation', 3, ('short_name', 'full_name'), ()),
+    ('ContactPerson', 4, ('first_name', 'last_name'),
+     ('title', 'email', 'phone')),
+)
+
+
+def _enabled(schema_editor):
+    return schema_editor.connection.vendor == 'sqlite' and getattr(
+        settings, 'LIVEGENE_SEARCH_BACKEND', FTS_BACKEND
+    ) == FTS_BACKEND
+
+
+def _text(values):
+    return ' '.join(str(value) for value in values if value)
+
+
+def install(apps, schema_editor):
+    if not _enabled(schema_editor):
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5('
+        'title, body, tokenize="unicode61 remove_diacritics 2", '
+        'prefix="2 3")'.format(TABLE)
+    )
+    with schema_editor.connection.cursor() as cursor:
+        for name, code, title, body in MODELS:
+            model = apps.get_model('livegene', name)
+            cursor.executemany(
+                'INSERT INTO {0} (rowid, title, body) '
+                'VALUES (%s, %s, %s)'.format(TABLE),
+                [
+                    (
+                        row[0] * KINDS + code,
+                        _text(row[1:len(title) + 1]),
+                        _text(row[len(title) + 1:])
+                    )
+                    for row in model.objects.order_by('pk').values_list(
+                        'pk', *title + body
+                    ).iterator()
+                ]
+            )
+
+
+def uninstall(apps, schema_editor):
+    if _enabled(schema_editor):
+        schema_editor.execute('DROP TABLE IF EXISTS {0}'.format(TABLE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0024_person_workload'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:31
+
+import json
+import mimetypes
+import os
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+import livegene.apps.livegene.storage
+
+
+# Frozen copies of the storage module as of this migration: the blob
+# names and the content types guessed from the file names.
+PREFIX = 'documents'
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+def _digest(name):
+    parts = name.split('/')
+    if len(parts) == 3 and parts[0] == PREFIX and len(parts[2]) == 64:
+        return parts[2]
+    return None
+
+
+def _content_type(filename):
+    return mimetypes.guess_type(filename)[0] or DEFAULT_CONTENT_TYPE
+
+
+def store_existing_documents(apps, schema_editor):
+    # Copy the files saved before the documents were stored by content
+    # into the blob store and fill in their metadata. The original
+    # files are left in place.
+    SamplingDocument = apps.get_model('livegene', 'SamplingDocument')
+    Change = apps.get_model('livegene', 'Change')
+    changes = []
+    for document in SamplingDocument.objects.order_by('pk'):
+        name = document.document.name
+        if not name or _digest(name) or \
+                not document.document.storage.exists(name):
+            continue
+        with document.document.storage.open(name) as f:
+            document.document.save(name, f, save=False)
+        document.filename = os.path.basename(name)
+        document.content_type = _content_type(document.filename)
+        document.sha256 = _digest(document.document.name)
+        document.size = document.document.size
+        document.save()
+        changes.append(Change(
+            table='livegene.samplingdocument',
+            object_id=document.pk,
+            action='update',
+            data=json.dumps({
+                field.attname: field.get_prep_value(
+                    field.value_from_object(document)
+                )
+                for field in SamplingDocument._meta.concrete_fields
+            }, cls=DjangoJSONEncoder)
+        ))
+    Change.objects.bulk_create(changes, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0025_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='samplingdocument',
+            name='content_type',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='samplingdocument',
+            name='filename',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='samplingdocument',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='samplingdocument',
+            name='size',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='samplingdocument',
+            name='document',
+            field=models.FileField(storage=livegene.apps.livegene.storage.ContentAddressedStorage(), upload_to=''),
+        ),
+        migrations.RunPython(store_existing_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import livegene.apps.livegene.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('livegene', '0026_document_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentUpload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(default=livegene.apps.livegene.models.upload_token, max_length=43, unique=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('received', models.BigIntegerField(default=0)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True, db_index=True)),
+                ('document_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='livegene.SamplingDocumentType')),
+                ('sampling_activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='livegene.SamplingActivity')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('created',),
+            },
+        ),
+    ]
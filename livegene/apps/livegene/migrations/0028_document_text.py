@@ -0,0 +1,53 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.utils.timezone
+
+
+# Frozen copies of the search module as of this migration.
+FTS_BACKEND = 'livegene.apps.livegene.search.SQLiteFTSBackend'
+TABLE = 'livegene_search'
+KINDS = 16
+DOCUMENT_CODE = 5
+
+
+def index_documents(apps, schema_editor):
+    # The documents are indexed by name until their text is extracted.
+    if schema_editor.connection.vendor != 'sqlite' or getattr(
+            settings, 'LIVEGENE_SEARCH_BACKEND', FTS_BACKEND
+    ) != FTS_BACKEND:
+        return
+    SamplingDocument = apps.get_model('livegene', 'SamplingDocument')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT OR REPLACE INTO {0} (rowid, title, body) '
+            'VALUES (%s, %s, %s)'.format(TABLE),
+            [
+                (pk * KINDS + DOCUMENT_CODE, filename, '')
+                for pk, filename in SamplingDocument.objects.order_by(
+                    'pk'
+                ).values_list('pk', 'filename').iterator()
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0027_document_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('text', models.TextField(blank=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('extracted', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(index_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.1.1 on 2026-10-17 22:39
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livegene', '0028_document_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Logo',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, unique=True)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('png', models.CharField(blank=True, max_length=100)),
+                ('webp', models.CharField(blank=True, max_length=100)),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('fetched', models.DateTimeField(default=django.utils.timezone.now)),
+                ('error', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'ordering': ('url',),
+            },
+        ),
+    ]
@@ -1,19 +1,234 @@
-from django.db import models
+import datetime
+import secrets
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import MaxValueValidator
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.html import format_html
 
 from django_countries.fields import CountryField
 from colorfield.fields import ColorField
 
+from . import reference
+from .storage import ContentAddressedStorage
 from .validators import validate_lowercase
 
 
-class ProjectManager(models.Model):
+class TrackedModel(models.Model):
+    """
+    Base of the domain models, recording when each row last changed.
+    """
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        abstract = True
+
+
+class TableChange(models.Model):
+    """
+    High-water mark of every tracked table: the last time any row of
+    it was created, changed or deleted.
+    """
+    table = models.CharField(max_length=100, unique=True)
+    modified = models.DateTimeField()
+
+    class Meta:
+        ordering = ('table',)
+
+    def __str__(self):
+        return self.table
+
+
+class Change(models.Model):
+    """
+    Entry of the change log: one insert, update or delete of a row of a
+    tracked table. The primary key is the sequence number of the entry.
+    """
+    INSERT = 'insert'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTIONS = (
+        (INSERT, 'Insert'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    )
+
+    table = models.CharField(max_length=100)
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=6, choices=ACTIONS)
+    # JSON of the row after the change, empty for deletes
+    data = models.TextField(blank=True, null=True)
+    time = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ('id',)
+        indexes = [
+            models.Index(
+                fields=['table', 'object_id'],
+                name='livegene_change_row_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return '{0} {1} {2}'.format(self.action, self.table, self.object_id)
+
+
+class AllocationQuerySet(models.QuerySet):
+    """
+    QuerySet for the role models that allocate a percentage.
+    The percentages are summed over the `total_field` foreign key.
+    """
+    total_field = 'project'
+
+    def _total_subquery(self):
+        return Subquery(
+            self.model._default_manager
+            .filter(**{self.total_field: OuterRef(self.total_field)})
+            .order_by()
+            .values(self.total_field)
+            .annotate(total=Sum('percent'))
+            .values('total'),
+            output_field=models.IntegerField()
+        )
+
+    def with_totals(self):
+        """
+        Annotate every role with the sum of all percentages sharing
+        its `total_field`, computed by the database in the same query.
+        """
+        return self.annotate(percent_total=self._total_subquery())
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import changelog, ledger, tracking
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            ledger.refresh_roles(self.model, objs)
+            changelog.record_created(self.model, objs, using=self.db)
+        tracking.touch(self.model)
+        return objs
+
+    def update(self, **kwargs):
+        from . import changelog, ledger, tracking
+        with transaction.atomic(using=self.db):
+            before = list(self.order_by())
+            kwargs.setdefault('modified', timezone.now())
+            rows = super().update(**kwargs)
+            manager = self.model._default_manager.db_manager(self.db)
+            after = [
+                obj
+                for chunk in ledger.chunked([obj.pk for obj in before])
+                for obj in manager.filter(pk__in=chunk)
+            ]
+            ledger.refresh_roles(self.model, before + after)
+            changelog.record_objects(after, Change.UPDATE, using=self.db)
+        tracking.touch(self.model)
+        return rows
+
+    def total(self):
+        return self.aggregate(total=Sum('percent'))['total'] or 0
+
+    def totals(self):
+        """
+        Return a {pk: total percent} dictionary in one GROUP BY query.
+        """
+        return dict(
+            self.order_by()
+            .values_list(self.total_field)
+            .annotate(Sum('percent'))
+        )
+
+
+class PersonRoleQuerySet(AllocationQuerySet):
+    total_field = 'person'
+
+
+class IntervalQuerySet(models.QuerySet):
+    """
+    QuerySet for the models running from `start_date` to `end_date`,
+    both included. A NULL date leaves the interval open on that side:
+    it started before any date or has not ended.
+    """
+    def _bound(self, name, lookup, value):
+        condition = Q(**{'{0}__{1}'.format(name, lookup): value})
+        if self.model._meta.get_field(name).null:
+            condition |= Q(**{'{0}__isnull'.format(name): True})
+        return condition
+
+    def active_between(self, start=None, end=None):
+        """
+        Rows whose interval overlaps `start` to `end`; a missing bound
+        is open.
+        """
+        condition = Q()
+        if end is not None:
+            condition &= self._bound('start_date', 'lte', end)
+        if start is not None:
+            condition &= self._bound('end_date', 'gte', start)
+        return self.filter(condition)
+
+    def active_on(self, date):
+        return self.active_between(date, date)
+
+    def ending_within(self, days, today=None):
+        """
+        Rows ending in the next `days` days, today included. Open
+        intervals never end.
+        """
+        today = today or timezone.localdate()
+        return self.filter(
+            end_date__range=(today, today + datetime.timedelta(days=days))
+        )
+
+    def overlapping(self, obj):
+        """
+        Rows overlapping the interval of `obj`, any object with start and
+        end dates, leaving out `obj` itself.
+        """
+        queryset = self.active_between(obj.start_date, obj.end_date)
+        if isinstance(obj, self.model):
+            queryset = queryset.exclude(pk=obj.pk)
+        return queryset
+
+
+class ProjectQuerySet(IntervalQuerySet):
+    def with_allocation(self):
+        """
+        Annotate every project with the total percentages of its person,
+        country and SDG roles. Each total is a grouped subquery so the
+        sums are not multiplied by joining the role tables together.
+        """
+        return self.annotate(
+            person_percent=self._role_total(PersonRole),
+            country_percent=self._role_total(CountryRole),
+            sdg_percent=self._role_total(SDGRole)
+        )
+
+    @staticmethod
+    def _role_total(model):
+        return Coalesce(
+            Subquery(
+                model._default_manager
+                .filter(project=OuterRef('pk'))
+                .order_by()
+                .values('project')
+                .annotate(total=Sum('percent'))
+                .values('total'),
+                output_field=models.IntegerField()
+            ),
+            0
+        )
+
+
+class ProjectManager(models.Manager.from_queryset(ProjectQuerySet)):
     def get_by_natural_key(self, ilri_code):
         return self.get(ilri_code=ilri_code)
 
 
-class Project(models.Model):
+class Project(TrackedModel):
     ilri_code = models.CharField(max_length=55, unique=True)
     full_name = models.CharField(max_length=100, unique=True)
     short_name = models.CharField(max_length=30, blank=True)
@@ -43,6 +258,12 @@ class Project(models.Model):
 
     class Meta:
         ordering = ('ilri_code',)
+        indexes = [
+            models.Index(
+                fields=['end_date', 'start_date'],
+                name='livegene_project_end_idx'
+            ),
+        ]
 
     def __str__(self):
         return '{0} ({1})'.format(self.full_name, self.ilri_code)
@@ -51,7 +272,7 @@ class Project(models.Model):
         return (self.ilri_code,)
 
 
-class Partnership(models.Model):
+class Partnership(TrackedModel):
     partner = models.ForeignKey(
         'Organisation',
         on_delete=models.DO_NOTHING,
@@ -65,11 +286,26 @@ class Partnership(models.Model):
     start_date = models.DateField(null=True)
     end_date = models.DateField(null=True)
 
+    objects = IntervalQuerySet.as_manager()
+
     class Meta:
         ordering = ('-end_date', '-start_date')
-    
+        indexes = [
+            models.Index(
+                fields=['end_date', 'start_date'],
+                name='livegene_partner_end_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return '{0} ({1} - {2})'.format(
+            self.partner,
+            self.start_date or '',
+            self.end_date or ''
+        )
 
-class PartnershipRole(models.Model):
+
+class PartnershipRole(TrackedModel):
     project = models.ForeignKey(
         'Project',
         on_delete=models.DO_NOTHING,
@@ -90,7 +326,7 @@ class PartnershipRole(models.Model):
         ordering = ('role_type',)
 
 
-class PartnershipRoleType(models.Model):
+class PartnershipRoleType(TrackedModel):
     description = models.CharField(max_length=255, unique=True)
 
     class Meta:
@@ -100,7 +336,7 @@ class PartnershipRoleType(models.Model):
         return self.description
 
 
-class Organisation(models.Model):
+class Organisation(TrackedModel):
     short_name = models.CharField(max_length=15, blank=True)
     full_name = models.CharField(max_length=100, unique=True)
     logo_url = models.URLField(blank=True, null=True)
@@ -118,19 +354,32 @@ class Organisation(models.Model):
 
     @property
     def logo(self):
-        return format_html(
-            '<img src="{logo_url}" alt="{short_name}" style="width: 400px;">',
-            logo_url=self.logo_url,
-            short_name=self.short_name
+        return Logo.html(
+            self.logo_url, self.short_name, getattr(self, '_logos', None)
         )
 
 
-class PersonManager(models.Manager):
+class PersonQuerySet(models.QuerySet):
+    def with_allocation(self):
+        """
+        Annotate every person with the total percentage allocated across
+        all projects and the number of projects involved.
+        """
+        return self.annotate(
+            percent_total=Coalesce(Sum('roles__percent'), 0),
+            project_count=Count('roles')
+        )
+
+    def over_allocated(self, limit=100):
+        return self.filter(allocation__total__gt=limit)
+
+
+class PersonManager(models.Manager.from_queryset(PersonQuerySet)):
     def get_by_natural_key(self, username):
         return self.get(username=username)
 
 
-class Person(models.Model):
+class Person(TrackedModel):
     username = models.CharField(
         max_length=12,
         unique=True,
@@ -146,6 +395,14 @@ class Person(models.Model):
     class Meta:
         verbose_name_plural = 'people'
         ordering = ('last_name', 'first_name')
+        # Serves the ordering of lists and autocomplete results; the
+        # searches themselves go through the full-text index.
+        indexes = [
+            models.Index(
+                fields=['last_name', 'first_name'],
+                name='livegene_person_name_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.full_name
@@ -158,7 +415,7 @@ class Person(models.Model):
         return (self.username,)
 
 
-class PersonRole(models.Model):
+class PersonRole(TrackedModel):
     project = models.ForeignKey(
         'Project',
         on_delete=models.CASCADE,
@@ -173,6 +430,8 @@ class PersonRole(models.Model):
         validators=[MaxValueValidator(100)]
     )
 
+    objects = PersonRoleQuerySet.as_manager()
+
     class Meta:
         unique_together = ('project', 'person')
 
@@ -181,12 +440,12 @@ class PersonRole(models.Model):
 
     @property
     def total_percentage(self):
-        qs = PersonRole.objects.filter(person=self.person)
-        total = sum([item.percent for item in qs])
-        return total
+        if hasattr(self, 'percent_total'):
+            return self.percent_total
+        return PersonRole.objects.filter(person=self.person_id).total()
 
 
-class ContactPerson(models.Model):
+class ContactPerson(TrackedModel):
     title = models.CharField(max_length=30, blank=True)
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=100)
@@ -196,6 +455,14 @@ class ContactPerson(models.Model):
     class Meta:
         verbose_name_plural = 'contact people'
         ordering = ('last_name', 'first_name')
+        # Serves the ordering of lists and autocomplete results; the
+        # searches themselves go through the full-text index.
+        indexes = [
+            models.Index(
+                fields=['last_name', 'first_name'],
+                name='livegene_contact_name_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.full_name
@@ -214,10 +481,10 @@ class ContactPerson(models.Model):
 
 class CountryManager(models.Manager):
     def get_by_natural_key(self, country):
-        return self.get(country=country)
+        return reference.get_by(self.model, 'country', country, self.db)
 
 
-class Country(models.Model):
+class Country(TrackedModel):
     country = CountryField(unique=True)
 
     objects = CountryManager()
@@ -227,13 +494,13 @@ class Country(models.Model):
         ordering = ('country',)
 
     def __str__(self):
-        return self.country.name
+        return reference.country_name(self.country)
 
     def natural_key(self):
-        return (self.country.country,)
+        return (self.country.code,)
 
 
-class CountryRole(models.Model):
+class CountryRole(TrackedModel):
     project = models.ForeignKey(
         'Project',
         on_delete=models.CASCADE,
@@ -248,20 +515,25 @@ class CountryRole(models.Model):
         validators=[MaxValueValidator(100)]
     )
 
+    objects = AllocationQuerySet.as_manager()
+
     class Meta:
         unique_together = ('project', 'country')
 
     def __str__(self):
-        return '{0} - {1}'.format(self.project, self.country)
+        return '{0} - {1}'.format(
+            self.project,
+            reference.get(Country, self.country_id)
+        )
 
     @property
     def total_percentage(self):
-        qs = CountryRole.objects.filter(project=self.project)
-        total = sum([item.percent for item in qs])
-        return total
+        if hasattr(self, 'percent_total'):
+            return self.percent_total
+        return CountryRole.objects.filter(project=self.project_id).total()
 
 
-class SDG(models.Model):
+class SDG(TrackedModel):
     """
     Sustainable Development Goals (SDG)
     More information under:
@@ -283,14 +555,12 @@ class SDG(models.Model):
 
     @property
     def logo(self):
-        return format_html(
-            '<img src="{logo_url}" alt="{headline}">',
-            logo_url=self.logo_url,
-            headline=self.headline
+        return Logo.html(
+            self.logo_url, self.headline, getattr(self, '_logos', None)
         )
 
 
-class SDGRole(models.Model):
+class SDGRole(TrackedModel):
     project = models.ForeignKey(
         'Project',
         on_delete=models.CASCADE,
@@ -306,22 +576,27 @@ class SDGRole(models.Model):
         validators=[MaxValueValidator(100)]
     )
 
+    objects = AllocationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Sustainable Development Goal Role'
         verbose_name_plural = 'Sustainable Development Goal Roles'
         unique_together = ('project', 'sdg')
 
     def __str__(self):
-        return '{0} - {1}'.format(self.project, self.sdg)
+        return '{0} - {1}'.format(
+            self.project,
+            reference.get(SDG, self.sdg_id)
+        )
 
     @property
     def total_percentage(self):
-        qs = SDGRole.objects.filter(project=self.project)
-        total = sum([item.percent for item in qs])
-        return total
+        if hasattr(self, 'percent_total'):
+            return self.percent_total
+        return SDGRole.objects.filter(project=self.project_id).total()
 
 
-class SamplingActivity(models.Model):
+class SamplingActivity(TrackedModel):
     project = models.ForeignKey(
         'Project',
         on_delete=models.DO_NOTHING,
@@ -336,9 +611,17 @@ class SamplingActivity(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
 
+    objects = IntervalQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = 'sampling activities'
         ordering = ('-end_date', '-start_date')
+        indexes = [
+            models.Index(
+                fields=['end_date', 'start_date'],
+                name='livegene_sampling_end_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.description
@@ -346,10 +629,10 @@ class SamplingActivity(models.Model):
 
 class SamplingDocumentTypeManager(models.Manager):
     def get_by_natural_key(self, short_name):
-        return self.get(short_name=short_name)
+        return reference.get_by(self.model, 'short_name', short_name, self.db)
 
 
-class SamplingDocumentType(models.Model):
+class SamplingDocumentType(TrackedModel):
     short_name = models.CharField(max_length=15)
     long_name = models.CharField(max_length=50)
 
@@ -365,7 +648,7 @@ class SamplingDocumentType(models.Model):
         return (self.short_name,)    
 
 
-class SamplingDocument(models.Model):
+class SamplingDocument(TrackedModel):
     sampling_activity = models.ForeignKey(
         'SamplingActivity',
         on_delete=models.DO_NOTHING,
@@ -376,4 +659,248 @@ class SamplingDocument(models.Model):
         on_delete=models.DO_NOTHING,
         related_name='sampling_documents'
     )
-    document = models.FileField()
+    document = models.FileField(storage=ContentAddressedStorage())
+    # Filled in from the stored file when the document is saved
+    filename = models.CharField(max_length=255, blank=True, editable=False)
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        db_index=True
+    )
+    size = models.BigIntegerField(null=True, editable=False)
+    content_type = models.CharField(max_length=100, blank=True, editable=False)
+
+    def __str__(self):
+        return self.filename or self.document.name
+
+    @property
+    def contents(self):
+        """
+        Text extracted from the file, empty until it has been extracted.
+        It is read once, unless set beforehand or by `with_contents()`.
+        """
+        # Kept with its digest, which a new file changes
+        cached = self.__dict__.get('_contents')
+        if cached is None or cached[0] != self.sha256:
+            self.contents = self.sha256 and DocumentText.objects.filter(
+                sha256=self.sha256
+            ).values_list('text', flat=True).first() or ''
+        return self._contents[1]
+
+    @contents.setter
+    def contents(self, text):
+        self._contents = (self.sha256, text)
+
+    @classmethod
+    def with_contents(cls, documents):
+        """
+        Set the `contents` of `documents` reading the text of every
+        digest once.
+        """
+        documents = list(documents)
+        texts = dict(DocumentText.objects.filter(
+            sha256__in={document.sha256 for document in documents}
+        ).values_list('sha256', 'text'))
+        for document in documents:
+            document.contents = texts.get(document.sha256, '')
+        return documents
+
+
+class DocumentText(models.Model):
+    """
+    Text extracted from the stored file with the given digest, shared by
+    all the documents with that content. It is filled in by the
+    `extract_documents` command.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    text = models.TextField(blank=True)
+    # Why no text could be extracted, if it failed
+    error = models.CharField(max_length=255, blank=True)
+    extracted = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.sha256
+
+
+def upload_token():
+    return secrets.token_urlsafe(32)
+
+
+class DocumentUpload(models.Model):
+    """
+    Resumable upload of a sampling document. The chunks received so far
+    are kept in a temporary file; the document is created once all
+    `size` bytes have arrived.
+    """
+    token = models.CharField(max_length=43, unique=True, default=upload_token)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    sampling_activity = models.ForeignKey(
+        'SamplingActivity',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    document_type = models.ForeignKey(
+        'SamplingDocumentType',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    # Expected SHA-256 digest of the complete file, if the client gave one
+    sha256 = models.CharField(max_length=64, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        ordering = ('created',)
+
+    def __str__(self):
+        return self.filename
+
+
+class LogoQuerySet(models.QuerySet):
+    def by_url(self, urls):
+        """
+        Return the fetched logos of `urls` by URL, in one query.
+        """
+        return {
+            logo.url: logo
+            for logo in self.filter(url__in=set(urls)).exclude(png='')
+        }
+
+
+class Logo(models.Model):
+    """
+    Local thumbnails of a remote logo, in PNG and WebP, named by the
+    digest of their content. They are made by the `fetch_logos`
+    command.
+    """
+    url = models.URLField(max_length=500, unique=True)
+    # Digest of the fetched image, to skip unchanged ones
+    sha256 = models.CharField(max_length=64, blank=True)
+    png = models.CharField(max_length=100, blank=True)
+    webp = models.CharField(max_length=100, blank=True)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    fetched = models.DateTimeField(default=timezone.now)
+    # Why the last fetch failed, if it did
+    error = models.CharField(max_length=255, blank=True)
+
+    objects = LogoQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('url',)
+
+    def __str__(self):
+        return self.url
+
+    @classmethod
+    def attach(cls, objs):
+        """
+        Look up the logos of the organisations or SDGs `objs` at once,
+        so that rendering their `logo` does not query each of them.
+        """
+        objs = list(objs)
+        logos = cls.objects.by_url(obj.logo_url for obj in objs)
+        for obj in objs:
+            obj._logos = logos
+        return objs
+
+    @classmethod
+    def html(cls, url, alt, logos=None):
+        """
+        Return the thumbnail of the logo at `url`, or a link to it until
+        it has been fetched. `logos` are the logos already looked up by
+        `by_url`.
+        """
+        if not url:
+            return ''
+        if logos is None:
+            logos = cls.objects.by_url([url])
+        logo = logos.get(url)
+        if logo is None:
+            return format_html('<a href="{0}">{0}</a>', url)
+        return format_html(
+            '<picture><source srcset="{webp}" type="image/webp">'
+            '<img src="{png}" alt="{alt}" width="{width}" height="{height}">'
+            '</picture>',
+            webp=reverse('livegene:logo', args=[logo.webp]),
+            png=reverse('livegene:logo', args=[logo.png]),
+            alt=alt,
+            width=logo.width,
+            height=logo.height
+        )
+
+
+class PersonAllocation(models.Model):
+    """
+    Ledger row holding the total percentage a person is allocated
+    across all projects. It is maintained by the role models and
+    can be rebuilt with the `rebuild_allocations` command.
+    """
+    person = models.OneToOneField(
+        'Person',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='allocation'
+    )
+    total = models.PositiveIntegerField(default=0, db_index=True)
+
+    class Meta:
+        ordering = ('-total',)
+
+    def __str__(self):
+        return '{0} - {1}%'.format(self.person, self.total)
+
+
+class ProjectAllocation(models.Model):
+    """
+    Ledger row holding the total person, country and SDG percentages
+    of a project.
+    """
+    project = models.OneToOneField(
+        'Project',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='allocation'
+    )
+    person_total = models.PositiveIntegerField(default=0, db_index=True)
+    country_total = models.PositiveIntegerField(default=0, db_index=True)
+    sdg_total = models.PositiveIntegerField(default=0, db_index=True)
+
+    class Meta:
+        ordering = ('project',)
+
+    def __str__(self):
+        return str(self.project)
+
+
+class PersonWorkload(models.Model):
+    """
+    Monthly FTE of a person over all projects, from the first to the
+    last month of their roles. It is maintained with the allocation
+    ledger and can be rebuilt with the `rebuild_allocations` command.
+    """
+    person = models.OneToOneField(
+        'Person',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='workload'
+    )
+    # First day of the first month
+    start = models.DateField()
+    # float64 FTE of every month from `start`
+    months = models.BinaryField()
+    peak = models.FloatField(default=0, db_index=True)
+
+    class Meta:
+        ordering = ('-peak',)
+
+    def __str__(self):
+        return '{0} - {1} FTE'.format(self.person, self.peak)
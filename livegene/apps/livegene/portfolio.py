@@ -0,0 +1,122 @@
+"""
+Percent-weighted portfolio rollups by country and SDG.
+
+The country and SDG roles are loaded as sparse project x dimension
+weight matrices in coordinate form (project index, dimension index,
+percent / 100). Project-level figures are vectors indexed by project,
+so a rollup is a sparse matrix-vector product computed with
+`np.bincount`.
+"""
+import numpy as np
+from django.db.models import Sum
+from django_countries import countries
+
+from livegene.apps.finance.models import Expenditure
+
+from .models import Country, CountryRole, PersonRole, Project, SDG, SDGRole
+
+
+FIGURES = ('budget', 'spend', 'fte')
+
+
+def project_figures():
+    """
+    Return the sorted project ids and a dictionary of figure vectors
+    aligned with them: latest budget and spend and the FTE of the
+    people assigned to each project.
+    """
+    ids = np.array(
+        Project.objects.order_by('pk').values_list('pk', flat=True),
+        dtype=np.int64
+    )
+    figures = {name: np.zeros(len(ids)) for name in FIGURES}
+    latest = Expenditure.objects.latest_snapshots().filter(
+        project__isnull=False
+    ).values_list('project', 'total_budget', 'amount')
+    if latest:
+        project, budget, spend = np.array(
+            list(latest), dtype=np.float64
+        ).T
+        i = np.searchsorted(ids, project.astype(np.int64))
+        figures['budget'][i] = np.nan_to_num(budget)
+        figures['spend'][i] = np.nan_to_num(spend)
+    fte = PersonRole.objects.order_by().values_list('project').annotate(
+        Sum('percent')
+    )
+    if fte:
+        project, percent = np.array(list(fte), dtype=np.int64).T
+        figures['fte'][np.searchsorted(ids, project)] = percent / 100
+    return ids, figures
+
+
+def weights(role_model, field, project_ids):
+    """
+    Return the (project index, dimension id, weight) coordinates of the
+    sparse weight matrix defined by `role_model`.
+    """
+    rows = np.array(
+        list(role_model.objects.order_by().values_list(
+            'project', field, 'percent'
+        )),
+        dtype=np.int64
+    ).reshape(-1, 3)
+    return (
+        np.searchsorted(project_ids, rows[:, 0]),
+        rows[:, 1],
+        rows[:, 2] / 100
+    )
+
+
+def rollup(role_model, field, labels):
+    """
+    Multiply the weight matrix of `role_model` with the project
+    figures and return one dictionary per dimension value.
+    """
+    ids, figures = project_figures()
+    projects, dimension, weight = weights(role_model, field, ids)
+    keys = np.array(sorted(labels), dtype=np.int64)
+    columns = np.searchsorted(keys, dimension)
+    size = len(keys)
+    totals = {
+        name: np.bincount(
+            columns, weights=weight * vector[projects], minlength=size
+        )
+        for name, vector in figures.items()
+    }
+    counts = np.bincount(columns, minlength=size)
+    results = []
+    for i, key in enumerate(keys):
+        if not counts[i]:
+            continue
+        row = {
+            field: int(key),
+            'name': labels[key],
+            'projects': int(counts[i])
+        }
+        for name in FIGURES:
+            row[name] = round(float(totals[name][i]), 2)
+        results.append(row)
+    return results
+
+
+def summary():
+    ids, figures = project_figures()
+    totals = {
+        name: round(float(vector.sum()), 2)
+        for name, vector in figures.items()
+    }
+    totals['projects'] = len(ids)
+    return totals
+
+
+def by_country():
+    labels = {
+        pk: countries.name(code)
+        for pk, code in Country.objects.values_list('pk', 'country')
+    }
+    return rollup(CountryRole, 'country', labels)
+
+
+def by_sdg():
+    labels = dict(SDG.objects.values_list('pk', 'headline'))
+    return rollup(SDGRole, 'sdg', labels)
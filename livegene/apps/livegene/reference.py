@@ -0,0 +1,132 @@
+"""
+Process-local cache of the small reference tables.
+
+`Country`, `SDG`, `PartnershipRoleType` and `SamplingDocumentType` are
+read whole and kept in memory together with the generation number the
+response cache keeps for them. The generation lives in the shared
+cache and is bumped on every change, so each process notices stale
+tables with a cache lookup, made at most once per
+`LIVEGENE_REFERENCE_TTL` seconds, and reloads them with one query.
+Tables changed by the process itself are dropped at once.
+"""
+import copy
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import translation
+from django_countries import countries
+
+from . import caching
+
+
+DEFAULT_TTL = 5
+
+_tables = {}
+_lock = threading.Lock()
+
+
+class Table:
+    def __init__(self, model, version):
+        self.model = model
+        self.version = version
+        self.checked = time.monotonic()
+        self.objects = list(model._default_manager.all())
+        self.by_pk = {obj.pk: obj for obj in self.objects}
+        self._indexes = {}
+
+    def index(self, field):
+        if field not in self._indexes:
+            index = {}
+            for obj in self.objects:
+                index.setdefault(str(getattr(obj, field)), []).append(obj)
+            self._indexes[field] = index
+        return self._indexes[field]
+
+
+def table(model):
+    cached = _tables.get(model)
+    now = time.monotonic()
+    ttl = getattr(settings, 'LIVEGENE_REFERENCE_TTL', DEFAULT_TTL)
+    if cached is not None and now - cached.checked < ttl:
+        return cached
+    version = caching.generations([model])[0]
+    if cached is None or cached.version != version:
+        with _lock:
+            cached = Table(model, version)
+            _tables[model] = cached
+    else:
+        cached.checked = now
+    return cached
+
+
+def forget(*models):
+    """
+    Drop the tables of `models`, which the process has just changed.
+    """
+    for model in models:
+        _tables.pop(model, None)
+
+
+def clear():
+    _tables.clear()
+    _country_name.cache_clear()
+
+
+def rows(model):
+    return table(model).objects
+
+
+def get(model, pk):
+    """
+    Return the cached instance with primary key `pk`. Rows the cache
+    does not hold yet are read from the database, which raises
+    `model.DoesNotExist` like the related object lookup it replaces.
+    """
+    obj = table(model).by_pk.get(pk)
+    if obj is None:
+        obj = model._default_manager.get(pk=pk)
+    return obj
+
+
+def get_by(model, field, value, using=DEFAULT_DB_ALIAS):
+    """
+    Equivalent of `model.objects.get(**{field: value})` served from the
+    cache. The instance is a copy, so callers may modify it.
+    """
+    if using != DEFAULT_DB_ALIAS:
+        return model._default_manager.db_manager(using).get(
+            **{field: value}
+        )
+    found = table(model).index(field).get(str(value), [])
+    if not found:
+        raise model.DoesNotExist(
+            '{0} matching query does not exist.'.format(
+                model._meta.object_name
+            )
+        )
+    if len(found) > 1:
+        raise model.MultipleObjectsReturned(
+            'get() returned more than one {0}.'.format(
+                model._meta.object_name
+            )
+        )
+    return copy.copy(found[0])
+
+
+def choices(model, blank=True):
+    options = [(obj.pk, str(obj)) for obj in rows(model)]
+    if blank:
+        options.insert(0, ('', '---------'))
+    return options
+
+
+@lru_cache(maxsize=None)
+def _country_name(code, language):
+    return str(countries.name(code))
+
+
+def country_name(code):
+    return _country_name(str(code), translation.get_language())
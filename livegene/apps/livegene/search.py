@@ -0,0 +1,347 @@
+"""
+Full-text search over projects, people, organisations, contacts and
+sampling documents.
+
+The searchable text of every row is kept in an index by a pluggable
+backend, chosen with the `LIVEGENE_SEARCH_BACKEND` setting and kept in
+sync by signals. Queries match every word as a prefix, so "liv gen"
+finds "Livestock Genetics", and results are ranked by relevance with
+the title fields (codes and names) weighing more than the others.
+
+Sampling documents are indexed by file name and by the text extracted
+from their files, which is added once the `extract_documents` command
+has processed them.
+
+`SQLiteFTSBackend` stores the index in an FTS5 table; `DatabaseBackend`
+falls back to `icontains` lookups for databases without one.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .models import (
+    ContactPerson,
+    DocumentText,
+    Organisation,
+    Person,
+    Project,
+    SamplingDocument
+)
+
+
+DEFAULT_BACKEND = 'livegene.apps.livegene.search.SQLiteFTSBackend'
+BATCH_SIZE = 500
+
+# Indexed models with a stable code, their title fields and their
+# other searchable fields.
+MODELS = {
+    Project: (1, ('ilri_code', 'short_name', 'full_name'),
+              ('donor_project_name',)),
+    Person: (2, ('username', 'first_name', 'last_name'), ()),
+    Organisation: (3, ('short_name', 'full_name'), ()),
+    ContactPerson: (4, ('first_name', 'last_name'),
+                    ('title', 'email', 'phone')),
+    SamplingDocument: (5, ('filename',), ('contents',)),
+}
+
+
+def words(query):
+    return re.findall(r'\w+', query)
+
+
+def _text(obj, fields):
+    return ' '.join(
+        str(value) for value in (getattr(obj, name) for name in fields)
+        if value
+    )
+
+
+class SearchBackend:
+    def install(self):
+        pass
+
+    def uninstall(self):
+        pass
+
+    def index(self, objs):
+        pass
+
+    def remove(self, model, pks):
+        pass
+
+    def rebuild(self, models=None):
+        for model in models or MODELS:
+            objs = list(model._default_manager.order_by('pk'))
+            for i in range(0, len(objs), BATCH_SIZE):
+                batch = objs[i:i + BATCH_SIZE]
+                if model is SamplingDocument:
+                    batch = SamplingDocument.with_contents(batch)
+                self.index(batch)
+
+    def matches(self, model, query):
+        """
+        Return an expression or queryset of the primary keys of the
+        `model` rows matching `query`, for use with `__in` lookups.
+        """
+        raise NotImplementedError
+
+    def search(self, query, models=None, limit=20, within=None):
+        """
+        Return the best (model, pk, score) matches of `query`, best
+        first. `within` restricts the matches of a single model to the
+        primary keys it selects (a `values('pk')` queryset).
+        """
+        raise NotImplementedError
+
+
+class DatabaseBackend(SearchBackend):
+    """
+    Searches the model tables with `icontains` lookups; nothing is
+    indexed. Rows match when every word is found in one of the fields.
+    """
+    # Lookups of the indexed attributes that are not fields
+    lookups = {
+        (SamplingDocument, 'contents'): lambda word: Q(
+            sha256__in=DocumentText.objects.filter(
+                text__icontains=word
+            ).values('sha256')
+        ),
+    }
+
+    def _lookup(self, model, name, word):
+        lookup = self.lookups.get((model, name))
+        if lookup is not None:
+            return lookup(word)
+        return Q(**{'{0}__icontains'.format(name): word})
+
+    def _condition(self, model, query):
+        code, title, body = MODELS[model]
+        condition = Q()
+        for word in words(query):
+            condition &= Q(*[
+                self._lookup(model, name, word) for name in title + body
+            ], _connector=Q.OR)
+        return condition
+
+    def matches(self, model, query):
+        if not words(query):
+            return model._default_manager.none().values('pk')
+        return model._default_manager.filter(
+            self._condition(model, query)
+        ).values('pk')
+
+    def search(self, query, models=None, limit=20, within=None):
+        results = []
+        if not words(query):
+            return results
+        for model in models or MODELS:
+            pks = model._default_manager.filter(self._condition(model, query))
+            if within is not None:
+                pks = pks.filter(pk__in=within)
+            pks = pks.values_list('pk', flat=True)[:limit - len(results)]
+            results += [(model, pk, 0.0) for pk in pks]
+            if len(results) >= limit:
+                break
+        return results
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    Keeps the index in an FTS5 table whose rowid encodes the model code
+    and the primary key, so that a row is replaced or removed without
+    scanning the index.
+    """
+    table = 'livegene_search'
+    # Relative weights of the title and body columns in the ranking
+    weights = (10.0, 1.0)
+    kinds = 16
+
+    def _rowid(self, model, pk):
+        return pk * self.kinds + MODELS[model][0]
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5('
+                'title, body, tokenize="unicode61 remove_diacritics 2", '
+                'prefix="2 3")'.format(self.table)
+            )
+
+    def uninstall(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS {0}'.format(self.table))
+
+    def index(self, objs):
+        rows = []
+        for obj in objs:
+            code, title, body = MODELS[type(obj)]
+            rows.append((
+                self._rowid(type(obj), obj.pk),
+                _text(obj, title),
+                _text(obj, body)
+            ))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM {0} WHERE rowid = %s'.format(self.table),
+                [row[:1] for row in rows]
+            )
+            cursor.executemany(
+                'INSERT INTO {0} (rowid, title, body) '
+                'VALUES (%s, %s, %s)'.format(self.table),
+                rows
+            )
+
+    def remove(self, model, pks):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM {0} WHERE rowid = %s'.format(self.table),
+                [(self._rowid(model, pk),) for pk in pks]
+            )
+
+    def rebuild(self, models=None):
+        codes = [MODELS[model][0] for model in models or MODELS]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {0} WHERE rowid % {1} IN ({2})'.format(
+                    self.table, self.kinds, ', '.join(map(str, codes))
+                )
+            )
+        super().rebuild(models)
+
+    @staticmethod
+    def _match(query):
+        return ' '.join('"{0}"*'.format(word) for word in words(query))
+
+    def matches(self, model, query):
+        match = self._match(query)
+        if not match:
+            return model._default_manager.none().values('pk')
+        return RawSQL(
+            'SELECT rowid / {1} FROM {0} WHERE {0} MATCH %s '
+            'AND rowid %% {1} = %s'.format(self.table, self.kinds),
+            (match, MODELS[model][0])
+        )
+
+    def search(self, query, models=None, limit=20, within=None):
+        match = self._match(query)
+        if not match:
+            return []
+        models = {MODELS[model][0]: model for model in models or MODELS}
+        restriction, params = '', ()
+        if within is not None:
+            sql, params = within.query.sql_with_params()
+            restriction = 'AND rowid / {0} IN ({1}) '.format(self.kinds, sql)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid, -bm25({0}, %s, %s) AS score FROM {0} '
+                'WHERE {0} MATCH %s AND rowid %% {1} IN ({2}) {3}'
+                'ORDER BY bm25({0}, %s, %s) LIMIT %s'.format(
+                    self.table,
+                    self.kinds,
+                    ', '.join(str(code) for code in models),
+                    restriction
+                ),
+                self.weights + (match,) + tuple(params) + self.weights +
+                (limit,)
+            )
+            return [
+                (models[rowid % self.kinds], rowid // self.kinds, score)
+                for rowid, score in cursor.fetchall()
+            ]
+
+
+def results(query, models=None, limit=20):
+    """
+    Return the best matches of `query` as dictionaries with their type,
+    id, label, score and admin change URL.
+    """
+    matches = backend().search(query, models, limit)
+    objects = {}
+    for model in {model for model, pk, score in matches}:
+        objects[model] = model._default_manager.in_bulk(
+            [pk for m, pk, score in matches if m is model]
+        )
+    found = []
+    for model, pk, score in matches:
+        obj = objects[model].get(pk)
+        if obj is None:
+            continue
+        opts = model._meta
+        found.append({
+            'type': opts.model_name,
+            'id': pk,
+            'label': str(obj),
+            'score': round(score, 3),
+            'url': reverse('admin:{0}_{1}_change'.format(
+                opts.app_label, opts.model_name
+            ), args=[pk]),
+        })
+    return found
+
+
+def document_results(query, documents=None, limit=20):
+    """
+    Return the best matches of `query` among the sampling `documents`
+    (all of them by default), searching their file names and contents,
+    as dictionaries with their activity, project, type and download
+    URL.
+    """
+    within = None if documents is None else documents.values('pk')
+    matches = backend().search(query, [SamplingDocument], limit, within)
+    objects = SamplingDocument.objects.select_related(
+        'document_type', 'sampling_activity__project'
+    ).in_bulk([pk for model, pk, score in matches])
+    found = []
+    for model, pk, score in matches:
+        document = objects.get(pk)
+        if document is None:
+            continue
+        activity = document.sampling_activity
+        found.append({
+            'id': pk,
+            'filename': document.filename,
+            'document_type': document.document_type.short_name,
+            'sampling_activity': {
+                'id': activity.pk,
+                'description': activity.description,
+            },
+            'project': {
+                'id': activity.project_id,
+                'ilri_code': activity.project.ilri_code,
+            },
+            'score': round(score, 3),
+            'url': reverse('livegene:document-download', args=[pk]),
+        })
+    return found
+
+
+_backend = None
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(
+            getattr(settings, 'LIVEGENE_SEARCH_BACKEND', DEFAULT_BACKEND)
+        )()
+    return _backend
+
+
+def _saved(sender, instance, **kwargs):
+    backend().index([instance])
+
+
+def _deleted(sender, instance, **kwargs):
+    backend().remove(sender, [instance.pk])
+
+
+def connect():
+    for model in MODELS:
+        post_save.connect(_saved, sender=model)
+        post_delete.connect(_deleted, sender=model)
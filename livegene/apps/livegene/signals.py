@@ -0,0 +1,79 @@
+import os
+
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import changelog, ledger, search, storage, tracking, workload
+from .models import CountryRole, PersonRole, Project, SamplingDocument, SDGRole
+
+
+ROLE_MODELS = (PersonRole, CountryRole, SDGRole)
+
+
+def remember_role(sender, instance, raw=False, **kwargs):
+    # Keep the stored row so that the ledger entries of a role moved
+    # to another project or person are refreshed as well.
+    instance._ledger_previous = None
+    if not raw and not instance._state.adding:
+        instance._ledger_previous = sender._default_manager.filter(
+            pk=instance.pk
+        ).first()
+
+
+def refresh_role(sender, instance, **kwargs):
+    roles = [instance]
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous is not None:
+        roles.append(previous)
+    ledger.refresh_roles(sender, roles)
+
+
+def remember_dates(sender, instance, raw=False, **kwargs):
+    instance._workload_dates = None
+    if not raw and not instance._state.adding:
+        instance._workload_dates = sender._default_manager.filter(
+            pk=instance.pk
+        ).values_list('start_date', 'end_date').first()
+
+
+def refresh_workload(sender, instance, created, raw=False, **kwargs):
+    dates = getattr(instance, '_workload_dates', None)
+    if dates is not None and \
+            dates != (instance.start_date, instance.end_date):
+        workload.refresh(
+            instance.person_roles.values_list('person', flat=True)
+        )
+
+
+def store_document(sender, instance, raw=False, **kwargs):
+    # Store a new file before the row is written, so that the metadata
+    # taken from it is saved with the row.
+    document = instance.document
+    if raw or not document:
+        return
+    if not document._committed:
+        upload = document.file
+        instance.filename = os.path.basename(document.name)
+        instance.content_type = storage.content_type(
+            instance.filename,
+            getattr(upload, 'content_type', None) or
+            storage.DEFAULT_CONTENT_TYPE
+        )
+        document.save(document.name, upload, save=False)
+        document = instance.document
+    digest = document.storage.digest(document.name)
+    if digest and digest != instance.sha256:
+        instance.sha256 = digest
+        instance.size = document.size
+
+
+def connect():
+    tracking.connect()
+    changelog.connect()
+    search.connect()
+    for model in ROLE_MODELS:
+        pre_save.connect(remember_role, sender=model)
+        post_save.connect(refresh_role, sender=model)
+        post_delete.connect(refresh_role, sender=model)
+    pre_save.connect(remember_dates, sender=Project)
+    post_save.connect(refresh_workload, sender=Project)
+    pre_save.connect(store_document, sender=SamplingDocument)
@@ -0,0 +1,47 @@
+/*
+ * Show the running total of the percent column of every inline that
+ * has one, updated while the form is edited.
+ */
+(function() {
+    'use strict';
+
+    function isPercent(input) {
+        return /-\d+-percent$/.test(input.name);
+    }
+
+    function isDeleted(input) {
+        var row = input.closest('tr');
+        var remove = row && row.querySelector('input[name$="-DELETE"]');
+        return remove && remove.checked;
+    }
+
+    function update(group, output) {
+        var total = 0;
+        group.querySelectorAll('input').forEach(function(input) {
+            if (isPercent(input) && !isDeleted(input) && input.value) {
+                total += parseInt(input.value, 10) || 0;
+            }
+        });
+        output.textContent = 'Total: ' + total + '%';
+        output.style.color = total === 100 ? '' : '#ba2121';
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('.inline-group').forEach(function(group) {
+            if (!group.querySelector('input[name$="-percent"]')) {
+                return;
+            }
+            var output = document.createElement('p');
+            output.className = 'help percent-total';
+            group.querySelector('fieldset').appendChild(output);
+            var refresh = function() { update(group, output); };
+            group.addEventListener('input', refresh);
+            group.addEventListener('change', refresh);
+            // Rows added or removed by inlines.js
+            new MutationObserver(refresh).observe(
+                group, {childList: true, subtree: true}
+            );
+            refresh();
+        });
+    });
+})();
@@ -0,0 +1,136 @@
+"""
+Content-addressed storage of the sampling documents.
+
+Files are hashed with SHA-256 while they are written and stored under
+their digest, so a document uploaded to many sampling activities is
+kept once: saving content that is already stored only refreshes the
+modification time of the existing blob. Blobs are never overwritten or
+deleted with the rows that reference them; `collect()` removes the ones
+no row references any more.
+
+A blob is written to a temporary file next to its destination and
+renamed into place, so a blob name always refers to complete content.
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+PREFIX = 'documents'
+CHUNK_SIZE = 64 * 1024
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+# Blobs younger than this are kept by `collect()`: they may have just
+# been saved for a row that is not committed yet.
+GRACE_PERIOD = 24 * 60 * 60
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def blob_name(self, digest):
+        return '/'.join((PREFIX, digest[:2], digest))
+
+    @staticmethod
+    def digest(name):
+        """
+        Return the SHA-256 digest of the blob `name`, or None for files
+        that are not stored by content.
+        """
+        parts = name.split('/')
+        if len(parts) == 3 and parts[0] == PREFIX and len(parts[2]) == 64:
+            return parts[2]
+        return None
+
+    def get_available_name(self, name, max_length=None):
+        # The final name only depends on the content.
+        return name
+
+    def _store(self, temporary, digest):
+        # Move the complete file `temporary` into place as the blob of
+        # `digest`, or drop it when that blob is already stored.
+        name = self.blob_name(digest)
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            os.replace(temporary, path)
+        else:
+            os.remove(temporary)
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(PREFIX)
+        os.makedirs(directory, exist_ok=True)
+        sha256 = hashlib.sha256()
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    f.write(chunk)
+            return self._store(temporary, sha256.hexdigest())
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def adopt(self, path):
+        """
+        Move the file at `path`, which must be on the same file system as
+        the storage, into the store without copying it and return its
+        name.
+        """
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        return self._store(path, sha256.hexdigest())
+
+    def blobs(self):
+        """
+        Yield the name, size and modification time of every stored blob.
+        """
+        for directory, _, files in os.walk(self.path(PREFIX)):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.location).replace(
+                    os.sep, '/'
+                )
+                if self.digest(name):
+                    stat = os.stat(path)
+                    yield name, stat.st_size, stat.st_mtime
+
+
+def content_type(filename, default=DEFAULT_CONTENT_TYPE):
+    return mimetypes.guess_type(filename)[0] or default
+
+
+def collect(storage, referenced, grace=GRACE_PERIOD, dry_run=False):
+    """
+    Delete the blobs of `storage` whose names are not in `referenced`
+    and that are older than `grace` seconds. Return the number and the
+    total size of the deleted blobs.
+    """
+    referenced = set(referenced)
+    horizon = time.time() - grace
+    count = size = 0
+    for name, blob_size, modified in list(storage.blobs()):
+        if name in referenced or modified > horizon:
+            continue
+        if not dry_run:
+            storage.delete(name)
+            try:
+                # Only succeeds once the last blob of a prefix is gone.
+                os.rmdir(os.path.dirname(storage.path(name)))
+            except OSError:
+                pass
+        count += 1
+        size += blob_size
+    return count, size
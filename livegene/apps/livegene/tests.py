@@ -1,3 +1,1145 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django_countries import countries
+from PIL import Image
+
+from livegene.apps.finance.models import Expenditure
+
+from . import (
+    api,
+    caching,
+    changelog,
+    extraction,
+    logos,
+    portfolio,
+    reference,
+    search,
+    storage,
+    tracking,
+    uploads,
+    workload
+)
+from .models import (
+    Change,
+    Country,
+    CountryRole,
+    DocumentText,
+    DocumentUpload,
+    Logo,
+    Organisation,
+    Partnership,
+    PartnershipRole,
+    PartnershipRoleType,
+    Person,
+    PersonRole,
+    PersonWorkload,
+    Project,
+    SDG,
+    SDGRole,
+    SamplingActivity,
+    SamplingDocument,
+    SamplingDocumentType,
+    TableChange
+)
+
+
+def create_project():
+    person = Person.objects.create(
+        username='jdoe',
+        first_name='Jane',
+        last_name='Doe',
+        home_program='Biosciences',
+        email='jdoe@example.org'
+    )
+    return Project.objects.create(
+        ilri_code='A1',
+        full_name='Livestock Genetics',
+        principal_investigator=person,
+        projects_group='Genetics',
+        start_date=datetime.date(2018, 1, 1),
+        end_date=datetime.date(2020, 12, 31),
+        status=0,
+        capacity_development=0
+    )
+
+
+def create_partnership():
+    return Partnership.objects.create(
+        partner=Organisation.objects.create(
+            full_name='Partner',
+            country=Country.objects.create(country='KE')
+        )
+    )
+
+
+class ProjectAdminTests(TestCase):
+    INLINES = ('person_roles', 'country_roles', 'sdg_roles',
+               'partnership_roles')
+
+    def setUp(self):
+        self.project = create_project()
+        self.person = self.project.principal_investigator
+        self.partnership = create_partnership()
+        self.role_type = PartnershipRoleType.objects.create(
+            description='Lead'
+        )
+        User.objects.create_superuser('admin', 'admin@example.org', 'pw')
+        self.client.login(username='admin', password='pw')
+
+    def data(self, **inlines):
+        data = {
+            'ilri_code': self.project.ilri_code,
+            'full_name': self.project.full_name,
+            'principal_investigator': self.person.pk,
+            'projects_group': self.project.projects_group,
+            'start_date': self.project.start_date,
+            'end_date': self.project.end_date,
+            'status': self.project.status,
+            'capacity_development': self.project.capacity_development,
+        }
+        for prefix in self.INLINES:
+            forms = inlines.get(prefix, [])
+            data.update({
+                prefix + '-TOTAL_FORMS': len(forms),
+                prefix + '-INITIAL_FORMS': 0,
+            })
+            for i, fields in enumerate(forms):
+                for name, value in fields.items():
+                    data['{0}-{1}-{2}'.format(prefix, i, name)] = value
+        return data
+
+    def inserts(self, model):
+        return set(Change.objects.filter(
+            table=model._meta.label_lower, action=Change.INSERT
+        ).values_list('object_id', flat=True))
+
+    def test_new_inline_roles_are_recorded(self):
+        response = self.client.post(
+            reverse('admin:livegene_project_change', args=[self.project.pk]),
+            self.data(
+                person_roles=[{'person': self.person.pk, 'percent': 40}],
+                partnership_roles=[{
+                    'partnership': self.partnership.pk,
+                    'role_type': self.role_type.pk,
+                }]
+            )
+        )
+        self.assertEqual(response.status_code, 302)
+        for model in (PersonRole, PartnershipRole):
+            objs = set(model.objects.values_list('pk', flat=True))
+            self.assertEqual(len(objs), 1)
+            self.assertEqual(self.inserts(model), objs)
+            self.assertTrue(TableChange.objects.filter(
+                table=model._meta.label_lower
+            ).exists())
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        project = create_project()
+        self.activity = SamplingActivity.objects.create(
+            project=project,
+            partnership=create_partnership(),
+            description='Sampling',
+            start_date=project.start_date,
+            end_date=project.end_date
+        )
+        self.document_type = SamplingDocumentType.objects.create(
+            short_name='data', long_name='Data'
+        )
+        User.objects.create_superuser('admin', 'admin@example.org', 'pw')
+        self.client.login(username='admin', password='pw')
+        self.data = b'0123456789' * 1000
+
+    def start(self):
+        response = self.client.post(reverse('livegene:upload-create'), {
+            'sampling_activity': self.activity.pk,
+            'document_type': self.document_type.pk,
+            'filename': 'data.csv',
+            'size': len(self.data),
+            'sha256': hashlib.sha256(self.data).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        return DocumentUpload.objects.get(token=response.json()['token'])
+
+    def patch(self, upload, offset, body):
+        return self.client.generic(
+            'PATCH',
+            reverse('livegene:upload-detail', args=[upload.token]),
+            body,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_upload_in_chunks(self):
+        upload = self.start()
+        response = self.patch(upload, 0, self.data[:4000])
+        self.assertEqual(response.json()['offset'], 4000)
+        response = self.patch(upload, 4000, self.data[4000:])
+        self.assertEqual(response.status_code, 201)
+        document = SamplingDocument.objects.get(pk=response.json()['document'])
+        with document.document.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.listdir(os.path.dirname(
+            uploads.part_path(upload.token)
+        )), [])
+
+    def test_concurrent_chunk_leaves_the_received_data(self):
+        upload = self.start()
+        # A request that read the upload before another one appended
+        # the same chunk
+        request = RequestFactory().generic(
+            'PATCH', '/', b'x' * 2000, HTTP_UPLOAD_OFFSET='0'
+        )
+        self.patch(upload, 0, self.data[:4000])
+        response = uploads.append(request, upload)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(json.loads(response.content)['offset'], 4000)
+        with open(uploads.part_path(upload.token), 'rb') as f:
+            self.assertEqual(f.read(), self.data[:4000])
+
+    def test_lost_part_file_discards_the_upload(self):
+        upload = self.start()
+        os.remove(uploads.part_path(upload.token))
+        response = self.patch(upload, 0, self.data[:4000])
+        self.assertEqual(response.status_code, 410)
+        self.assertFalse(DocumentUpload.objects.exists())
+
+
+class LogoTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(
+            MEDIA_ROOT=os.path.join(root, 'media'),
+            LIVEGENE_LOGO_FETCHER='livegene.apps.livegene.logos.LocalFetcher',
+            LIVEGENE_LOGO_ROOT=root
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        image = io.BytesIO()
+        Image.new('RGB', (800, 400), (200, 30, 30)).save(image, 'PNG')
+        with open(os.path.join(root, 'partner.png'), 'wb') as f:
+            f.write(image.getvalue())
+        self.organisation = Organisation.objects.create(
+            full_name='Partner',
+            logo_url='https://example.org/img/partner.png',
+            country=Country.objects.create(country='KE')
+        )
+        self.sdg = SDG.objects.create(
+            headline='No poverty',
+            full_name='End poverty in all its forms everywhere',
+            color='#e5243b',
+            link='https://example.org/goals/1',
+            logo_url='https://example.org/img/missing.png'
+        )
+
+    def test_refresh_makes_thumbnails_named_by_content(self):
+        self.assertEqual(logos.refresh(), (1, 1))
+        logo = Logo.objects.get(url=self.organisation.logo_url)
+        self.assertEqual((logo.width, logo.height), (200, 100))
+        for name, extension in ((logo.png, 'png'), (logo.webp, 'webp')):
+            path = os.path.join(logos.DIRECTORY, name)
+            with default_storage.open(path) as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            self.assertEqual(name, '{0}.{1}'.format(digest[:20], extension))
+        missing = Logo.objects.get(url=self.sdg.logo_url)
+        self.assertIn('FetchError', missing.error)
+        # Fetched logos are not fetched again.
+        self.assertEqual(logos.refresh(), (0, 1))
+
+    def test_logo_file_headers(self):
+        logos.refresh()
+        logo = Logo.objects.get(url=self.organisation.logo_url)
+        response = self.client.get(reverse('livegene:logo', args=[logo.webp]))
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(
+            response['Cache-Control'],
+            'public, max-age={0}, immutable'.format(logos.MAX_AGE)
+        )
+        response = self.client.get(
+            reverse('livegene:logo', args=['settings.py'])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_attached_logos_render_without_queries(self):
+        logos.refresh()
+        objs = Logo.attach([self.organisation, self.sdg])
+        with self.assertNumQueries(0):
+            organisation, sdg = [obj.logo for obj in objs]
+        self.assertIn('<picture>', organisation)
+        self.assertIn(self.sdg.logo_url, sdg)
+
+
+class ReferenceTests(TestCase):
+    def setUp(self):
+        reference.clear()
+        self.addCleanup(reference.clear)
+
+    def test_get_reads_rows_missing_from_the_cache(self):
+        self.assertEqual(reference.rows(Country), [])
+        country = Country.objects.create(country='KE')
+        self.assertEqual(reference.get(Country, country.pk), country)
+        with self.assertRaises(Country.DoesNotExist):
+            reference.get(Country, country.pk + 1)
+
+    def test_generation_is_checked_once_per_ttl(self):
+        country = Country.objects.create(country='KE')
+        with mock.patch.object(
+            caching, 'generations', wraps=caching.generations
+        ) as generations:
+            self.assertEqual(reference.rows(Country), [country])
+            # Changed by another process
+            Country.objects.filter(pk=country.pk).update(country='UG')
+            caching.invalidate(Country)
+            self.assertEqual(reference.get(Country, country.pk).country, 'KE')
+            self.assertEqual(generations.call_count, 1)
+            with override_settings(LIVEGENE_REFERENCE_TTL=0):
+                self.assertEqual(
+                    reference.get(Country, country.pk).country, 'UG'
+                )
+            self.assertEqual(generations.call_count, 2)
+
+    def test_changes_of_the_process_are_seen_at_once(self):
+        self.assertEqual(reference.rows(Country), [])
+        country = Country.objects.create(country='KE')
+        self.assertEqual(reference.rows(Country), [country])
+        self.assertEqual(reference.choices(Country), [
+            ('', '---------'), (country.pk, str(country))
+        ])
+
+    def test_role_names_the_country(self):
+        country = Country.objects.create(country='KE')
+        role = CountryRole.objects.create(
+            project=create_project(), country=country, percent=100
+        )
+        self.assertEqual(
+            str(role), 'Livestock Genetics (A1) - {0}'.format(country)
+        )
+
+
+class TrackingTests(TransactionTestCase):
+    def mark(self, model):
+        return tracking.high_water_marks([model]).get(
+            model._meta.label_lower
+        )
+
+    def test_marks_move_once_per_transaction(self):
+        before = self.mark(Person)
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                for i in range(5):
+                    Person.objects.create(
+                        username='user{0}'.format(i),
+                        first_name='First',
+                        last_name='Last',
+                        home_program='Biosciences',
+                        email='user{0}@example.org'.format(i)
+                    )
+                self.assertEqual(self.mark(Person), before)
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "livegene_tablechange"')
+        ]), 1)
+        self.assertNotEqual(self.mark(Person), before)
+
+    def test_rolled_back_changes_leave_the_marks(self):
+        before = self.mark(Country)
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                Country.objects.create(country='KE')
+                raise ValueError
+        self.assertEqual(self.mark(Country), before)
+        Country.objects.create(country='UG')
+        self.assertNotEqual(self.mark(Country), before)
+
+    def test_marks_move_after_a_rolled_back_savepoint(self):
+        before = self.mark(Country)
+        with transaction.atomic():
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    Country.objects.create(country='KE')
+                    raise ValueError
+            Country.objects.create(country='UG')
+        self.assertNotEqual(self.mark(Country), before)
+
+    def test_marks_move_after_a_rolled_back_transaction(self):
+        before = self.mark(Country)
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                Country.objects.create(country='KE')
+                raise ValueError
+        with transaction.atomic():
+            Country.objects.create(country='UG')
+        self.assertNotEqual(self.mark(Country), before)
+
+
+class ChangeLogTests(TestCase):
+    def create_person(self, username):
+        return Person.objects.create(
+            username=username,
+            first_name='First',
+            last_name='Last',
+            home_program='Biosciences',
+            email='{0}@example.org'.format(username)
+        )
+
+    def replay(self, table):
+        rows = {}
+        for change in changelog.since(0, limit=changelog.MAX_LIMIT):
+            if change.table != table:
+                continue
+            if change.action == Change.DELETE:
+                rows.pop(change.object_id, None)
+            else:
+                rows[change.object_id] = json.loads(change.data)
+        return rows
+
+    def current(self, model):
+        columns = [field.attname for field in model._meta.concrete_fields]
+        return {
+            row['id']: json.loads(json.dumps(row, cls=DjangoJSONEncoder))
+            for row in model.objects.values(*columns)
+        }
+
+    def test_saves_and_deletes_are_recorded(self):
+        person = self.create_person('jdoe')
+        person.first_name = 'Jane'
+        person.save()
+        pk = person.pk
+        person.delete()
+        changes = Change.objects.filter(table='livegene.person')
+        self.assertEqual(
+            list(changes.values_list('object_id', 'action')),
+            [(pk, Change.INSERT), (pk, Change.UPDATE), (pk, Change.DELETE)]
+        )
+        self.assertEqual(json.loads(changes[1].data)['first_name'], 'Jane')
+        self.assertIsNone(changes[2].data)
+
+    def test_bulk_creates_and_updates_are_recorded(self):
+        project = create_project()
+        people = [self.create_person('user{0}'.format(i)) for i in range(3)]
+        roles = PersonRole.objects.bulk_create([
+            PersonRole(project=project, person=person, percent=10)
+            for person in people
+        ])
+        changelog.record(
+            PersonRole, [role.pk for role in roles], Change.UPDATE
+        )
+        self.assertEqual(
+            self.replay('livegene.personrole'), self.current(PersonRole)
+        )
+        self.assertEqual(Change.objects.filter(
+            table='livegene.personrole', action=Change.UPDATE
+        ).count(), 3)
+
+    def test_replaying_the_compacted_log_gives_the_current_rows(self):
+        people = [self.create_person('user{0}'.format(i)) for i in range(4)]
+        for i, person in enumerate(people):
+            for n in range(i):
+                person.last_name = 'Last {0}'.format(n)
+                person.save()
+        people[0].delete()
+        changelog.update(
+            Person.objects.filter(pk=people[1].pk), home_program='Feed'
+        )
+        self.assertEqual(
+            self.replay('livegene.person'), self.current(Person)
+        )
+        # Only the last entry of every row is left.
+        self.assertEqual(changelog.compact(datetime.timedelta(0)), 8)
+        self.assertEqual(
+            Change.objects.filter(table='livegene.person').count(), 4
+        )
+        self.assertEqual(
+            self.replay('livegene.person'), self.current(Person)
+        )
+
+    def test_recent_changes_are_held_back(self):
+        old = self.create_person('old')
+        Change.objects.update(
+            time=timezone.now() - datetime.timedelta(minutes=5)
+        )
+        self.create_person('new')
+        with override_settings(LIVEGENE_CHANGELOG_LAG=60):
+            self.assertEqual(
+                [change.object_id for change in changelog.since()], [old.pk]
+            )
+        with override_settings(LIVEGENE_CHANGELOG_LAG=0):
+            self.assertEqual(len(changelog.since()), 2)
+
+    def test_change_feed_pages_with_a_cursor(self):
+        for i in range(3):
+            self.create_person('user{0}'.format(i))
+        User.objects.create_superuser('admin', 'admin@example.org', 'pw')
+        self.client.login(username='admin', password='pw')
+        url = reverse('livegene:changes')
+        page = self.client.get(url, {
+            'limit': 2, 'tables': 'livegene.person'
+        }).json()
+        self.assertTrue(page['more'])
+        self.assertEqual(len(page['results']), 2)
+        rest = self.client.get(url, {
+            'cursor': page['cursor'], 'tables': 'livegene.person'
+        }).json()
+        self.assertFalse(rest['more'])
+        self.assertEqual(
+            [change['data']['username'] for change in
+             page['results'] + rest['results']],
+            ['user0', 'user1', 'user2']
+        )
+        self.assertEqual(
+            self.client.get(url, {'cursor': -1}).status_code, 400
+        )
+
+
+class ExtractionTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        project = create_project()
+        partnership = create_partnership()
+        self.activities = [
+            SamplingActivity.objects.create(
+                project=project,
+                partnership=partnership,
+                description='Sampling {0}'.format(i),
+                start_date=project.start_date,
+                end_date=project.end_date
+            )
+            for i in range(2)
+        ]
+        self.document_type = SamplingDocumentType.objects.create(
+            short_name='data', long_name='Data'
+        )
+
+    def create_document(self, activity, name, data, content_type):
+        return SamplingDocument.objects.create(
+            sampling_activity=activity,
+            document_type=self.document_type,
+            document=SimpleUploadedFile(name, data, content_type)
+        )
+
+    def extract_all(self):
+        for sha256, path, content_type in extraction.pending():
+            extraction.save(sha256, *extraction.extract(path, content_type))
+
+    def test_plain_text_is_decoded(self):
+        self.assertEqual(
+            extraction._plain(io.BytesIO('Kenyan Borán'.encode('utf-8'))),
+            'Kenyan Borán'
+        )
+        self.assertEqual(
+            extraction._plain(io.BytesIO('Kenyan Borán'.encode('latin-1'))),
+            'Kenyan Borán'
+        )
+        # Cut within the last character, which is dropped
+        with mock.patch.object(extraction, 'MAX_CHARS', 2):
+            self.assertEqual(
+                extraction._plain(io.BytesIO('Borááá'.encode('utf-8'))),
+                'Boráá'
+            )
+
+    def test_extract_csv(self):
+        document = self.create_document(
+            self.activities[0], 'herd.csv', b'breed,count\nBoran,12\n',
+            'text/csv'
+        )
+        self.assertEqual(
+            extraction.extract(document.document.path, 'text/csv'),
+            ('breed,count\nBoran,12\n', '')
+        )
+        text, error = extraction.extract(
+            document.document.path, 'application/zip'
+        )
+        self.assertEqual(text, '')
+        self.assertTrue(error)
+
+    def test_pending_and_prune(self):
+        data = b'breed,count\nBoran,12\n'
+        first = self.create_document(
+            self.activities[0], 'herd.csv', data, 'text/csv'
+        )
+        self.create_document(self.activities[1], 'herd.csv', data, 'text/csv')
+        notes = self.create_document(
+            self.activities[1], 'notes.txt', b'Sahiwal', 'text/plain'
+        )
+        self.assertEqual(
+            [sha256 for sha256, path, content_type in extraction.pending()],
+            [first.sha256, notes.sha256]
+        )
+        self.extract_all()
+        self.assertEqual(extraction.pending(), [])
+        self.assertEqual(len(extraction.pending(everything=True)), 2)
+        notes.delete()
+        self.assertEqual(extraction.prune(), 1)
+        self.assertEqual(
+            list(DocumentText.objects.values_list('sha256', flat=True)),
+            [first.sha256]
+        )
+
+    def test_search_contents(self):
+        data = b'breed,count\nBoran,12\n'
+        first = self.create_document(
+            self.activities[0], 'herd.csv', data, 'text/csv'
+        )
+        second = self.create_document(
+            self.activities[1], 'cattle.csv', data, 'text/csv'
+        )
+        self.create_document(
+            self.activities[1], 'notes.txt', b'Sahiwal', 'text/plain'
+        )
+        self.assertEqual(search.document_results('boran'), [])
+        self.extract_all()
+        results = search.document_results('boran')
+        self.assertEqual(
+            sorted(result['id'] for result in results),
+            [first.pk, second.pk]
+        )
+        result = [result for result in results if result['id'] == first.pk][0]
+        self.assertEqual(result['filename'], 'herd.csv')
+        self.assertEqual(result['document_type'], 'data')
+        self.assertEqual(
+            result['sampling_activity']['id'], self.activities[0].pk
+        )
+        self.assertEqual(
+            result['url'],
+            reverse('livegene:document-download', args=[first.pk])
+        )
+        within = search.document_results(
+            'boran',
+            SamplingDocument.objects.filter(
+                sampling_activity=self.activities[1]
+            )
+        )
+        self.assertEqual([result['id'] for result in within], [second.pk])
+
+    def test_contents_read_once_per_digest(self):
+        data = b'breed,count\nBoran,12\n'
+        for activity in self.activities:
+            self.create_document(activity, 'herd.csv', data, 'text/csv')
+        self.extract_all()
+        documents = list(SamplingDocument.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            SamplingDocument.with_contents(documents)
+            self.assertEqual(
+                [document.contents for document in documents],
+                ['breed,count\nBoran,12\n'] * 2
+            )
+        self.assertEqual(len(queries), 1)
+        with CaptureQueriesContext(connection) as queries:
+            search.backend().rebuild([SamplingDocument])
+        self.assertEqual(
+            len([query for query in queries
+                 if 'livegene_documenttext' in query['sql']]),
+            1
+        )
+        self.assertEqual(len(search.document_results('boran')), 2)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.org', 'pw')
+        self.client.login(username='admin', password='pw')
+
+    def create_person(self, username, last_name):
+        return Person.objects.create(
+            username=username,
+            first_name=username.capitalize(),
+            last_name=last_name,
+            home_program='Biosciences',
+            email='{0}@example.org'.format(username)
+        )
+
+    def test_pages_with_a_cursor(self):
+        # Equal last names are ordered by first name, then by id
+        for username, last_name in [('ann', 'Doe'), ('bob', 'Doe'),
+                                    ('cid', 'Abe'), ('dan', 'Zoe'),
+                                    ('eve', 'Doe')]:
+            self.create_person(username, last_name)
+        url = reverse('livegene:api-people')
+        seen = []
+        page = self.client.get(url, {'limit': 2, 'fields': 'username'}).json()
+        while True:
+            self.assertLessEqual(len(page['results']), 2)
+            seen += [person['username'] for person in page['results']]
+            if not page['next']:
+                break
+            self.assertIn('fields=username', page['next'])
+            page = self.client.get(page['next']).json()
+        self.assertEqual(seen, ['cid', 'ann', 'bob', 'eve', 'dan'])
+        self.assertEqual(
+            self.client.get(url, {'cursor': 'bad'}).status_code, 400
+        )
+        self.assertEqual(
+            self.client.get(url, {'limit': 0}).status_code, 400
+        )
+
+    def test_fields_and_expand(self):
+        project = create_project()
+        person = self.create_person('ann', 'Doe')
+        role = PersonRole.objects.create(
+            project=project, person=person, percent=40
+        )
+        url = reverse('livegene:api-projects')
+        result, = self.client.get(url, {
+            'fields': 'ilri_code,',
+            'expand': 'principal_investigator,person_roles'
+        }).json()['results']
+        self.assertEqual(set(result), {
+            'id', 'ilri_code', 'principal_investigator', 'person_roles'
+        })
+        self.assertEqual(
+            result['principal_investigator']['username'], 'jdoe'
+        )
+        # The back-reference is returned when it is one of the fields
+        self.assertEqual(result['person_roles'], [{
+            'id': role.pk, 'project': project.pk, 'person': person.pk,
+            'percent': 40
+        }])
+        result, = self.client.get(url, {
+            'fields': '', 'expand': 'person_roles'
+        }).json()['results']
+        self.assertEqual(set(result), {'id', 'person_roles'})
+        for name in ['fields', 'expand']:
+            response = self.client.get(url, {name: 'ilri_code,nope'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('nope', response.json()['error'])
+
+    def test_expand_one_to_many_without_back_reference(self):
+        project = create_project()
+        people = [self.create_person(name, 'Doe') for name in ['ann', 'bob']]
+        for percent, person in zip([30, 70], people):
+            PersonRole.objects.create(
+                project=project, person=person, percent=percent
+            )
+        resource = api.ProjectResource(fields=[], expand=['person_roles'])
+        with mock.patch.object(api.PersonRoleResource, 'fields', ('percent',)):
+            result, = resource.page()['results']
+        self.assertEqual(
+            sorted(role['percent'] for role in result['person_roles']),
+            [30, 70]
+        )
+        self.assertTrue(all(
+            set(role) == {'id', 'percent'} for role in result['person_roles']
+        ))
+
+
+class DownloadTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        project = create_project()
+        self.data = bytes(range(256)) * 4
+        self.document = SamplingDocument.objects.create(
+            sampling_activity=SamplingActivity.objects.create(
+                project=project,
+                partnership=create_partnership(),
+                description='Sampling',
+                start_date=project.start_date,
+                end_date=project.end_date
+            ),
+            document_type=SamplingDocumentType.objects.create(
+                short_name='data', long_name='Data'
+            ),
+            document=SimpleUploadedFile(
+                'herd.bin', self.data, 'application/octet-stream'
+            )
+        )
+        self.url = reverse('livegene:document-download', args=[
+            self.document.pk
+        ])
+        self.etag = '"{0}"'.format(self.document.sha256)
+        User.objects.create_superuser('admin', 'admin@example.org', 'pw')
+        self.client.login(username='admin', password='pw')
+
+    def get(self, method='get', **headers):
+        response = getattr(self.client, method)(self.url, **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), self.data)
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(
+            response['Content-Disposition'], 'attachment; filename="herd.bin"'
+        )
+
+    def test_ranges(self):
+        for header, first, last in [('bytes=0-', 0, 1023),
+                                    ('bytes=10-19', 10, 19),
+                                    ('bytes=1000-2000', 1000, 1023),
+                                    ('bytes=-24', 1000, 1023),
+                                    ('bytes=-5000', 0, 1023)]:
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(
+                response['Content-Range'],
+                'bytes {0}-{1}/1024'.format(first, last)
+            )
+            self.assertEqual(
+                response['Content-Length'], str(last - first + 1)
+            )
+            self.assertEqual(response.getvalue(), self.data[first:last + 1])
+
+    def test_unsatisfiable_range(self):
+        for header in ['bytes=1024-', 'bytes=-0']:
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_ignored_ranges(self):
+        for header in ['bytes=0-1,5-6', 'bytes=5-1', 'lines=1-2']:
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(response.getvalue(), self.data)
+
+    def test_conditional_requests(self):
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=self.etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.getvalue(), self.data[:10])
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), self.data)
+        response = self.get(HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.getvalue(), b'')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code,
+                         200)
+
+    def test_head(self):
+        response = self.get('head', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response.getvalue(), b'')
+        self.assertEqual(self.get('post').status_code, 405)
+
+    def test_sendfile(self):
+        name = self.document.document.name
+        with override_settings(LIVEGENE_DOCUMENT_SENDFILE='x-accel-redirect'):
+            response = self.get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + name)
+        self.assertEqual(response.getvalue(), b'')
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(
+            response['Content-Type'], 'application/octet-stream'
+        )
+        with override_settings(LIVEGENE_DOCUMENT_SENDFILE='x-sendfile'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], self.document.document.path)
+        self.assertFalse(response.has_header('X-Accel-Redirect'))
+
+    def test_search_only_answers_safe_methods(self):
+        url = reverse('livegene:document-search')
+        self.assertEqual(self.client.get(url, {'q': 'herd'}).status_code, 200)
+        self.assertEqual(self.client.post(url, {'q': 'herd'}).status_code, 405)
+
+
+class StorageTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        project = create_project()
+        self.activity = SamplingActivity.objects.create(
+            project=project,
+            partnership=create_partnership(),
+            description='Sampling',
+            start_date=project.start_date,
+            end_date=project.end_date
+        )
+        self.document_type = SamplingDocumentType.objects.create(
+            short_name='data', long_name='Data'
+        )
+
+    def create_document(self, name, data):
+        return SamplingDocument.objects.create(
+            sampling_activity=self.activity,
+            document_type=self.document_type,
+            document=SimpleUploadedFile(name, data)
+        )
+
+    def test_metadata(self):
+        data = b'breed,count\nBoran,12\n'
+        document = self.create_document('herd.csv', data)
+        digest = hashlib.sha256(data).hexdigest()
+        self.assertEqual(document.filename, 'herd.csv')
+        self.assertEqual(document.content_type, 'text/csv')
+        self.assertEqual(document.sha256, digest)
+        self.assertEqual(document.size, len(data))
+        self.assertEqual(
+            document.document.name, 'documents/{0}/{1}'.format(
+                digest[:2], digest
+            )
+        )
+        document.refresh_from_db()
+        self.assertEqual(document.sha256, digest)
+        with document.document.open('rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def test_same_content_is_stored_once(self):
+        data = os.urandom(1000)
+        first = self.create_document('a.bin', data)
+        second = self.create_document('b.bin', data)
+        self.assertEqual(first.document.name, second.document.name)
+        self.assertEqual(
+            (first.sha256, first.size), (second.sha256, second.size)
+        )
+        self.assertEqual(
+            [name for name, size, modified in
+             first.document.storage.blobs()],
+            [first.document.name]
+        )
+        self.assertEqual(second.filename, 'b.bin')
+
+    def test_collect_keeps_referenced_and_recent_blobs(self):
+        kept = self.create_document('kept.bin', b'kept').document
+        dropped = self.create_document('dropped.bin', b'dropped').document
+        store = kept.storage
+        # Just saved, the unreferenced blob is within the grace period.
+        self.assertEqual(storage.collect(store, [kept.name]), (0, 0))
+        old = time.time() - storage.GRACE_PERIOD - 60
+        for name in [kept.name, dropped.name]:
+            os.utime(store.path(name), (old, old))
+        self.assertEqual(
+            storage.collect(store, [kept.name], dry_run=True), (1, 7)
+        )
+        self.assertTrue(store.exists(dropped.name))
+        self.assertEqual(storage.collect(store, [kept.name]), (1, 7))
+        self.assertFalse(store.exists(dropped.name))
+        self.assertFalse(
+            os.path.exists(os.path.dirname(store.path(dropped.name)))
+        )
+        self.assertTrue(store.exists(kept.name))
+
+
+class WorkloadTests(TestCase):
+    def stored(self):
+        return {
+            person: (start, np.frombuffer(months).tolist(), peak)
+            for person, start, months, peak in
+            PersonWorkload.objects.values_list(
+                'person', 'start', 'months', 'peak'
+            )
+        }
+
+    def test_compute_matches_the_frozen_computation(self):
+        rng = random.Random(0)
+        people = [
+            Person.objects.create(
+                username='user{0}'.format(i),
+                first_name='First',
+                last_name='Last',
+                home_program='Biosciences',
+                email='user{0}@example.org'.format(i)
+            )
+            for i in range(20)
+        ]
+        projects = []
+        for i in range(60):
+            start = datetime.date(2015, 1, 1) + datetime.timedelta(
+                days=rng.randrange(2000)
+            )
+            # Single-month, leap-year, multi-year and reversed dates
+            end = start + datetime.timedelta(
+                days=rng.choice([0, 5, 40, 400, 1500, -10])
+            )
+            projects.append(Project.objects.create(
+                ilri_code='P{0}'.format(i),
+                full_name='Project {0}'.format(i),
+                principal_investigator=people[0],
+                projects_group='Genetics',
+                start_date=start,
+                end_date=end,
+                status=0,
+                capacity_development=0
+            ))
+        PersonRole.objects.bulk_create(
+            PersonRole(
+                project=project, person=person, percent=rng.randrange(101)
+            )
+            for person in people
+            for project in rng.sample(projects, rng.randrange(8))
+        )
+        workload.rebuild()
+        computed = self.stored()
+        PersonWorkload.objects.all().delete()
+        import_module(
+            'livegene.apps.livegene.migrations.0024_person_workload'
+        ).populate(apps, None)
+        expected = self.stored()
+        self.assertEqual(set(computed), set(expected))
+        for person, (start, months, peak) in expected.items():
+            self.assertEqual(computed[person][0], start)
+            np.testing.assert_allclose(
+                computed[person][1], months, rtol=0, atol=1e-6
+            )
+            self.assertAlmostEqual(computed[person][2], peak, places=6)
+
+
+class PortfolioTests(TestCase):
+    def rollup(self, roles, field, figures, labels):
+        # Plain Python sum of the weighted figures of every role
+        rows = {}
+        for project, key, percent in roles:
+            row = rows.setdefault(key, {
+                field: key, 'name': labels[key], 'projects': 0,
+                'budget': 0, 'spend': 0, 'fte': 0
+            })
+            row['projects'] += 1
+            for name in portfolio.FIGURES:
+                row[name] += percent / 100 * figures[project][name]
+        return [rows[key] for key in sorted(rows)]
+
+    def assertRollupEqual(self, results, expected):
+        self.assertEqual(
+            [(row['name'], row['projects']) for row in results],
+            [(row['name'], row['projects']) for row in expected]
+        )
+        for result, row in zip(results, expected):
+            for name in portfolio.FIGURES:
+                self.assertAlmostEqual(result[name], row[name], delta=0.01)
+
+    def test_rollups_match_plain_sums(self):
+        rng = random.Random(0)
+        person = Person.objects.create(
+            username='jdoe',
+            first_name='Jane',
+            last_name='Doe',
+            home_program='Biosciences',
+            email='jdoe@example.org'
+        )
+        people = [person] + [
+            Person.objects.create(
+                username='user{0}'.format(i),
+                first_name='First',
+                last_name='Last',
+                home_program='Biosciences',
+                email='user{0}@example.org'.format(i)
+            )
+            for i in range(5)
+        ]
+        country_list = [
+            Country.objects.create(country=code)
+            for code in ['KE', 'UG', 'TZ', 'ET', 'NG']
+        ]
+        sdgs = [
+            SDG.objects.create(
+                headline='Goal {0}'.format(i),
+                full_name='Goal {0}'.format(i),
+                color='#00ff00',
+                link='https://example.org/sdg/{0}'.format(i),
+                logo_url='https://example.org/sdg/{0}.png'.format(i)
+            )
+            for i in range(4)
+        ]
+        figures = {}
+        country_roles = []
+        sdg_roles = []
+        for i in range(25):
+            project = Project.objects.create(
+                ilri_code='P{0}'.format(i),
+                full_name='Project {0}'.format(i),
+                principal_investigator=person,
+                projects_group='Genetics',
+                start_date=datetime.date(2018, 1, 1),
+                end_date=datetime.date(2020, 12, 31),
+                status=0,
+                capacity_development=0
+            )
+            snapshots = [
+                (days_ago, rng.choice([None, rng.randrange(10 ** 6)]),
+                 rng.randrange(10 ** 6))
+                for days_ago in rng.sample(range(100), rng.randrange(3))
+            ]
+            for days_ago, budget, spend in snapshots:
+                Expenditure.objects.create(
+                    ilri_code=project.ilri_code,
+                    name=project.full_name,
+                    home_program='Biosciences',
+                    start_date=project.start_date,
+                    report_date=timezone.now() - datetime.timedelta(
+                        days=days_ago
+                    ),
+                    total_budget=budget,
+                    amount=spend,
+                    project=project
+                )
+            # Only the latest snapshot counts.
+            days_ago, budget, spend = min(snapshots or [(0, 0, 0)])
+            fte = 0
+            for member in rng.sample(people, rng.randrange(3)):
+                percent = rng.randrange(101)
+                PersonRole.objects.create(
+                    project=project, person=member, percent=percent
+                )
+                fte += percent / 100
+            figures[project.pk] = {
+                'budget': budget or 0, 'spend': spend, 'fte': fte
+            }
+            for country in rng.sample(country_list, rng.randrange(3)):
+                percent = rng.randrange(101)
+                CountryRole.objects.create(
+                    project=project, country=country, percent=percent
+                )
+                country_roles.append((project.pk, country.pk, percent))
+            for sdg in rng.sample(sdgs, rng.randrange(3)):
+                percent = rng.randrange(101)
+                SDGRole.objects.create(
+                    project=project, sdg=sdg, percent=percent
+                )
+                sdg_roles.append((project.pk, sdg.pk, percent))
+        self.assertRollupEqual(portfolio.by_country(), self.rollup(
+            country_roles, 'country', figures, {
+                country.pk: countries.name(country.country)
+                for country in country_list
+            }
+        ))
+        self.assertRollupEqual(portfolio.by_sdg(), self.rollup(
+            sdg_roles, 'sdg', figures, {sdg.pk: sdg.headline for sdg in sdgs}
+        ))
@@ -0,0 +1,177 @@
+"""
+Change tracking of the livegene and finance tables.
+
+Every change to a tracked table goes through `touch()`, which moves
+the table's high-water mark in `TableChange`, once per transaction
+when it commits, and invalidates the cached responses built from it.
+Saves, deletes and many-to-many changes are recorded by signals; bulk
+operations, which send none, call `touch()` themselves. The marks
+answer conditional requests without rendering anything.
+"""
+import hashlib
+import threading
+import weakref
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save
+)
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from . import caching, reference
+from .models import TableChange
+
+
+TRACKED_APPS = ('livegene', 'finance')
+# Derived tables are touched explicitly when they are refreshed, which
+# keeps their bulk deletes free of per-row signals. Uploads in progress
+# are not part of the data.
+UNTRACKED_MODELS = (
+    'livegene.tablechange',
+    'livegene.change',
+    'livegene.documentupload',
+    'livegene.documenttext',
+    'livegene.logo',
+    'livegene.personallocation',
+    'livegene.projectallocation',
+    'livegene.personworkload',
+    'finance.latestexpenditure',
+)
+
+
+# The marks of the transaction in progress on each connection of the
+# thread, by alias. Only its commit hook holds them, so they are gone
+# with the hook when their transaction or savepoint is rolled back.
+_pending = threading.local()
+
+
+class _Marks:
+    """
+    The models touched in the current transaction, whose high-water
+    marks are moved once it commits.
+    """
+    def __init__(self):
+        self.models = set()
+
+    def __call__(self):
+        _move(self.models)
+        # The second bump discards the responses other processes built
+        # from the data read before the commit.
+        _invalidate(self.models)
+
+
+def _invalidate(models):
+    caching.invalidate(*models)
+    reference.forget(*models)
+
+
+def _move(models):
+    now = timezone.now()
+    for label in {model._meta.label_lower for model in models}:
+        if not TableChange.objects.filter(table=label).update(modified=now):
+            TableChange.objects.get_or_create(
+                table=label, defaults={'modified': now}
+            )
+
+
+def touch(*models):
+    """
+    Record a change to the tables of `models`. The cached responses
+    built from them are invalidated at once and again on commit; the
+    marks of all the tables touched by a transaction are moved once,
+    when it commits.
+    """
+    _invalidate(models)
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _move(models)
+        return
+    if not hasattr(_pending, 'marks'):
+        _pending.marks = weakref.WeakValueDictionary()
+    marks = _pending.marks.get(connection.alias)
+    if marks is None:
+        marks = _pending.marks[connection.alias] = _Marks()
+        transaction.on_commit(marks)
+    marks.models.update(models)
+
+
+def high_water_marks(models):
+    """
+    Return a {table: last change} dictionary for `models`, leaving out
+    tables that have not changed since tracking started.
+    """
+    return dict(
+        TableChange.objects.filter(
+            table__in={model._meta.label_lower for model in models}
+        ).values_list('table', 'modified')
+    )
+
+
+def last_modified(models):
+    return TableChange.objects.filter(
+        table__in={model._meta.label_lower for model in models}
+    ).aggregate(modified=Max('modified'))['modified']
+
+
+def _stamp(sender, instance, raw, **kwargs):
+    # Raw saves (fixtures) skip `auto_now`.
+    if raw and getattr(instance, 'modified', False) is None:
+        instance.modified = timezone.now()
+
+
+def _changed(sender, **kwargs):
+    touch(sender)
+
+
+def _m2m_changed(sender, instance, model, action, **kwargs):
+    if action.startswith('post_'):
+        touch(sender, type(instance), model)
+
+
+def tracked_models():
+    for label in TRACKED_APPS:
+        for model in apps.get_app_config(label).get_models(
+            include_auto_created=True
+        ):
+            if model._meta.label_lower not in UNTRACKED_MODELS:
+                yield model
+
+
+def connect():
+    for model in tracked_models():
+        pre_save.connect(_stamp, sender=model)
+        post_save.connect(_changed, sender=model)
+        post_delete.connect(_changed, sender=model)
+    m2m_changed.connect(_m2m_changed)
+
+
+def conditional_view(models):
+    """
+    Answer If-None-Match and If-Modified-Since from the high-water
+    marks of `models`, which is either a sequence of models or a
+    function of the view keyword arguments returning one.
+    """
+    def marks(request, **kwargs):
+        if not hasattr(request, '_high_water_marks'):
+            dependencies = models(**kwargs) if callable(models) else models
+            request._high_water_marks = high_water_marks(dependencies)
+        return request._high_water_marks
+
+    def etag(request, *args, **kwargs):
+        values = marks(request, **kwargs)
+        if not values:
+            return None
+        parts = [request.get_full_path(), sorted(values.items())]
+        return hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def modified(request, *args, **kwargs):
+        values = marks(request, **kwargs)
+        return max(values.values()) if values else None
+
+    return condition(etag_func=etag, last_modified_func=modified)
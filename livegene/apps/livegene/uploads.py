@@ -0,0 +1,239 @@
+"""
+Resumable, chunked uploads of sampling documents.
+
+A client starts an upload with a POST giving the sampling activity, the
+document type, the file name, its size and optionally its SHA-256
+digest, and gets back a token. It then sends the content in any number
+of PATCH requests, each carrying the offset of its first byte in an
+`Upload-Offset` header; after an interruption, a GET tells it the offset
+to resume from. Chunks are read from the request in small blocks into a
+file of their own and appended to a temporary file next to the document
+store once the request has claimed their offset, so memory use does not
+depend on the size of the chunks or of the file.
+
+Once the last byte has arrived the file is hashed and moved into the
+store without being copied, and the document is created. Uploads left
+unfinished are removed by `expire()`.
+"""
+import datetime
+import os
+import shutil
+import tempfile
+import time
+
+from django import forms
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from . import storage
+from .models import DocumentUpload, SamplingDocument
+
+
+DIRECTORY = 'uploads'
+CHUNK_SIZE = 64 * 1024
+EXPIRY = datetime.timedelta(days=7)
+
+
+class UploadForm(forms.ModelForm):
+    class Meta:
+        model = DocumentUpload
+        fields = ('sampling_activity', 'document_type', 'filename', 'size',
+                  'sha256')
+
+    def clean_size(self):
+        size = self.cleaned_data['size']
+        if size < 0:
+            raise forms.ValidationError('The size cannot be negative.')
+        return size
+
+    def clean_sha256(self):
+        return self.cleaned_data['sha256'].lower()
+
+
+def _storage():
+    return SamplingDocument._meta.get_field('document').storage
+
+
+def part_path(token):
+    return _storage().path('{0}/{1}.part'.format(DIRECTORY, token))
+
+
+def status(upload, document=None):
+    response = JsonResponse({
+        'token': upload.token,
+        'offset': upload.received,
+        'size': upload.size,
+        'document': document.pk if document else None,
+    }, status=201 if document else 200)
+    response['Upload-Offset'] = upload.received
+    return response
+
+
+def _error(message, status=400, **data):
+    return JsonResponse(dict(data, error=message), status=status)
+
+
+def create(request):
+    form = UploadForm(request.POST)
+    if not form.is_valid():
+        return _error('Invalid upload', errors=form.errors.get_json_data())
+    upload = form.save(commit=False)
+    upload.user = request.user
+    upload.save()
+    path = part_path(upload.token)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    if upload.size == 0:
+        return finish(upload)
+    response = status(upload)
+    response.status_code = 201
+    return response
+
+
+def _receive(request, upload, length):
+    # Read the chunk into a file of its own, so that concurrent requests
+    # never write to the upload before one of them has claimed it.
+    fd, path = tempfile.mkstemp(
+        dir=os.path.dirname(part_path(upload.token)),
+        prefix=upload.token + '.',
+        suffix='.chunk'
+    )
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while written < length:
+                chunk = request.read(min(CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                f.write(chunk)
+                written += len(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, written
+
+
+def _splice(upload, path, offset):
+    with open(part_path(upload.token), 'r+b') as f, open(path, 'rb') as chunk:
+        # Drop whatever an interrupted request wrote after the offset.
+        f.truncate(offset)
+        f.seek(offset)
+        shutil.copyfileobj(chunk, f, CHUNK_SIZE)
+
+
+def _conflict(upload):
+    upload.refresh_from_db()
+    return _error(
+        'The upload continues at offset {0}'.format(upload.received),
+        status=409,
+        offset=upload.received
+    )
+
+
+def _lost(upload):
+    upload.delete()
+    remove_part(upload.token)
+    return _error(
+        'The received data of the upload is lost; it has been discarded',
+        status=410
+    )
+
+
+def append(request, upload):
+    """
+    Append the body of `request` to `upload` at the offset given by its
+    `Upload-Offset` header, finishing the upload with the last chunk.
+    """
+    try:
+        offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+        length = int(request.META['CONTENT_LENGTH'])
+    except (KeyError, ValueError):
+        return _error('Upload-Offset and Content-Length are required')
+    if offset != upload.received:
+        return _conflict(upload)
+    if length < 0 or offset + length > upload.size:
+        return _error('The chunk goes past the end of the file')
+    if not os.path.exists(part_path(upload.token)):
+        return _lost(upload)
+    path, written = _receive(request, upload, length)
+    try:
+        with transaction.atomic():
+            # Only one of concurrent requests sending the same chunk
+            # moves the offset; the others wait for it to commit and
+            # then find the offset taken.
+            if not DocumentUpload.objects.filter(
+                    pk=upload.pk, received=offset
+            ).update(received=offset + written, modified=timezone.now()):
+                return _conflict(upload)
+            _splice(upload, path, offset)
+    except FileNotFoundError:
+        return _lost(upload)
+    finally:
+        os.remove(path)
+    upload.received = offset + written
+    if upload.received == upload.size:
+        return finish(upload)
+    return status(upload)
+
+
+def finish(upload):
+    """
+    Store the complete file of `upload` and create its document.
+    """
+    name = _storage().adopt(part_path(upload.token))
+    digest = storage.ContentAddressedStorage.digest(name)
+    if upload.sha256 and upload.sha256 != digest:
+        # The stored blob is left to `collect()`.
+        upload.delete()
+        return _error(
+            'The SHA-256 digest of the received file is {0}; the upload '
+            'has been discarded'.format(digest),
+            status=422
+        )
+    with transaction.atomic():
+        document = SamplingDocument.objects.create(
+            sampling_activity=upload.sampling_activity,
+            document_type=upload.document_type,
+            document=name,
+            filename=upload.filename,
+            content_type=storage.content_type(upload.filename)
+        )
+        upload.delete()
+    return status(upload, document)
+
+
+def abort(upload):
+    upload.delete()
+    remove_part(upload.token)
+    return HttpResponse(status=204)
+
+
+def remove_part(token):
+    path = part_path(token)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def expire(age=EXPIRY, grace=storage.GRACE_PERIOD):
+    """
+    Delete the uploads not continued for `age` and the temporary files
+    no upload refers to, and return the number of deleted uploads.
+    """
+    stale = DocumentUpload.objects.filter(modified__lt=timezone.now() - age)
+    tokens = list(stale.values_list('token', flat=True))
+    stale.delete()
+    for token in tokens:
+        remove_part(token)
+    directory = _storage().path(DIRECTORY)
+    if os.path.isdir(directory):
+        current = set(DocumentUpload.objects.values_list('token', flat=True))
+        horizon = time.time() - grace
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            # <token>.part, or <token>.<random>.chunk while a chunk is
+            # being received
+            token = filename.split('.', 1)[0]
+            if token not in current and os.path.getmtime(path) < horizon:
+                os.remove(path)
+    return len(tokens)
@@ -0,0 +1,65 @@
+from django.urls import path
+
+from . import api, views
+
+app_name = 'livegene'
+urlpatterns = [
+    path(
+        'portfolio/summary/',
+        views.portfolio_summary,
+        name='portfolio-summary'
+    ),
+    path(
+        'portfolio/countries/',
+        views.portfolio_by_country,
+        name='portfolio-countries'
+    ),
+    path('portfolio/sdgs/', views.portfolio_by_sdg, name='portfolio-sdgs'),
+    path(
+        'portfolio/export.csv',
+        views.portfolio_export,
+        name='portfolio-export'
+    ),
+    path('workload/', views.workload_heatmap, name='workload'),
+    path('changes/', views.changes, name='changes'),
+    path('search/', views.search_view, name='search'),
+    path(
+        'documents/<int:pk>/download/',
+        views.document_download,
+        name='document-download'
+    ),
+    path(
+        'documents/search/',
+        views.document_search,
+        name='document-search'
+    ),
+    path('logos/<str:name>', views.logo_file, name='logo'),
+    path('documents/uploads/', views.upload_create, name='upload-create'),
+    path(
+        'documents/uploads/<str:token>/',
+        views.upload_detail,
+        name='upload-detail'
+    ),
+]
+
+API_RESOURCES = (
+    ('projects', api.ProjectResource),
+    ('people', api.PersonResource),
+    ('organisations', api.OrganisationResource),
+    ('partnerships', api.PartnershipResource),
+    ('partnership-roles', api.PartnershipRoleResource),
+    ('person-roles', api.PersonRoleResource),
+    ('country-roles', api.CountryRoleResource),
+    ('sdg-roles', api.SDGRoleResource),
+    ('sampling-activities', api.SamplingActivityResource),
+)
+
+urlpatterns += [
+    path(
+        'api/{0}/'.format(name),
+        views.api_list,
+        {'resource': resource},
+        name='api-{0}'.format(name)
+    )
+    for name, resource in API_RESOURCES
+]
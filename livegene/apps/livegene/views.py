@@ -1,3 +1,227 @@
-from django.shortcuts import render
+import datetime
+import re
 
-# Create your views here.
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import permission_required
+from django.core.files.storage import default_storage
+from django.http import (
+    FileResponse,
+    Http404,
+    JsonResponse,
+    StreamingHttpResponse
+)
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import (
+    require_http_methods,
+    require_POST,
+    require_safe
+)
+
+from livegene.apps.finance.models import Expenditure, LatestExpenditure
+
+from . import (
+    api,
+    changelog,
+    downloads,
+    export,
+    logos,
+    portfolio,
+    search,
+    uploads,
+    workload
+)
+from .caching import cached_view
+from .models import (
+    Country,
+    CountryRole,
+    DocumentUpload,
+    Organisation,
+    Partnership,
+    PartnershipRole,
+    PartnershipRoleType,
+    Person,
+    PersonRole,
+    PersonWorkload,
+    Project,
+    SamplingDocument,
+    SDG,
+    SDGRole
+)
+from .tracking import conditional_view
+
+
+LOGO_NAME_RE = re.compile(r'^[0-9a-f]{20}\.(png|webp)$')
+PORTFOLIO_MODELS = (Project, PersonRole, Expenditure, LatestExpenditure)
+EXPORT_MODELS = PORTFOLIO_MODELS + (
+    Person,
+    Country,
+    CountryRole,
+    SDG,
+    SDGRole,
+    Organisation,
+    Partnership,
+    PartnershipRole,
+    PartnershipRoleType,
+)
+
+
+@staff_member_required
+@conditional_view(PORTFOLIO_MODELS)
+@cached_view('portfolio-summary', PORTFOLIO_MODELS)
+def portfolio_summary(request):
+    return JsonResponse(portfolio.summary())
+
+
+@staff_member_required
+@conditional_view(PORTFOLIO_MODELS + (Country, CountryRole))
+@cached_view(
+    'portfolio-countries',
+    PORTFOLIO_MODELS + (Country, CountryRole)
+)
+def portfolio_by_country(request):
+    return JsonResponse({'countries': portfolio.by_country()})
+
+
+@staff_member_required
+@conditional_view(PORTFOLIO_MODELS + (SDG, SDGRole))
+@cached_view('portfolio-sdgs', PORTFOLIO_MODELS + (SDG, SDGRole))
+def portfolio_by_sdg(request):
+    return JsonResponse({'sdgs': portfolio.by_sdg()})
+
+
+@staff_member_required
+@conditional_view(EXPORT_MODELS)
+def portfolio_export(request):
+    response = StreamingHttpResponse(
+        export.csv_lines(export.portfolio_rows()),
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = 'attachment; filename="portfolio.csv"'
+    return response
+
+
+@staff_member_required
+@conditional_view(lambda resource: resource.models())
+@cached_view('api', lambda resource: resource.models())
+def api_list(request, resource):
+    return api.resource_list(request, resource)
+
+
+@staff_member_required
+def changes(request):
+    return changelog.change_list(request)
+
+
+@staff_member_required
+@conditional_view((PersonWorkload, Person))
+@cached_view('workload', (PersonWorkload, Person))
+def workload_heatmap(request):
+    try:
+        start, end = (
+            datetime.datetime.strptime(request.GET[name], '%Y-%m').date()
+            if request.GET.get(name) else None
+            for name in ('start', 'end')
+        )
+    except ValueError:
+        return JsonResponse(
+            {'error': 'start and end must be months as YYYY-MM'},
+            status=400
+        )
+    return JsonResponse(workload.heatmap(start, end))
+
+
+@staff_member_required
+def search_view(request):
+    types = {model._meta.model_name: model for model in search.MODELS}
+    names = [name for name in request.GET.get('types', '').split(',') if name]
+    try:
+        limit = int(request.GET.get('limit', 20))
+        if not 0 < limit <= 100 or set(names) - set(types):
+            raise ValueError
+    except ValueError:
+        return JsonResponse(
+            {'error': 'types must be among {0} and limit between 1 and '
+                      '100'.format(', '.join(sorted(types)))},
+            status=400
+        )
+    return JsonResponse({'results': search.results(
+        request.GET.get('q', ''),
+        [types[name] for name in names] or None,
+        limit
+    )})
+
+
+@staff_member_required
+@permission_required('livegene.view_samplingdocument', raise_exception=True)
+@require_safe
+def document_download(request, pk):
+    document = get_object_or_404(SamplingDocument, pk=pk)
+    if not document.document or \
+            not document.document.storage.exists(document.document.name):
+        raise Http404('The document has no stored file.')
+    return downloads.serve(request, document)
+
+
+@staff_member_required
+@permission_required('livegene.add_samplingdocument', raise_exception=True)
+@require_POST
+def upload_create(request):
+    return uploads.create(request)
+
+
+@staff_member_required
+@permission_required('livegene.add_samplingdocument', raise_exception=True)
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+def upload_detail(request, token):
+    upload = get_object_or_404(DocumentUpload, token=token, user=request.user)
+    if request.method == 'PATCH':
+        return uploads.append(request, upload)
+    if request.method == 'DELETE':
+        return uploads.abort(upload)
+    return uploads.status(upload)
+
+
+@staff_member_required
+@permission_required('livegene.view_samplingdocument', raise_exception=True)
+@require_safe
+def document_search(request):
+    filters = {
+        'project': 'sampling_activity__project',
+        'activity': 'sampling_activity',
+        'type': 'document_type',
+    }
+    try:
+        limit = int(request.GET.get('limit', 20))
+        if not 0 < limit <= 100:
+            raise ValueError
+        documents = SamplingDocument.objects.filter(**{
+            name: int(request.GET[parameter])
+            for parameter, name in filters.items()
+            if request.GET.get(parameter)
+        })
+    except ValueError:
+        return JsonResponse(
+            {'error': 'project, activity and type must be ids and limit '
+                      'between 1 and 100'},
+            status=400
+        )
+    return JsonResponse({'results': search.document_results(
+        request.GET.get('q', ''), documents, limit
+    )})
+
+
+@require_safe
+def logo_file(request, name):
+    match = LOGO_NAME_RE.match(name)
+    path = '{0}/{1}'.format(logos.DIRECTORY, name)
+    if match is None or not default_storage.exists(path):
+        raise Http404('No such logo.')
+    response = FileResponse(
+        default_storage.open(path),
+        content_type='image/{0}'.format(match.group(1))
+    )
+    # The names change with the content.
+    response['Cache-Control'] = 'public, max-age={0}, immutable'.format(
+        logos.MAX_AGE
+    )
+    return response
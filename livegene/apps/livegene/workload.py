@@ -0,0 +1,181 @@
+"""
+Monthly FTE workload of every person.
+
+The person roles are loaded with the dates of their projects in one
+query and turned into a person x month matrix in a single vectorised
+pass: every role adds its FTE (percent / 100) from its first to its
+last month through a difference array summed along the months, and the
+partial first and last months are scaled by the share of their days
+the project runs. Each person's row is stored in `PersonWorkload`, so
+only the people whose roles or project dates changed are recomputed.
+"""
+import datetime
+
+import numpy as np
+from django.db import transaction
+
+from . import tracking
+from .models import Person, PersonRole, PersonWorkload
+
+
+BATCH_SIZE = 500
+ROLE_FIELDS = ('person', 'percent', 'project__start_date', 'project__end_date')
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+
+def _dates(dates):
+    # Much faster than letting NumPy convert the date objects.
+    days = np.fromiter(
+        (date.toordinal() for date in dates), np.int64, len(dates)
+    )
+    return (days - EPOCH).astype('datetime64[D]')
+
+
+def _days_in(months):
+    return (
+        (months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')
+    ).astype(np.int64)
+
+
+def compute(rows):
+    """
+    Return {person: (first month, FTE array)} for the given (person,
+    percent, start date, end date) role rows.
+    """
+    rows = [row for row in rows if row[2] <= row[3]]
+    if not rows:
+        return {}
+    person, percent, start, end = zip(*rows)
+    ids, p = np.unique(np.array(person, dtype=np.int64), return_inverse=True)
+    weight = np.array(percent, dtype=np.float64) / 100
+    start = _dates(start)
+    end = _dates(end)
+    first = start.astype('datetime64[M]')
+    last = end.astype('datetime64[M]')
+    origin = first.min()
+    s = (first - origin).astype(np.int64)
+    e = (last - origin).astype(np.int64)
+    size = e.max() + 1
+
+    # Flat (person, month) cell indices; the extra column takes the
+    # end markers of the last month.
+    width = size + 1
+    cells = len(ids) * width
+    diff = np.bincount(p * width + s, weights=weight, minlength=cells) - \
+        np.bincount(p * width + e + 1, weights=weight, minlength=cells)
+    matrix = np.cumsum(diff.reshape(len(ids), width), axis=1)
+
+    head = 1 - (start - first.astype('datetime64[D]')).astype(np.int64) \
+        / _days_in(first)
+    tail = ((end - last.astype('datetime64[D]')).astype(np.int64) + 1) \
+        / _days_in(last)
+    same = s == e
+    adjust = np.bincount(
+        p * width + s,
+        weights=weight * (np.where(same, head + tail - 1, head) - 1),
+        minlength=cells
+    ) + np.bincount(
+        p[~same] * width + e[~same],
+        weights=weight[~same] * (tail[~same] - 1),
+        minlength=cells
+    )
+    # Rounding drops the noise left by the cumulative sum.
+    matrix = np.round(
+        matrix[:, :size] + adjust.reshape(len(ids), width)[:, :size], 6
+    )
+
+    firsts = np.full(len(ids), size)
+    lasts = np.full(len(ids), -1)
+    np.minimum.at(firsts, p, s)
+    np.maximum.at(lasts, p, e)
+    return {
+        int(pk): (
+            (origin + firsts[i]).astype('datetime64[D]').item(),
+            matrix[i, firsts[i]:lasts[i] + 1]
+        )
+        for i, pk in enumerate(ids)
+    }
+
+
+def _workloads(rows):
+    for person, (start, months) in compute(rows).items():
+        yield PersonWorkload(
+            person_id=person,
+            start=start,
+            months=months.tobytes(),
+            peak=float(months.max())
+        )
+
+
+def refresh(ids):
+    with transaction.atomic():
+        ids = sorted(set(ids))
+        for i in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[i:i + BATCH_SIZE]
+            PersonWorkload.objects.filter(person__in=chunk).delete()
+            PersonWorkload.objects.bulk_create(_workloads(
+                PersonRole.objects.filter(person__in=chunk)
+                .values_list(*ROLE_FIELDS)
+            ))
+    tracking.touch(PersonWorkload)
+
+
+def rebuild():
+    with transaction.atomic():
+        PersonWorkload.objects.all().delete()
+        PersonWorkload.objects.bulk_create(
+            _workloads(PersonRole.objects.values_list(*ROLE_FIELDS)),
+            batch_size=BATCH_SIZE
+        )
+    tracking.touch(PersonWorkload)
+
+
+def _month(date):
+    return np.datetime64(date, 'M')
+
+
+def matrix(start=None, end=None):
+    """
+    Return the person ids, the first day of every month from `start`
+    to `end` (the whole stored range by default) and the person x month
+    FTE matrix, people ordered by name.
+    """
+    rows = list(
+        PersonWorkload.objects.order_by(
+            'person__last_name', 'person__first_name'
+        ).values_list('person', 'start', 'months')
+    )
+    if not rows:
+        return [], [], np.zeros((0, 0))
+    arrays = [np.frombuffer(months) for person, first, months in rows]
+    firsts = np.array([_month(first) for person, first, months in rows])
+    lasts = firsts + np.array([len(months) for months in arrays]) - 1
+    first = _month(start) if start else firsts.min()
+    last = _month(end) if end else lasts.max()
+    size = max(int((last - first).astype(np.int64)) + 1, 0)
+    result = np.zeros((len(rows), size))
+    for i, months in enumerate(arrays):
+        offset = int((firsts[i] - first).astype(np.int64))
+        lo = max(offset, 0)
+        hi = min(offset + len(months), size)
+        if lo < hi:
+            result[i, lo:hi] = months[lo - offset:hi - offset]
+    people = [row[0] for row in rows]
+    return people, [
+        (first + i).astype('datetime64[D]').item() for i in range(size)
+    ], result
+
+
+def heatmap(start=None, end=None):
+    people, months, values = matrix(start, end)
+    names = {
+        pk: '{0} {1}'.format(first_name, last_name)
+        for pk, first_name, last_name in Person.objects.filter(
+            workload__isnull=False
+        ).values_list('pk', 'first_name', 'last_name')
+    }
+    return {
+        'months': [month.strftime('%Y-%m') for month in months],
+        'people': [{'id': pk, 'name': names.get(pk)} for pk in people],
+        'fte': np.round(values, 2).tolist(),
+    }
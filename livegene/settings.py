@@ -87,6 +87,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+# The local-memory cache is private to each process. Deployments running
+# several processes need a shared backend (e.g. memcached) so that the
+# invalidation of cached views reaches all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'livegene',
+    }
+}
+
+
+# Full-text search
+# The FTS5 backend needs SQLite; other databases can use
+# 'livegene.apps.livegene.search.DatabaseBackend'.
+
+LIVEGENE_SEARCH_BACKEND = 'livegene.apps.livegene.search.SQLiteFTSBackend'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -124,3 +145,39 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.1/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Uploaded files
+# Sampling documents are stored by content under MEDIA_ROOT/documents/.
+
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+MEDIA_URL = '/media/'
+
+# Set to 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache) to let the
+# web server send the downloaded documents. With nginx, the prefix must
+# be an internal location aliased to MEDIA_ROOT.
+LIVEGENE_DOCUMENT_SENDFILE = None
+
+LIVEGENE_DOCUMENT_ACCEL_PREFIX = '/protected/'
+
+# Logos are fetched by the fetch_logos command with this fetcher. The
+# 'livegene.apps.livegene.logos.LocalFetcher' reads them from the
+# LIVEGENE_LOGO_ROOT directory instead, by the file name of their URL.
+LIVEGENE_LOGO_FETCHER = 'livegene.apps.livegene.logos.HTTPFetcher'
+
+LIVEGENE_LOGO_ROOT = os.path.join(BASE_DIR, 'logos')
+
+
+# Reference tables
+# Seconds each process keeps the small reference tables (countries,
+# SDGs, role and document types) before checking for changes made by
+# other processes.
+LIVEGENE_REFERENCE_TTL = 5
+
+
+# Change log
+# Seconds the /changes/ feed holds new entries back, which must exceed
+# the longest write transaction; None means 0 on SQLite, which commits
+# in sequence order, and 10 seconds on other databases.
+LIVEGENE_CHANGELOG_LAG = None